@@ -1 +1,4 @@
- 
\ No newline at end of file
+from dotenv import load_dotenv
+
+# Settings are read from the environment when modules are imported, so .env is loaded first, once
+load_dotenv()
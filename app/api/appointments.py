@@ -1,36 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Path
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Path, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from datetime import date, time, datetime, timedelta
-import random
-import string
+from datetime import date, time, datetime
+import base64
+import json
+import os
 import logging
-import traceback
-import re
 
-from app.models.appointment import Appointment as AppointmentModel
 from app.schemas.appointment import (
     Appointment, 
     AppointmentCreateRequest, 
-    AppointmentUpdateRequest, 
+    AppointmentFilters,
+    BulkImportResponse,
     AppointmentPatchRequest,
     AppointmentAvailabilityResponse,
+    ArchivedAppointment,
+    AvailabilityRangeResponse,
+    FreeSlot,
+    SlotHold,
+    SlotHoldRequest,
     BookingDetailsResponse,
     AppointmentUserDetailsResponse,
     OtpRequest,
     OtpResponse,
+    OtpVerifyRequest,
+    OtpVerifyResponse,
     RescheduleDetailsResponse,
     CancellationDetailsResponse,
     SmsBookingRequest,
     SmsCancellationRequest,
     SmsRescheduleRequest,
-    SmsResponse
+    SmsResponse,
+    NotificationStatusResponse
 )
-from app.db.base import get_db
+from app.core import security
+from app.core.phone import normalize_phone, same_phone
+from app.core.responses import FastJSONResponse, ndjson_chunk, rows_to_dicts
+from app.core.security import verified_phone
+from app.db.base import DbSession, get_session, run_db
+from app.db.replicas import pin_reads_to_primary
+from app.crud import appointments as crud
+from app.db import bulk
+from app.services import appointment_cache, notifications, otp_store, reservations, schedule, slot_capacity
+from app.services.appointment_repository import AppointmentRepository, get_read_repository, get_repository
+from app.services.notification_worker import worker as notification_worker
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Doctor returned by availability checks when the caller does not ask for one
+DEFAULT_DOCTOR_NAME = "Dr. Priya Sharma"
+
+# Longest date range one availability calendar request may cover
+AVAILABILITY_RANGE_MAX_DAYS = 62
+
+# Echo the OTP in the send-otp response; for demos and load tests only
+OTP_IN_RESPONSE = os.getenv("OTP_IN_RESPONSE", "False").lower() == "true"
+
 # Create a router specifically for fixed paths (no path parameters)
 fixed_router = APIRouter(
     prefix="/appointments",
@@ -49,75 +75,200 @@ nested_router = APIRouter(
     tags=["appointments"]
 )
 
+def encode_cursor(cursor: crud.KeysetCursor) -> str:
+    """Encode a keyset position as an opaque URL-safe token"""
+    appointment_date, appointment_time, appointment_id = cursor
+    raw = json.dumps([appointment_date.isoformat(), appointment_time.isoformat(), appointment_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> crud.KeysetCursor:
+    """Decode a token produced by encode_cursor; raise 400 if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        appointment_date, appointment_time, appointment_id = json.loads(raw)
+        return (date.fromisoformat(appointment_date), time.fromisoformat(appointment_time), str(appointment_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _stream_ndjson(repository: AppointmentRepository, filters: AppointmentFilters, after: Optional[crud.KeysetCursor]):
+    """Stream appointments as NDJSON, one chunk per batch (a server-side cursor batch on SQL)"""
+    async def chunks():
+        async for batch in repository.iter_appointment_batches(filters, after):
+            yield ndjson_chunk(crud.APPOINTMENT_FIELDS, batch)
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+# Rows are encoded straight from the column tuples; response_model only documents the shape
 @fixed_router.get("/", response_model=List[Appointment])
-def get_all_appointments(request: Request, db: Session = Depends(get_db)):
-    logger.info(f"Getting all appointments - Client: {request.client.host}")
+async def get_all_appointments(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of appointments per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    dateFrom: Optional[date] = Query(None),
+    dateTo: Optional[date] = Query(None),
+    department: Optional[str] = Query(None),
+    doctorName: Optional[str] = Query(None),
+    patientId: Optional[str] = Query(None),
+    isCancelled: Optional[bool] = Query(None),
+    format: str = Query("json", regex=r'^(json|ndjson)$', description="ndjson streams every matching row, ignoring limit"),
+    repository: AppointmentRepository = Depends(get_read_repository)
+):
+    logger.info("Getting appointments (format=%s, limit=%s) - Client: %s", format, limit, request.client.host)
+    after = decode_cursor(cursor) if cursor else None
+    filters = AppointmentFilters(
+        dateFrom=dateFrom,
+        dateTo=dateTo,
+        department=department,
+        doctorName=doctorName,
+        patientId=patientId,
+        isCancelled=isCancelled
+    )
     try:
-        appointments = db.query(AppointmentModel).all()
-        logger.debug(f"Retrieved {len(appointments)} appointments")
-        return appointments
+        if format == "ndjson":
+            logger.debug("Streaming appointments as NDJSON")
+            return _stream_ndjson(repository, filters, after)
+
+        # Fetch one extra row to find out whether there is a next page
+        rows = await repository.list_appointment_rows(filters, limit + 1, after)
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(crud.keyset_cursor(rows[-1]))
+        logger.debug("Retrieved %s appointments", len(rows))
+        return FastJSONResponse(rows_to_dicts(crud.APPOINTMENT_FIELDS, rows), headers=headers)
     except Exception as e:
-        logger.error(f"Error fetching appointments: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error fetching appointments: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # Define specific routes with fixed paths in the fixed_router
 @fixed_router.get("/availability", response_model=AppointmentAvailabilityResponse)
-def get_appointment_availability(request: Request, appointmentDate: date = Query(...), db: Session = Depends(get_db)):
-    logger.info(f"Checking appointment availability for date: {appointmentDate} - Client: {request.client.host}")
+async def get_appointment_availability(
+    request: Request,
+    appointmentDate: date = Query(...),
+    doctorName: Optional[str] = Query(None),
+    department: Optional[str] = Query(None),
+    repository: AppointmentRepository = Depends(get_read_repository)
+):
+    logger.info("Checking appointment availability for date: %s - Client: %s", appointmentDate, request.client.host)
     try:
-        # Check if there are slots available on the requested date
-        logger.debug(f"Querying appointments for date {appointmentDate}")
-        existing_appointments = db.query(AppointmentModel).filter(
-            AppointmentModel.date == appointmentDate
-        ).count()
-        logger.debug(f"Found {existing_appointments} existing appointments for date {appointmentDate}")
+        # Doctors with a schedule: the first free slot on the date, or the next one after it
+        logger.debug("Searching scheduled slots from %s", appointmentDate)
+        slots = await repository.find_free_slots(
+            appointmentDate, slot_capacity.AVAILABILITY_LOOKAHEAD_DAYS + 1, doctorName, department, 1
+        )
+        if slots is not None:
+            slot = slots[0] if slots else None
+            logger.debug("First free scheduled slot: %s", slot)
+            if slot is not None and slot.date == appointmentDate:
+                return {
+                    "slotAvailable": True,
+                    "appointmentTime": slot.time,
+                    "doctorName": slot.doctorName
+                }
+            return {
+                "slotAvailable": False,
+                "nextAvailableSlot": datetime.combine(slot.date, slot.time) if slot else None,
+                "doctorName": slot.doctorName if slot else doctorName or DEFAULT_DOCTOR_NAME
+            }
+
+        # No schedule configured: read the precomputed booked count for the requested date
+        logger.debug("Reading slot capacity for date %s", appointmentDate)
+        existing_appointments = await repository.get_booked_count(appointmentDate, doctorName, department)
+        logger.debug("Found %s existing appointments for date %s", existing_appointments, appointmentDate)
         
-        # Assuming a maximum of 10 appointments per day for simplicity
-        slots_available = existing_appointments < 10
-        logger.debug(f"Slots available: {slots_available}")
+        slots_available = existing_appointments < slot_capacity.MAX_APPOINTMENTS_PER_DAY
+        logger.debug("Slots available: %s", slots_available)
         
         # For demo purposes, return some mock data
         if slots_available:
             # Return first available time (9 AM + existing appointments hours)
             appointment_time = time(9 + existing_appointments, 0, 0)
-            logger.debug(f"Next available time: {appointment_time}")
+            logger.debug("Next available time: %s", appointment_time)
             return {
                 "slotAvailable": True,
                 "appointmentTime": appointment_time,
-                "doctorName": "Dr. Priya Sharma"
+                "doctorName": doctorName or DEFAULT_DOCTOR_NAME
             }
         else:
-            # Return next available slot (next day)
-            next_date = appointmentDate + timedelta(days=1)
-            next_slot = datetime.combine(next_date, time(9, 0, 0))
-            logger.debug(f"Next available slot: {next_slot}")
+            # Return the first slot on the next day with free capacity
+            next_available = await repository.find_next_available_date(appointmentDate, doctorName, department)
+            next_slot = None
+            if next_available:
+                next_date, booked = next_available
+                next_slot = datetime.combine(next_date, time(9 + booked, 0, 0))
+            logger.debug("Next available slot: %s", next_slot)
             return {
                 "slotAvailable": False,
                 "nextAvailableSlot": next_slot,
-                "doctorName": "Dr. Priya Sharma"
+                "doctorName": doctorName or DEFAULT_DOCTOR_NAME
             }
     except Exception as e:
-        logger.error(f"Error checking appointment availability: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error checking appointment availability: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to check appointment availability")
 
+@fixed_router.get("/availability/range", response_model=AvailabilityRangeResponse)
+async def get_availability_range(
+    request: Request,
+    dateFrom: date = Query(..., alias="from", description="First day of the calendar"),
+    dateTo: date = Query(..., alias="to", description="Last day of the calendar (inclusive)"),
+    department: Optional[str] = Query(None),
+    doctor: Optional[str] = Query(None, description="Doctor name"),
+    repository: AppointmentRepository = Depends(get_read_repository)
+):
+    logger.info("Getting availability from %s to %s (department=%s, doctor=%s) - Client: %s", dateFrom, dateTo, department, doctor, request.client.host)
+    days = (dateTo - dateFrom).days + 1
+    if days < 1 or days > AVAILABILITY_RANGE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"'to' must be on or after 'from' and at most {AVAILABILITY_RANGE_MAX_DAYS} days later")
+    try:
+        # Bookings per (date, time) over the whole range, in one aggregate query
+        booked = await repository.count_booked_by_slot(dateFrom, dateTo, doctor, department)
+        slots = await repository.find_free_slots(dateFrom, days, doctor, department, None)
+        if slots is not None:
+            calendar = schedule.calendar_from_free_slots(dateFrom, dateTo, slots, booked)
+        else:
+            calendar = slot_capacity.calendar_from_bookings(dateFrom, dateTo, booked)
+        logger.debug("Built availability for %s day(s) from %s booked slot(s)", days, len(booked))
+        content = AvailabilityRangeResponse(
+            dateFrom=dateFrom, dateTo=dateTo, doctorName=doctor, department=department,
+            scheduled=slots is not None, days=calendar
+        )
+        return FastJSONResponse(content.dict())
+    except Exception as e:
+        logger.error("Error getting availability range: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to get availability")
+
+@fixed_router.get("/free-slots", response_model=List[FreeSlot])
+async def get_free_slots(
+    request: Request,
+    department: Optional[str] = Query(None),
+    doctorName: Optional[str] = Query(None),
+    dateFrom: Optional[date] = Query(None, description="First day to search; defaults to today"),
+    days: int = Query(30, ge=1, le=90, description="Number of days to search"),
+    limit: int = Query(20, ge=1, le=500, description="Maximum number of slots, earliest first"),
+    repository: AppointmentRepository = Depends(get_read_repository)
+):
+    logger.info("Finding free slots (department=%s, doctor=%s, days=%s) - Client: %s", department, doctorName, days, request.client.host)
+    try:
+        slots = await repository.find_free_slots(dateFrom or date.today(), days, doctorName, department, limit)
+        logger.debug("Found %s free slots", len(slots or []))
+        return slots or []
+    except Exception as e:
+        logger.error("Error finding free slots: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to find free slots")
+
 @fixed_router.get("/booking-details", response_model=BookingDetailsResponse)
-def get_booking_details(
+async def get_booking_details(
     request: Request,
     appointmentNumber: str = Query(..., regex=r'^\d{6}$'),
-    db: Session = Depends(get_db)
+    repository: AppointmentRepository = Depends(get_read_repository)
 ):
-    logger.info(f"Getting booking details for appointment number: {appointmentNumber} - Client: {request.client.host}")
+    logger.info("Getting booking details for appointment number: %s - Client: %s", appointmentNumber, request.client.host)
     try:
         # Look up the appointment by appointmentId (which is now our appointmentNumber)
-        logger.debug(f"Querying appointment with ID {appointmentNumber}")
-        appointment = db.query(AppointmentModel).filter(
-            AppointmentModel.appointmentId == appointmentNumber
-        ).first()
+        logger.debug("Querying appointment with ID %s", appointmentNumber)
+        appointment = await appointment_cache.get_appointment(repository, appointmentNumber)
         
         if appointment:
-            logger.debug(f"Found appointment: {appointment}")
+            logger.debug("Found appointment: %s", appointment)
             return {
                 "appointmentDate": appointment.date,
                 "appointmentNumber": appointment.appointmentId,
@@ -126,281 +277,386 @@ def get_booking_details(
                 "userName": appointment.name
             }
         
-        logger.warning(f"Booking not found for appointment number {appointmentNumber}")
+        logger.warning("Booking not found for appointment number %s", appointmentNumber)
         raise HTTPException(status_code=404, detail="Booking not found")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting booking details: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error getting booking details: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to get booking details")
 
 @fixed_router.get("/details", response_model=AppointmentUserDetailsResponse)
-def get_appointment_by_phone(request: Request, userPhoneNumber: str = Query(...), db: Session = Depends(get_db)):
-    logger.info(f"Getting appointment details for phone number: {userPhoneNumber} - Client: {request.client.host}")
+async def get_appointment_by_phone(
+    request: Request,
+    userPhoneNumber: str = Query(...),
+    limit: int = Query(1, ge=1, le=20, description="Number of upcoming appointments to list"),
+    repository: AppointmentRepository = Depends(get_read_repository)
+):
+    logger.info("Getting appointment details for phone number: %s - Client: %s", userPhoneNumber, request.client.host)
+    phone_normalized = normalize_phone(userPhoneNumber)
+    if phone_normalized is None:
+        logger.warning("Invalid phone number %s", userPhoneNumber)
+        raise HTTPException(status_code=400, detail="Invalid phone number")
     try:
-        # Look up appointment by phone number
-        logger.debug(f"Querying appointments for phone number {userPhoneNumber}")
-        appointment = db.query(AppointmentModel).filter(
-            AppointmentModel.userPhoneNumber == userPhoneNumber,
-            AppointmentModel.isCancelled == False
-        ).first()
+        # Upcoming appointments by normalized phone number, from the covering index
+        logger.debug("Querying upcoming appointments for phone number %s", phone_normalized)
+        now = datetime.now()
+        upcoming = await repository.list_upcoming_appointments_by_phone(
+            phone_normalized, (now.date(), now.time().replace(microsecond=0)), limit
+        )
         
-        if appointment:
-            logger.debug(f"Found appointment for phone number {userPhoneNumber}: {appointment}")
+        if upcoming:
+            logger.debug("Found %s upcoming appointment(s) for phone number %s", len(upcoming), phone_normalized)
+            appointments = [
+                {
+                    "appointmentNumber": row.appointmentId,
+                    "userName": row.name,
+                    "appointmentDate": row.date,
+                    "appointmentTime": row.time
+                }
+                for row in upcoming
+            ]
             return {
                 "appointmentAvailable": True,
-                "appointmentNumber": appointment.appointmentId,
-                "userName": appointment.name,
-                "appointmentDate": appointment.date,
-                "appointmentTime": appointment.time
+                **appointments[0],
+                "upcomingAppointments": appointments
             }
         
-        logger.debug(f"No active appointments found for phone number {userPhoneNumber}")
+        logger.debug("No upcoming appointments found for phone number %s", phone_normalized)
         return {
             "appointmentAvailable": False
         }
     except Exception as e:
-        logger.error(f"Error getting appointment by phone: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error getting appointment by phone: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to get appointment details")
 
+@fixed_router.get("/history", response_model=List[ArchivedAppointment])
+async def get_appointment_history(
+    request: Request,
+    userPhoneNumber: Optional[str] = Query(None),
+    patientId: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of archived appointments"),
+    repository: AppointmentRepository = Depends(get_read_repository)
+):
+    logger.info("Getting appointment history (phone=%s, patient=%s) - Client: %s", userPhoneNumber, patientId, request.client.host)
+    if userPhoneNumber is None and patientId is None:
+        raise HTTPException(status_code=400, detail="Provide userPhoneNumber or patientId")
+    phone_normalized = None
+    if userPhoneNumber is not None:
+        phone_normalized = normalize_phone(userPhoneNumber)
+        if phone_normalized is None:
+            raise HTTPException(status_code=400, detail="Invalid phone number")
+    try:
+        archived = await repository.list_archived_appointments(phone_normalized, patientId, limit)
+        logger.debug("Found %s archived appointment(s)", len(archived))
+        return archived
+    except Exception as e:
+        logger.error("Error getting appointment history: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to get appointment history")
+
 # Routes with single path parameters go in the regular router
 @router.get("/{appointmentId}", response_model=Appointment)
-def get_appointment_by_id(
+async def get_appointment_by_id(
     request: Request, 
     appointmentId: str = Path(..., regex=r'^\d{6}$', description="The 6-digit appointment ID"), 
-    db: Session = Depends(get_db)
+    repository: AppointmentRepository = Depends(get_read_repository)
 ):
-    logger.info(f"Getting appointment by ID: {appointmentId} - Client: {request.client.host}")
+    logger.info("Getting appointment by ID: %s - Client: %s", appointmentId, request.client.host)
     try:
-        appointment = db.query(AppointmentModel).filter(AppointmentModel.appointmentId == appointmentId).first()
+        appointment = await appointment_cache.get_appointment(repository, appointmentId)
         if appointment is None:
-            logger.warning(f"Appointment with ID {appointmentId} not found")
+            logger.warning("Appointment with ID %s not found", appointmentId)
             raise HTTPException(status_code=404, detail="Appointment not found")
-        logger.debug(f"Retrieved appointment: {appointment}")
+        logger.debug("Retrieved appointment: %s", appointment)
         return appointment
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching appointment by ID: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error fetching appointment by ID: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@fixed_router.post("/", response_model=Appointment, status_code=status.HTTP_201_CREATED)
-def create_appointment(request: Request, appointment: AppointmentCreateRequest, db: Session = Depends(get_db)):
-    logger.info(f"Creating appointment for patient: {appointment.name} - Client: {request.client.host}")
+@fixed_router.post(
+    "/", response_model=Appointment, status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(pin_reads_to_primary)]
+)
+async def create_appointment(
+    request: Request,
+    appointment: AppointmentCreateRequest,
+    repository: AppointmentRepository = Depends(get_repository)
+):
+    logger.info("Creating appointment for patient: %s - Client: %s", appointment.name, request.client.host)
     try:
-        # Delete any existing appointments for this patient
-        existing_appointments = db.query(AppointmentModel).filter(
-            AppointmentModel.patientId == appointment.patientId
-        ).all()
-        
-        if existing_appointments:
-            logger.debug(f"Found {len(existing_appointments)} existing appointments for patient ID {appointment.patientId}")
-            for existing_appointment in existing_appointments:
-                logger.debug(f"Deleting appointment {existing_appointment.appointmentId} for patient {appointment.patientId}")
-                db.delete(existing_appointment)
-            db.commit()
-        
-        # Create new appointment
-        logger.debug(f"Creating new appointment for patient {appointment.patientId} on {appointment.date} at {appointment.time}")
-        db_appointment = AppointmentModel(
-            appointmentId=AppointmentModel.generate_id(),
-            patientId=appointment.patientId,
-            name=appointment.name,
-            date=appointment.date,
-            time=appointment.time,
-            department=appointment.department,
-            doctorName=appointment.doctorName,
-            userPhoneNumber=appointment.userPhoneNumber,
-            isCancelled=False
-        )
-        db.add(db_appointment)
-        db.commit()
-        db.refresh(db_appointment)
-        logger.info(f"Appointment created successfully with ID: {db_appointment.appointmentId}")
+        db_appointment, replaced_ids = await repository.create_appointment(appointment)
+        await appointment_cache.invalidate_appointments(*replaced_ids)
+        await appointment_cache.remember_appointment(Appointment.from_orm(db_appointment))
+        logger.info("Appointment created successfully with ID: %s", db_appointment.appointmentId)
         return db_appointment
+    except crud.BookingConflictError as e:
+        logger.warning("Booking conflict: %s", e)
+        raise HTTPException(status_code=409, detail="Another booking for this patient is in progress")
+    except reservations.SlotUnavailableError as e:
+        logger.info("Slot unavailable for patient %s: %s", appointment.patientId, e)
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
-        logger.error(f"Error creating appointment: {str(e)}")
-        logger.debug(traceback.format_exc())
-        db.rollback()
+        logger.error("Error creating appointment: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to create appointment")
 
-@router.patch("/{appointmentId}", response_model=Appointment)
-def patch_appointment(
+@fixed_router.post("/holds", response_model=SlotHold, status_code=status.HTTP_201_CREATED)
+async def hold_slot(
+    request: Request,
+    hold_request: SlotHoldRequest,
+    repository: AppointmentRepository = Depends(get_repository)
+):
+    logger.info("Holding slot for %s on %s at %s - Client: %s", hold_request.doctorName, hold_request.date, hold_request.time, request.client.host)
+    try:
+        return await repository.hold_slot(hold_request)
+    except reservations.SlotUnavailableError as e:
+        logger.info("Slot unavailable for hold: %s", e)
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error("Error holding slot: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to hold slot")
+
+@fixed_router.post("/bulk", response_model=BulkImportResponse, dependencies=[Depends(pin_reads_to_primary)])
+async def bulk_import_appointments(request: Request, repository: AppointmentRepository = Depends(get_repository)):
+    ndjson = request.headers.get("content-type", "").startswith("application/x-ndjson")
+    logger.info("Bulk importing appointments (ndjson=%s) - Client: %s", ndjson, request.client.host)
+    try:
+        body = await request.body()
+        records = list(bulk.parse_records(body, ndjson))
+    except ValueError as e:
+        logger.warning("Invalid bulk import body: %s", e)
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON of appointments")
+    try:
+        result = await repository.import_appointments(records)
+        if result["imported"]:
+            await appointment_cache.invalidate_all_appointments()
+        logger.info("Bulk import finished: %s imported, %s rejected", result['imported'], result['failed'])
+        return result
+    except reservations.SlotUnavailableError as e:
+        logger.warning("Bulk import conflict: %s", e)
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error("Error bulk importing appointments: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to import appointments")
+
+@router.patch("/{appointmentId}", response_model=Appointment, dependencies=[Depends(pin_reads_to_primary)])
+async def patch_appointment(
     request: Request, 
     appointmentId: str = Path(..., regex=r'^\d{6}$'), 
     appointment: AppointmentPatchRequest = None, 
-    db: Session = Depends(get_db)
+    repository: AppointmentRepository = Depends(get_repository)
 ):
-    logger.info(f"Partially updating appointment with ID: {appointmentId} - Client: {request.client.host}")
+    logger.info("Partially updating appointment with ID: %s - Client: %s", appointmentId, request.client.host)
     try:
-        db_appointment = db.query(AppointmentModel).filter(AppointmentModel.appointmentId == appointmentId).first()
-        if db_appointment is None:
-            logger.warning(f"Appointment with ID {appointmentId} not found for patch")
-            raise HTTPException(status_code=404, detail="Appointment not found")
-        
         # Update only provided fields
-        logger.debug(f"Partially updating fields for appointment {appointmentId}")
+        logger.debug("Partially updating fields for appointment %s", appointmentId)
         update_data = appointment.dict(exclude_unset=True)
-        logger.debug(f"Fields to update: {list(update_data.keys())}")
-        for key, value in update_data.items():
-            if value is not None:
-                logger.debug(f"Setting {key} = {value}")
-                setattr(db_appointment, key, value)
+        db_appointment = await repository.patch_appointment(appointmentId, update_data)
+        if db_appointment is None:
+            logger.warning("Appointment with ID %s not found for patch", appointmentId)
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        await appointment_cache.invalidate_appointments(appointmentId)
         
-        db.commit()
-        db.refresh(db_appointment)
-        logger.info(f"Appointment {appointmentId} patched successfully")
+        logger.info("Appointment %s patched successfully", appointmentId)
         return db_appointment
     except HTTPException:
         raise
+    except reservations.SlotUnavailableError as e:
+        logger.info("Slot unavailable for appointment %s: %s", appointmentId, e)
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
-        logger.error(f"Error patching appointment: {str(e)}")
-        logger.debug(traceback.format_exc())
-        db.rollback()
+        logger.error("Error patching appointment: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to patch appointment")
 
 # Multi-segment paths go in the nested_router
+@nested_router.delete("/holds/{holdId}", status_code=status.HTTP_204_NO_CONTENT)
+async def release_hold(request: Request, holdId: str, repository: AppointmentRepository = Depends(get_repository)):
+    logger.info("Releasing slot hold %s - Client: %s", holdId, request.client.host)
+    try:
+        released = await repository.release_hold(holdId)
+    except Exception as e:
+        logger.error("Error releasing slot hold: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to release hold")
+    if not released:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 @nested_router.get("/{appointmentNumber}/reschedule", response_model=RescheduleDetailsResponse)
-def get_reschedule_details(
+async def get_reschedule_details(
     request: Request,
     appointmentNumber: str = Path(..., regex=r'^\d{6}$'),
-    userValidated: bool = Query(...),
-    db: Session = Depends(get_db)
+    phone: str = Depends(verified_phone),
+    repository: AppointmentRepository = Depends(get_read_repository)
 ):
-    logger.info(f"Checking reschedule availability for appointment: {appointmentNumber}, validated: {userValidated} - Client: {request.client.host}")
+    logger.info("Checking reschedule availability for appointment: %s - Client: %s", appointmentNumber, request.client.host)
     try:
-        if not userValidated:
-            logger.warning(f"User not validated for appointment {appointmentNumber}")
-            raise HTTPException(status_code=400, detail="User not validated")
-        
         # Check if appointment exists and is not cancelled
-        logger.debug(f"Querying appointment with ID {appointmentNumber}")
-        appointment = db.query(AppointmentModel).filter(
-            AppointmentModel.appointmentId == appointmentNumber,
-            AppointmentModel.isCancelled == False
-        ).first()
+        logger.debug("Querying appointment with ID %s", appointmentNumber)
+        appointment = await appointment_cache.get_appointment(repository, appointmentNumber)
         
-        if not appointment:
-            logger.warning(f"Appointment with ID {appointmentNumber} not found or is cancelled")
+        # Someone else's appointment looks the same as a missing one, so IDs cannot be probed
+        if not appointment or appointment.isCancelled or not same_phone(appointment.userPhoneNumber, phone):
+            logger.warning("Appointment with ID %s not found, cancelled or not booked by the caller", appointmentNumber)
             raise HTTPException(status_code=404, detail="Appointment not found")
         
-        logger.debug(f"Appointment {appointmentNumber} is available for reschedule")
+        logger.debug("Appointment %s is available for reschedule", appointmentNumber)
         return {
             "rescheduleAvailable": True
         }
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error checking reschedule availability: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error checking reschedule availability: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to check reschedule availability")
 
 @nested_router.get("/{appointmentNumber}/cancellation", response_model=CancellationDetailsResponse)
-def get_cancellation_details(
+async def get_cancellation_details(
     request: Request,
     appointmentNumber: str = Path(..., regex=r'^\d{6}$'),
-    userValidated: bool = Query(...),
-    db: Session = Depends(get_db)
+    phone: str = Depends(verified_phone),
+    repository: AppointmentRepository = Depends(get_read_repository)
 ):
-    logger.info(f"Checking cancellation status for appointment: {appointmentNumber}, validated: {userValidated} - Client: {request.client.host}")
+    logger.info("Checking cancellation status for appointment: %s - Client: %s", appointmentNumber, request.client.host)
     try:
-        if not userValidated:
-            logger.warning(f"User not validated for appointment {appointmentNumber}")
-            raise HTTPException(status_code=400, detail="User not validated")
-        
         # Check if appointment exists
-        logger.debug(f"Querying appointment with ID {appointmentNumber}")
-        appointment = db.query(AppointmentModel).filter(
-            AppointmentModel.appointmentId == appointmentNumber
-        ).first()
+        logger.debug("Querying appointment with ID %s", appointmentNumber)
+        appointment = await appointment_cache.get_appointment(repository, appointmentNumber)
         
-        if not appointment:
-            logger.warning(f"Appointment with ID {appointmentNumber} not found")
+        if not appointment or not same_phone(appointment.userPhoneNumber, phone):
+            logger.warning("Appointment with ID %s not found or not booked by the caller", appointmentNumber)
             raise HTTPException(status_code=404, detail="Appointment not found")
         
-        logger.debug(f"Appointment {appointmentNumber} cancellation status: {appointment.isCancelled}")
+        logger.debug("Appointment %s cancellation status: %s", appointmentNumber, appointment.isCancelled)
         return {
             "appointmentCancelled": appointment.isCancelled
         }
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error checking cancellation status: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error checking cancellation status: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to check cancellation status")
 
 # Create a separate router for authentication
 auth_router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@auth_router.post("/send-otp", response_model=OtpResponse)
-def send_otp(request: Request, otp_request: OtpRequest):
-    logger.info(f"Sending OTP to phone number: {otp_request.userPhoneNumber} - Client: {request.client.host}")
+@auth_router.post("/send-otp", response_model=OtpResponse, response_model_exclude_none=True)
+async def send_otp(request: Request, otp_request: OtpRequest, db: DbSession = Depends(get_session)):
+    logger.info("Sending OTP to phone number: %s - Client: %s", otp_request.userPhoneNumber, request.client.host)
     try:
-        # Generate a random 6-digit OTP
-        otp = ''.join(random.choices(string.digits, k=6))
-        logger.debug(f"Generated OTP for phone number {otp_request.userPhoneNumber}: {otp}")
+        # Generate a 6-digit OTP; only its digest is kept, until it is verified or expires
+        otp = await otp_store.issue_otp(otp_request.userPhoneNumber)
         
-        # In a real application, you would send this OTP to the user's phone number
-        # For demo purposes, just return the OTP
-        logger.info(f"OTP sent successfully to {otp_request.userPhoneNumber}")
+        # Queue the SMS; the notification worker delivers it outside the request
+        notification = await run_db(
+            db, notifications.enqueue, "otp", otp_request.userPhoneNumber, notifications.otp_message(otp)
+        )
+        notification_worker.wake()
+        logger.info("OTP queued as notification %s for %s", notification.notificationId, otp_request.userPhoneNumber)
         return {
-            "sentOtp": otp
+            "sentOtp": otp if OTP_IN_RESPONSE else None,
+            "notificationId": notification.notificationId
         }
+    except otp_store.OtpRateLimited as e:
+        logger.warning("OTP rate limit reached for %s", otp_request.userPhoneNumber)
+        raise HTTPException(
+            status_code=429, detail="Too many OTP requests", headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
     except Exception as e:
-        logger.error(f"Error sending OTP: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error sending OTP: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to send OTP")
 
+@auth_router.post("/verify-otp", response_model=OtpVerifyResponse)
+async def verify_otp(request: Request, verify_request: OtpVerifyRequest):
+    logger.info("Verifying OTP for phone number: %s - Client: %s", verify_request.userPhoneNumber, request.client.host)
+    try:
+        verified = await otp_store.verify_otp(verify_request.userPhoneNumber, verify_request.otp)
+    except Exception as e:
+        logger.error("Error verifying OTP: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to verify OTP")
+    if not verified:
+        logger.warning("Invalid or expired OTP for %s", verify_request.userPhoneNumber)
+        raise HTTPException(status_code=401, detail="Invalid or expired OTP")
+    logger.info("OTP verified for %s", verify_request.userPhoneNumber)
+    return {
+        "verified": True,
+        "sessionToken": security.create_session_token(verify_request.userPhoneNumber),
+        "expiresIn": security.SESSION_TOKEN_TTL_SECONDS
+    }
+
 # Create a separate router for notifications
 notifications_router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 @notifications_router.post("/sms/booking", response_model=SmsResponse)
-def send_sms_booking_details(request: Request, sms_request: SmsBookingRequest):
-    logger.info(f"Sending booking SMS to {sms_request.userPhoneNumber} for {sms_request.appointmentDate} - Client: {request.client.host}")
+async def send_sms_booking_details(request: Request, sms_request: SmsBookingRequest, db: DbSession = Depends(get_session)):
+    logger.info("Sending booking SMS to %s for %s - Client: %s", sms_request.userPhoneNumber, sms_request.appointmentDate, request.client.host)
     try:
-        # In a real application, you would send an SMS with the booking details
-        # For demo purposes, just return success
-        logger.debug(f"SMS content would include: date={sms_request.appointmentDate}, time={sms_request.appointmentTime}, doctor={sms_request.doctorName}")
-        logger.info(f"Booking SMS sent successfully to {sms_request.userPhoneNumber}")
+        notification = await run_db(
+            db, notifications.enqueue, "booking", sms_request.userPhoneNumber, notifications.booking_message(sms_request)
+        )
+        notification_worker.wake()
+        logger.info("Booking SMS queued as notification %s for %s", notification.notificationId, sms_request.userPhoneNumber)
         return {
-            "smsSent": True
+            "smsSent": True,
+            "notificationId": notification.notificationId,
+            "status": notification.status
         }
     except Exception as e:
-        logger.error(f"Error sending booking SMS: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error sending booking SMS: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to send booking SMS")
 
 @notifications_router.post("/sms/cancellation", response_model=SmsResponse)
-def send_sms_cancellation_details(request: Request, sms_request: SmsCancellationRequest):
-    logger.info(f"Sending cancellation SMS to {sms_request.userPhoneNumber} for {sms_request.appointmentDate} - Client: {request.client.host}")
+async def send_sms_cancellation_details(request: Request, sms_request: SmsCancellationRequest, db: DbSession = Depends(get_session)):
+    logger.info("Sending cancellation SMS to %s for %s - Client: %s", sms_request.userPhoneNumber, sms_request.appointmentDate, request.client.host)
     try:
-        # In a real application, you would send an SMS with the cancellation details
-        # For demo purposes, just return success
-        logger.debug(f"Cancellation SMS content would include: date={sms_request.appointmentDate}, time={sms_request.appointmentTime}")
-        logger.info(f"Cancellation SMS sent successfully to {sms_request.userPhoneNumber}")
+        notification = await run_db(
+            db, notifications.enqueue, "cancellation", sms_request.userPhoneNumber, notifications.cancellation_message(sms_request)
+        )
+        notification_worker.wake()
+        logger.info("Cancellation SMS queued as notification %s for %s", notification.notificationId, sms_request.userPhoneNumber)
         return {
-            "smsSent": True
+            "smsSent": True,
+            "notificationId": notification.notificationId,
+            "status": notification.status
         }
     except Exception as e:
-        logger.error(f"Error sending cancellation SMS: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error sending cancellation SMS: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to send cancellation SMS")
 
 @notifications_router.post("/sms/reschedule", response_model=SmsResponse)
-def send_sms_reschedule_details(request: Request, sms_request: SmsRescheduleRequest):
-    logger.info(f"Sending reschedule SMS to {sms_request.userPhoneNumber} for {sms_request.appointmentDate} - Client: {request.client.host}")
+async def send_sms_reschedule_details(request: Request, sms_request: SmsRescheduleRequest, db: DbSession = Depends(get_session)):
+    logger.info("Sending reschedule SMS to %s for %s - Client: %s", sms_request.userPhoneNumber, sms_request.appointmentDate, request.client.host)
     try:
-        # In a real application, you would send an SMS with the rescheduled details
-        # For demo purposes, just return success
-        logger.debug(f"Reschedule SMS content would include: date={sms_request.appointmentDate}, time={sms_request.appointmentTime}")
-        logger.info(f"Reschedule SMS sent successfully to {sms_request.userPhoneNumber}")
+        notification = await run_db(
+            db, notifications.enqueue, "reschedule", sms_request.userPhoneNumber, notifications.reschedule_message(sms_request)
+        )
+        notification_worker.wake()
+        logger.info("Reschedule SMS queued as notification %s for %s", notification.notificationId, sms_request.userPhoneNumber)
         return {
-            "smsSent": True
+            "smsSent": True,
+            "notificationId": notification.notificationId,
+            "status": notification.status
         }
     except Exception as e:
-        logger.error(f"Error sending reschedule SMS: {str(e)}")
-        logger.debug(traceback.format_exc())
-        raise HTTPException(status_code=500, detail="Failed to send reschedule SMS") 
\ No newline at end of file
+        logger.error("Error sending reschedule SMS: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to send reschedule SMS") 
+
+@notifications_router.get("/{notificationId}", response_model=NotificationStatusResponse)
+async def get_notification_status(
+    request: Request,
+    notificationId: int,
+    phone: str = Depends(verified_phone),
+    db: DbSession = Depends(get_session)
+):
+    logger.info("Fetching status of notification %s - Client: %s", notificationId, request.client.host)
+    try:
+        notification = await run_db(db, notifications.get_notification, notificationId)
+        if notification is None or not same_phone(notification.recipient, phone):
+            logger.warning("Notification %s not found or not sent to the caller", notificationId)
+            raise HTTPException(status_code=404, detail="Notification not found")
+        return NotificationStatusResponse.from_orm(notification)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching notification status: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch notification status")
@@ -0,0 +1,152 @@
+from typing import List, Optional, Pattern, Set, Tuple
+import asyncio
+import logging
+import os
+import re
+import time
+
+import httpx
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.responses import etag, etag_matches
+from app.db.replicas import PRIMARY_COOKIE
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Base URL of the nginx listener that refreshes micro-cached responses (see nginx/conf.d/apollo.conf);
+# empty disables purging, e.g. when the API is not behind the caching proxy
+HTTP_CACHE_PURGE_URL = os.getenv("HTTP_CACHE_PURGE_URL", "").rstrip("/")
+HTTP_CACHE_PURGE_TIMEOUT = float(os.getenv("HTTP_CACHE_PURGE_TIMEOUT", "2"))
+# Header that makes nginx fetch a fresh response and store it in place of the cached one
+PURGE_HEADER = "X-Cache-Refresh"
+
+# Cache-Control max-age of the OpenAPI document, which only changes on deploys
+OPENAPI_CACHE_SECONDS = int(os.getenv("OPENAPI_CACHE_SECONDS", "300"))
+
+# Responses larger than this are passed through without an ETag
+MAX_ETAG_BODY_BYTES = 1024 * 1024
+
+# (path pattern, Cache-Control) of a GET route that gets strong ETags and answers If-None-Match with 304
+CacheRule = Tuple[Pattern[str], str]
+
+def cache_rule(path_regex: str, cache_control: str) -> CacheRule:
+    return re.compile(path_regex), cache_control
+
+def read_route_rules(api_prefix: str) -> List[CacheRule]:
+    """Rules for the hot read routes; appointments and availability change with every booking, so
+    clients revalidate them, and only the OpenAPI document may be reused without asking"""
+    prefix = re.escape(api_prefix)
+    return [
+        cache_rule(rf"{prefix}/appointments/\d{{6}}", "no-cache"),
+        cache_rule(rf"{prefix}/appointments/booking-details", "no-cache"),
+        cache_rule(rf"{prefix}/appointments/availability(/range)?", "no-cache"),
+        cache_rule(rf"{prefix}/openapi\.json", f"public, max-age={OPENAPI_CACHE_SECONDS}"),
+    ]
+
+class ConditionalGetMiddleware:
+    """Add a strong ETag (a hash of the body) and Cache-Control to 200 responses of the GETs matched
+    by `rules`, and answer a matching If-None-Match with 304 Not Modified
+
+    The body is buffered to hash it, so rules should only match routes with small JSON bodies,
+    not streams. Responses that already carry an ETag are left alone. Pure ASGI, like MetricsMiddleware.
+
+    The handler runs for every conditional GET, so a 304 saves the transfer, not the lookup. An
+    appointment's lookup is a primary-key read or a cache hit, so a version check first would not
+    be cheaper; availability answers aggregate many rows and have no single version.
+    """
+
+    def __init__(self, app: ASGIApp, rules: List[CacheRule]):
+        self.app = app
+        self.rules = rules
+
+    def _cache_control(self, path: str) -> Optional[str]:
+        for pattern, cache_control in self.rules:
+            if pattern.fullmatch(path):
+                return cache_control
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        cache_control = self._cache_control(scope["path"])
+        if cache_control is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if message["status"] != 200 or Headers(raw=message["headers"]).get("etag"):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+            chunks.append(message.get("body", b""))
+            if sum(len(chunk) for chunk in chunks) > MAX_ETAG_BODY_BYTES:
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": message.get("more_body", False)})
+                return
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            tag = etag(body)
+            headers["ETag"] = tag
+            headers["Cache-Control"] = cache_control
+            if etag_matches(Request(scope), tag):
+                del headers["content-length"]
+                del headers["content-type"]
+                await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+_client: Optional[httpx.AsyncClient] = None
+_pending: Set[asyncio.Task] = set()
+
+async def _refresh(paths: Tuple[str, ...]):
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(base_url=HTTP_CACHE_PURGE_URL, timeout=HTTP_CACHE_PURGE_TIMEOUT)
+    # Pinned to the primary, so a lagging replica cannot put the old version back in the cache
+    cookies = {PRIMARY_COOKIE: f"{time.time() + 60:.0f}"}
+    for path in paths:
+        try:
+            response = await _client.get(path, headers={PURGE_HEADER: "1"}, cookies=cookies)
+            logger.debug("Refreshed cached %s (%s)", path, response.status_code)
+        except httpx.HTTPError as e:
+            logger.warning("Could not refresh cached %s: %s", path, e)
+
+def purge(*paths: str):
+    """Replace the proxy's cached responses for `paths` in the background, after a write"""
+    if not HTTP_CACHE_PURGE_URL or not paths:
+        return
+    task = asyncio.get_running_loop().create_task(_refresh(paths))
+    # Keep a reference until it finishes; the event loop only holds weak ones
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+async def close():
+    """Wait for pending refreshes and close the HTTP client"""
+    global _client
+    if _pending:
+        await asyncio.gather(*_pending, return_exceptions=True)
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,161 @@
+from typing import List
+import base64
+import hashlib
+import json
+import logging
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import IDEMPOTENT_REPLAYS
+from app.services import idempotency_store
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+IDEMPOTENT_METHODS = {"POST"}
+
+def _storable(status: int) -> bool:
+    # A retry after a rate limit or a server error should be processed again
+    return status != 429 and status < 500
+
+def request_fingerprint(scope: Scope, body: bytes) -> str:
+    """Hash of what makes two requests the same: method, path, query string and body bytes"""
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+class IdempotencyMiddleware:
+    """Replay the stored response of a POST retried with the same Idempotency-Key
+
+    The first request claims the key and its response is kept for IDEMPOTENCY_TTL_SECONDS;
+    retries get it back with Idempotent-Replayed: true without reaching the routes or the
+    database. A retry while the first request is still running gets 409, and reusing a key
+    for a different request gets 422. Pure ASGI, like MetricsMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS:
+            await self.app(scope, receive, send)
+            return
+        key = dict(scope["headers"]).get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        key = key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await JSONResponse(
+                {"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, status_code=400
+            )(scope, receive, send)
+            return
+
+        # The body is part of the fingerprint, so read it all before deciding
+        chunks: List[bytes] = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        fingerprint = request_fingerprint(scope, body)
+        store_key = f"{scope['method']}:{scope['path']}:{key}"
+
+        try:
+            existing = await idempotency_store.store.claim(
+                store_key, json.dumps({"fingerprint": fingerprint}), idempotency_store.IDEMPOTENCY_LOCK_SECONDS
+            )
+        except Exception as e:
+            # Without the store, handle the request as if it carried no key
+            logger.warning("Idempotency store unavailable, processing %s without it: %s", store_key, e)
+            await self.app(scope, self._replay_body(body, receive), send)
+            return
+
+        if existing is not None:
+            await self._respond_to_retry(scope, receive, send, store_key, json.loads(existing), fingerprint)
+            return
+
+        status = 500
+        headers: List[List[str]] = []
+        response_chunks: List[bytes] = []
+        stored = False
+
+        async def send_wrapper(message: Message):
+            nonlocal status, headers, stored
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [[name.decode("latin-1"), value.decode("latin-1")] for name, value in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+                # Store before the last byte goes out, so a quick retry never sees the key still claimed
+                if not message.get("more_body", False) and _storable(status):
+                    stored = await self._save(store_key, fingerprint, status, headers, b"".join(response_chunks))
+            await send(message)
+
+        try:
+            await self.app(scope, self._replay_body(body, receive), send_wrapper)
+        finally:
+            if not stored:
+                await self._release(store_key)
+
+    @staticmethod
+    def _replay_body(body: bytes, receive: Receive) -> Receive:
+        sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay_receive
+
+    async def _respond_to_retry(self, scope: Scope, receive: Receive, send: Send, store_key: str, entry: dict, fingerprint: str):
+        if entry["fingerprint"] != fingerprint:
+            logger.info("Idempotency key %s reused for a different request", store_key)
+            response = JSONResponse({"detail": "Idempotency-Key was already used for a different request"}, status_code=422)
+        elif "status" not in entry:
+            logger.info("Idempotency key %s is still being processed", store_key)
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still being processed"},
+                status_code=409,
+                headers={"Retry-After": "1"},
+            )
+        else:
+            IDEMPOTENT_REPLAYS.inc()
+            logger.debug("Replaying stored %s response for %s", entry['status'], store_key)
+            await send({
+                "type": "http.response.start",
+                "status": entry["status"],
+                "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in entry["headers"]]
+                           + [(REPLAYED_HEADER, b"true")],
+            })
+            await send({"type": "http.response.body", "body": base64.b64decode(entry["body"])})
+            return
+        await response(scope, receive, send)
+
+    async def _save(self, store_key: str, fingerprint: str, status: int, headers: List[List[str]], body: bytes) -> bool:
+        entry = {"fingerprint": fingerprint, "status": status, "headers": headers, "body": base64.b64encode(body).decode()}
+        try:
+            await idempotency_store.store.save(store_key, json.dumps(entry), idempotency_store.IDEMPOTENCY_TTL_SECONDS)
+            return True
+        except Exception as e:
+            logger.warning("Could not store response for idempotency key %s: %s", store_key, e)
+            return False
+
+    async def _release(self, store_key: str):
+        try:
+            await idempotency_store.store.release(store_key)
+        except Exception as e:
+            # The claim expires after IDEMPOTENCY_LOCK_SECONDS
+            logger.warning("Could not release idempotency key %s: %s", store_key, e)
@@ -0,0 +1,183 @@
+"""Logging setup: JSON records written by a background thread, request IDs and sampled access logs.
+
+Handlers on the event loop only put records on a queue (QueueHandler); a QueueListener
+thread formats and writes them, so slow stdout or log shippers never block a request.
+Use lazy %-style arguments (logger.debug("x=%s", x)) so disabled levels cost one check.
+"""
+from contextvars import ContextVar
+from typing import Optional
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if DEBUG else "INFO").upper()
+# json (one object per line, for log shippers) or text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of successful, fast requests that get an access log record; errors and slow requests always do
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.1"))
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+# Records held in memory when the writer thread falls behind; further records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+access_logger = logging.getLogger("app.access")
+
+# Correlation ID of the request being handled; copied into threadpool calls with the context
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is emitted as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id",
+    "color_message",  # uvicorn's ANSI-coloured copy of the message
+}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with `extra=` fields and the request ID"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["requestId"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Capture the request ID and render the message in the caller; leave formatting to the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Arguments may change after the call returns, so the message is rendered now
+        record.msg = record.getMessage()
+        record.args = None
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Dropping a record is better than blocking the event loop
+            pass
+
+class _RequestIdFilter(logging.Filter):
+    """Give records that bypassed the queue handler a request_id attribute for TEXT_FORMAT"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT):
+    """Route all logging through a queue to a stdout writer thread; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    output.addFilter(_RequestIdFilter())
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.handlers = [_QueueHandler(log_queue)]
+    root.setLevel(level)
+    # uvicorn's loggers keep their own handlers unless they propagate to ours
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        if name == "uvicorn.access" and not uvicorn_logger.handlers and not uvicorn_logger.propagate:
+            # Turned off (uvicorn --no-access-log, gunicorn without accesslog); keep it that way
+            continue
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class RequestContextMiddleware:
+    """Assign each request a correlation ID and write a sampled access log record
+
+    The ID comes from the X-Request-ID header when the caller (or nginx) sends one and is
+    echoed in the response. Pure ASGI, like MetricsMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = ACCESS_LOG_SAMPLE_RATE, slow_ms: float = ACCESS_LOG_SLOW_MS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:128]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            if status >= 500 or duration_ms >= self.slow_ms or random.random() < self.sample_rate:
+                if access_logger.isEnabledFor(logging.INFO):
+                    access_logger.info(
+                        "%s %s %s %.1fms", scope["method"], scope["path"], status, duration_ms,
+                        extra={
+                            "method": scope["method"], "path": scope["path"], "status": status,
+                            "durationMs": round(duration_ms, 1),
+                            "client": scope["client"][0] if scope.get("client") else None,
+                        },
+                    )
+            request_id_var.reset(token)
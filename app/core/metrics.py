@@ -0,0 +1,158 @@
+from contextvars import ContextVar
+from typing import Iterable, Optional
+import logging
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Set by the process manager when several workers share one /metrics view (see README)
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Requests that match no route share one label so scanners cannot inflate cardinality
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of the response",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests currently being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Counter(
+    "db_queries_total",
+    "SQL statements executed while handling requests",
+    ["method", "route"],
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed by a single request; high counts point at N+1 or redundant queries",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 50),
+)
+IDEMPOTENT_REPLAYS = Counter(
+    "idempotent_replays_total",
+    "Retried POSTs answered from the idempotency store without running the route",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total",
+    "Connections checked out of the SQLAlchemy pool",
+    ["engine"],
+)
+
+class _QueryCount:
+    """Mutable per-request counter; shared with the threadpool and greenlets that copy the context"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+_query_count: ContextVar[Optional[_QueryCount]] = ContextVar("query_count", default=None)
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_count.get()
+    if counter is not None:
+        counter.value += 1
+
+class PoolCollector(Collector):
+    """Report the current size, checked-out and overflow connections of each engine's pool"""
+
+    def __init__(self):
+        self._engines = {}
+
+    def add(self, name: str, engine: Engine):
+        self._engines[name] = engine
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"]),
+            "checkedout": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["engine"]),
+            "checkedin": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["engine"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size", labels=["engine"]),
+        }
+        for name, engine in self._engines.items():
+            pool = engine.pool
+            for stat, gauge in gauges.items():
+                if hasattr(pool, stat):
+                    # QueuePool.overflow() counts up from -pool_size
+                    gauge.add_metric([name], max(getattr(pool, stat)(), 0))
+        return gauges.values()
+
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
+
+def instrument_engine(name: str, engine: Engine):
+    """Count statements per request and expose pool stats for a (sync) engine"""
+    event.listen(engine, "before_cursor_execute", _count_query)
+    event.listen(engine, "checkout", lambda *args: DB_POOL_CHECKOUTS.labels(name).inc())
+    pool_collector.add(name, engine)
+    logger.debug("Instrumented %s database engine", name)
+
+def render_metrics():
+    """Return (body, content type) for the metrics endpoint"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        # Request metrics are summed over all workers; pool stats are this worker's only
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(pool_collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """Record latency, in-flight requests and DB statement counts per route template
+
+    Pure ASGI rather than @app.middleware("http"), which runs every request in an extra task.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        counter = _QueryCount()
+        token = _query_count.set(counter)
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            in_progress.dec()
+            _query_count.reset(token)
+            # The router stores the matched route in the scope, so labels use the template, not the path
+            route = scope.get("route")
+            route_path = getattr(route, "path", UNMATCHED_ROUTE)
+            REQUEST_LATENCY.labels(method, route_path, str(status)).observe(duration)
+            DB_QUERIES.labels(method, route_path).inc(counter.value)
+            DB_QUERIES_PER_REQUEST.labels(method, route_path).observe(counter.value)
+            logger.debug("Request completed: %s %s - Status: %s - Duration: %.4fs - Queries: %s", method, scope['path'], status, duration, counter.value)
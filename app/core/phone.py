@@ -0,0 +1,43 @@
+from typing import Optional
+import os
+import re
+
+# Country code assumed for numbers written without one
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "91")
+# Digits of a national number in that country, without the trunk prefix 0
+PHONE_NATIONAL_DIGITS = int(os.getenv("PHONE_NATIONAL_DIGITS", "10"))
+
+# Formatting people put in phone numbers
+_SEPARATORS = re.compile(r"[\s\-().]")
+
+def normalize_phone(raw: Optional[str]) -> Optional[str]:
+    """E.164 form of a phone number ("+919876543210"), or None if it cannot be one
+
+    "+91 98765 43210", "0091 9876543210", "09876543210" and "9876543210" all give the same
+    result; numbers without a country code get PHONE_DEFAULT_COUNTRY_CODE.
+    """
+    if raw is None:
+        return None
+    value = _SEPARATORS.sub("", raw)
+    country, national = PHONE_DEFAULT_COUNTRY_CODE, PHONE_NATIONAL_DIGITS
+    if value.startswith("+"):
+        digits = value[1:]
+    elif value.startswith("00"):
+        digits = value[2:]
+    else:
+        if len(value) == national + 1 and value.startswith("0"):
+            value = value[1:]  # Trunk prefix
+        digits = country + value if len(value) == national else value
+    # "+91 (0)98765 43210": a trunk prefix after the country code
+    if len(digits) == len(country) + 1 + national and digits.startswith(country + "0"):
+        digits = country + digits[len(country) + 1:]
+    if not digits.isdigit() or not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+def same_phone(a: str, b: str) -> bool:
+    """Whether two phone numbers are the same number, however they are written"""
+    normalized = normalize_phone(a)
+    if normalized is None:
+        return a == b
+    return normalized == normalize_phone(b)
@@ -0,0 +1,52 @@
+from datetime import date, time
+from typing import Any, Iterable, List, Sequence
+import hashlib
+import json
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+def _isoformat(value: Any) -> str:
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Encode JSON with orjson when installed; dates and times are written as ISO 8601"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_isoformat, ensure_ascii=False, separators=(",", ":")).encode()
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded by dumps(); also the app's default response class"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def rows_to_dicts(fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[dict]:
+    """Pair column tuples fetched from the database with their response field names
+
+    The rows come straight from typed columns, so they are not validated again.
+    """
+    return [dict(zip(fields, row)) for row in rows]
+
+def ndjson_chunk(fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """Encode rows as newline-delimited JSON objects"""
+    return b"".join(dumps(row) + b"\n" for row in rows_to_dicts(fields, rows))
+
+def etag(body: bytes) -> str:
+    """Strong entity tag for a response body"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(request: Request, tag: str) -> bool:
+    """True if If-None-Match lists `tag` (weak comparison) or is "*" """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return "*" in candidates or tag in candidates
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import logging
+import os
+import secrets
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Signs session tokens and OTP digests; must be the same for every worker and replica
+SESSION_TOKEN_SECRET = os.getenv("SESSION_TOKEN_SECRET")
+SESSION_TOKEN_TTL_SECONDS = int(os.getenv("SESSION_TOKEN_TTL_SECONDS", "900"))
+SESSION_TOKEN_ALGORITHM = "HS256"
+# Token type claim, so other tokens signed with the same secret are not accepted as sessions
+SESSION_TOKEN_TYPE = "otp-session"
+
+# Worker processes of this server; gunicorn.conf.py exports the number it starts
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+
+if not SESSION_TOKEN_SECRET and WEB_CONCURRENCY > 1:
+    raise RuntimeError(
+        f"SESSION_TOKEN_SECRET must be set with {WEB_CONCURRENCY} workers; "
+        "a random secret per worker rejects sessions signed by the others"
+    )
+if not SESSION_TOKEN_SECRET:
+    logger.warning("SESSION_TOKEN_SECRET is not set; using a random secret, so sessions only work on this worker")
+    SESSION_TOKEN_SECRET = secrets.token_urlsafe(32)
+
+class InvalidSessionToken(Exception):
+    """The session token is malformed, expired or not signed by us"""
+
+def create_session_token(
+    phone: str,
+    ttl_seconds: int = SESSION_TOKEN_TTL_SECONDS,
+    secret: Optional[str] = None,
+) -> str:
+    """Sign a short-lived token proving the holder verified an OTP for `phone`"""
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": phone,
+        "typ": SESSION_TOKEN_TYPE,
+        "iat": now,
+        "exp": now + timedelta(seconds=ttl_seconds),
+    }
+    return jwt.encode(claims, secret or SESSION_TOKEN_SECRET, algorithm=SESSION_TOKEN_ALGORITHM)
+
+def decode_session_token(token: str, secret: Optional[str] = None) -> str:
+    """Return the verified phone number of a session token; raise InvalidSessionToken otherwise"""
+    try:
+        claims = jwt.decode(token, secret or SESSION_TOKEN_SECRET, algorithms=[SESSION_TOKEN_ALGORITHM])
+    except JWTError as e:
+        raise InvalidSessionToken(str(e))
+    if claims.get("typ") != SESSION_TOKEN_TYPE or not claims.get("sub"):
+        raise InvalidSessionToken("Not a session token")
+    return claims["sub"]
+
+bearer = HTTPBearer(auto_error=False, description="Session token from POST /auth/verify-otp")
+
+async def verified_phone(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> str:
+    """Dependency returning the phone number the caller verified; checks the signature only, no DB or store lookup"""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Session token required", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return decode_session_token(credentials.credentials)
+    except InvalidSessionToken as e:
+        logger.warning("Rejected session token: %s", e)
+        raise HTTPException(status_code=401, detail="Invalid or expired session token", headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,71 @@
+"""Size the production server from the container's cgroup limits (see gunicorn.conf.py).
+
+Only the standard library is imported here: gunicorn.conf.py loads this module in the
+master process, before any worker imports the application.
+"""
+from typing import Optional
+import math
+import os
+
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup")
+# Resident memory budgeted per worker process when a memory limit applies
+WORKER_MEMORY_MB = int(os.getenv("WORKER_MEMORY_MB", "160"))
+# Worker processes per available CPU; async workers need one per core, not 2n+1
+WORKERS_PER_CPU = float(os.getenv("WORKERS_PER_CPU", "1"))
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def cpu_limit(root: str = CGROUP_ROOT) -> float:
+    """CPUs this process may use: the cgroup quota (v2 or v1) if set, else the usable cores"""
+    quota = period = None
+    cpu_max = _read(os.path.join(root, "cpu.max"))
+    if cpu_max:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        quota, _, period = cpu_max.partition(" ")
+    else:
+        quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+        period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        cores = os.cpu_count() or 1
+    if quota and period and quota not in ("max", "-1"):
+        return min(int(quota) / int(period), cores)
+    return float(cores)
+
+def memory_limit(root: str = CGROUP_ROOT) -> Optional[int]:
+    """Memory limit in bytes from cgroup v2 or v1, or None when unlimited"""
+    value = _read(os.path.join(root, "memory.max")) or _read(os.path.join(root, "memory", "memory.limit_in_bytes"))
+    if not value or value == "max":
+        return None
+    limit = int(value)
+    # cgroup v1 reports "unlimited" as a huge page-aligned number
+    return None if limit >= 1 << 60 else limit
+
+def worker_count(cpus: float, memory: Optional[int], worker_memory_mb: int = WORKER_MEMORY_MB,
+                 workers_per_cpu: float = WORKERS_PER_CPU) -> int:
+    """Workers that fit the CPU quota and the memory limit, at least one"""
+    workers = math.ceil(cpus * workers_per_cpu)
+    if memory is not None:
+        workers = min(workers, memory // (worker_memory_mb * 1024 * 1024))
+    return max(1, int(workers))
+
+def default_workers(root: str = CGROUP_ROOT) -> int:
+    """WEB_CONCURRENCY if set, else worker_count() for this container"""
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.getenv("WEB_CONCURRENCY"))
+    return worker_count(cpu_limit(root), memory_limit(root))
+
+def threadpool_size() -> int:
+    """Threads per worker for blocking database calls: THREADPOOL_SIZE, else one per pooled connection
+
+    Threads beyond DB_POOL_SIZE + DB_MAX_OVERFLOW would only wait for a connection.
+    """
+    if os.getenv("THREADPOOL_SIZE"):
+        return int(os.getenv("THREADPOOL_SIZE"))
+    return int(os.getenv("DB_POOL_SIZE", "5")) + int(os.getenv("DB_MAX_OVERFLOW", "10"))
@@ -0,0 +1,296 @@
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from datetime import date, time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from app.core.phone import normalize_phone
+from app.models.appointment import Appointment as AppointmentModel
+from app.models.appointment_archive import COPIED_COLUMNS, ArchivedAppointment
+from app.schemas.appointment import Appointment, AppointmentCreateRequest, AppointmentFilters
+from app.services import reservations, slot_capacity
+from app.services.id_allocator import allocator
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Apart from aiter_appointment_batches, these functions take a synchronous Session
+# so the same code serves both the threadpool path and AsyncSession.run_sync
+# (see app.db.base.run_db).
+
+# Position of the last row returned: (date, time, appointmentId)
+KeysetCursor = Tuple[date, time, str]
+
+# Rows fetched per round trip from the server-side cursor when streaming
+STREAM_BATCH_SIZE = 1000
+
+# Columns of the Appointment response schema, in field order; selecting them instead of the
+# entity skips ORM identity-map bookkeeping for rows that are only serialized
+APPOINTMENT_FIELDS = list(Appointment.__fields__)
+APPOINTMENT_COLUMNS = [getattr(AppointmentModel, field) for field in APPOINTMENT_FIELDS]
+
+def select_appointments(
+    filters: AppointmentFilters,
+    after: Optional[KeysetCursor] = None,
+    columns: Optional[List[Any]] = None,
+) -> Select:
+    """Build the filtered SELECT ordered by (date, time, appointmentId), starting after `after`"""
+    stmt = select(*columns) if columns else select(AppointmentModel)
+    if filters.dateFrom is not None:
+        stmt = stmt.where(AppointmentModel.date >= filters.dateFrom)
+    if filters.dateTo is not None:
+        stmt = stmt.where(AppointmentModel.date <= filters.dateTo)
+    if filters.department is not None:
+        stmt = stmt.where(AppointmentModel.department == filters.department)
+    if filters.doctorName is not None:
+        stmt = stmt.where(AppointmentModel.doctorName == filters.doctorName)
+    if filters.patientId is not None:
+        stmt = stmt.where(AppointmentModel.patientId == filters.patientId)
+    if filters.isCancelled is not None:
+        stmt = stmt.where(AppointmentModel.isCancelled == filters.isCancelled)
+    if after is not None:
+        stmt = stmt.where(
+            tuple_(AppointmentModel.date, AppointmentModel.time, AppointmentModel.appointmentId) > tuple_(*after)
+        )
+    return stmt.order_by(AppointmentModel.date, AppointmentModel.time, AppointmentModel.appointmentId)
+
+def keyset_cursor(appointment: AppointmentModel) -> KeysetCursor:
+    """Return the keyset position of an appointment"""
+    return (appointment.date, appointment.time, appointment.appointmentId)
+
+def list_appointments(
+    db: Session,
+    filters: AppointmentFilters,
+    limit: int,
+    after: Optional[KeysetCursor] = None,
+) -> List[AppointmentModel]:
+    """Return up to `limit` appointments after the keyset cursor"""
+    return db.execute(select_appointments(filters, after).limit(limit)).scalars().all()
+
+def list_appointment_rows(
+    db: Session,
+    filters: AppointmentFilters,
+    limit: int,
+    after: Optional[KeysetCursor] = None,
+) -> List[Tuple]:
+    """list_appointments() as APPOINTMENT_COLUMNS tuples"""
+    return db.execute(select_appointments(filters, after, APPOINTMENT_COLUMNS).limit(limit)).all()
+
+def iter_appointment_batches(
+    db: Session,
+    filters: AppointmentFilters,
+    after: Optional[KeysetCursor] = None,
+) -> Iterator[List[Tuple]]:
+    """Yield appointments as APPOINTMENT_COLUMNS tuples in batches from a server-side cursor"""
+    stmt = select_appointments(filters, after, APPOINTMENT_COLUMNS).execution_options(yield_per=STREAM_BATCH_SIZE)
+    for batch in db.execute(stmt).partitions():
+        yield batch
+
+async def aiter_appointment_batches(
+    db: AsyncSession,
+    filters: AppointmentFilters,
+    after: Optional[KeysetCursor] = None,
+) -> AsyncIterator[List[Tuple]]:
+    """Async counterpart of iter_appointment_batches"""
+    stmt = select_appointments(filters, after, APPOINTMENT_COLUMNS).execution_options(yield_per=STREAM_BATCH_SIZE)
+    result = await db.stream(stmt)
+    async for batch in result.partitions():
+        yield batch
+
+def get_appointment(db: Session, appointmentId: str) -> Optional[AppointmentModel]:
+    """Return an appointment by ID, or None"""
+    return db.query(AppointmentModel).filter(AppointmentModel.appointmentId == appointmentId).first()
+
+# Columns of an upcoming-appointment lookup, all held by idx_appointments_phone_upcoming
+UPCOMING_FIELDS = ["appointmentId", "name", "date", "time"]
+
+def list_upcoming_appointments_by_phone(
+    db: Session, phone_normalized: str, after: Tuple[date, time], limit: int
+) -> List[Tuple]:
+    """UPCOMING_FIELDS of a phone number's active appointments at or after `after`, soonest
+    first; answered by an index-only scan of idx_appointments_phone_upcoming"""
+    stmt = select(*(getattr(AppointmentModel, field) for field in UPCOMING_FIELDS)).where(
+        AppointmentModel.phone_normalized == phone_normalized,
+        AppointmentModel.isCancelled == False,
+        tuple_(AppointmentModel.date, AppointmentModel.time) >= after,
+    ).order_by(AppointmentModel.date, AppointmentModel.time).limit(limit)
+    return db.execute(stmt).all()
+
+def count_booked_by_slot(
+    db: Session,
+    start: date,
+    end: date,
+    doctorName: Optional[str] = None,
+    department: Optional[str] = None,
+) -> Dict[Tuple[date, time], int]:
+    """Return the number of active appointments per (date, time) from `start` to `end`, in one aggregate"""
+    stmt = select(AppointmentModel.date, AppointmentModel.time, func.count()).where(
+        AppointmentModel.date >= start,
+        AppointmentModel.date <= end,
+        AppointmentModel.isCancelled == False,
+    )
+    if doctorName is not None:
+        stmt = stmt.where(AppointmentModel.doctorName == doctorName)
+    if department is not None:
+        stmt = stmt.where(AppointmentModel.department == department)
+    stmt = stmt.group_by(AppointmentModel.date, AppointmentModel.time)
+    return {(slot_date, slot_time): count for slot_date, slot_time, count in db.execute(stmt)}
+
+class BookingConflictError(Exception):
+    """Raised when a concurrent booking for the same patient won the race"""
+
+# Replace a patient's appointment in a single statement. patientId is unique, so the
+# previous appointment (if any) is locked, copied to the archive, its slot released,
+# and the row overwritten through ON CONFLICT. Slot capacity changes are netted per
+# slot so the same counter row is never updated twice in one statement. If another
+# transaction booked the patient after our snapshot was taken, the conflicting row is
+# not the one we locked and nothing is returned.
+_CREATE_APPOINTMENT_SQL = text("""
+WITH previous AS (
+    SELECT *
+    FROM appointments
+    WHERE "patientId" = :patientId
+    FOR UPDATE
+),
+archived AS (
+    INSERT INTO appointments_archive (
+        "appointmentId", "patientId", "name", "date", "time", "department", "doctorName",
+        "userPhoneNumber", "phone_normalized", "isCancelled", "created_at", "updated_at",
+        "archivedAt", "archiveReason"
+    )
+    SELECT "appointmentId", "patientId", "name", "date", "time", "department", "doctorName",
+           "userPhoneNumber", "phone_normalized", "isCancelled", "created_at", "updated_at",
+           now(), 'replaced'
+    FROM previous
+),
+slot_changes AS (
+    INSERT INTO slot_capacity ("date", "doctorName", "department", "bookedCount")
+    SELECT "date", "doctorName", "department", SUM(delta)
+    FROM (
+        SELECT "date", "doctorName", "department", -1 AS delta
+        FROM previous
+        WHERE NOT COALESCE("isCancelled", FALSE)
+        UNION ALL
+        SELECT CAST(:date AS DATE), CAST(:doctorName AS VARCHAR), CAST(:department AS VARCHAR), 1
+    ) AS changes
+    GROUP BY "date", "doctorName", "department"
+    ON CONFLICT ("date", "doctorName", "department")
+    DO UPDATE SET "bookedCount" = slot_capacity."bookedCount" + EXCLUDED."bookedCount",
+                  "updated_at" = now()
+)
+INSERT INTO appointments (
+    "appointmentId", "patientId", "name", "date", "time", "department",
+    "doctorName", "userPhoneNumber", "phone_normalized", "isCancelled", "created_at", "updated_at"
+)
+VALUES (
+    :appointmentId, :patientId, :name, :date, :time, :department,
+    :doctorName, :userPhoneNumber, :phone_normalized, FALSE, now(), now()
+)
+ON CONFLICT ("patientId") DO UPDATE SET
+    "appointmentId" = EXCLUDED."appointmentId",
+    "name" = EXCLUDED."name",
+    "date" = EXCLUDED."date",
+    "time" = EXCLUDED."time",
+    "department" = EXCLUDED."department",
+    "doctorName" = EXCLUDED."doctorName",
+    "userPhoneNumber" = EXCLUDED."userPhoneNumber",
+    "phone_normalized" = EXCLUDED."phone_normalized",
+    "isCancelled" = FALSE,
+    "created_at" = EXCLUDED."created_at",
+    "updated_at" = EXCLUDED."updated_at"
+WHERE appointments."appointmentId" = (SELECT "appointmentId" FROM previous)
+RETURNING *, (SELECT "appointmentId" FROM previous) AS "replacedAppointmentId"
+""")
+
+def _create_appointment_statement(db: Session, values: Dict[str, Any]) -> Tuple[AppointmentModel, List[str]]:
+    row = db.execute(_CREATE_APPOINTMENT_SQL, values).mappings().one_or_none()
+    if row is None:
+        raise BookingConflictError(f"Concurrent booking for patient {values['patientId']}")
+    db_appointment = AppointmentModel(**{column.key: row[column.key] for column in AppointmentModel.__table__.columns})
+    replaced_ids = [row["replacedAppointmentId"]] if row["replacedAppointmentId"] else []
+    return db_appointment, replaced_ids
+
+def _create_appointment_orm(db: Session, values: Dict[str, Any]) -> Tuple[AppointmentModel, List[str]]:
+    """Portable equivalent of _CREATE_APPOINTMENT_SQL for databases without data-modifying CTEs"""
+    existing_appointments = db.query(AppointmentModel).filter(
+        AppointmentModel.patientId == values["patientId"]
+    ).all()
+    for existing_appointment in existing_appointments:
+        logger.debug("Archiving appointment %s for patient %s", existing_appointment.appointmentId, values['patientId'])
+        slot_capacity.track_change(db, slot_capacity.slot_key(existing_appointment), None)
+        db.add(ArchivedAppointment(
+            archiveReason="replaced", **{column: getattr(existing_appointment, column) for column in COPIED_COLUMNS}
+        ))
+        db.delete(existing_appointment)
+    db.flush()
+
+    db_appointment = AppointmentModel(isCancelled=False, **values)
+    db.add(db_appointment)
+    slot_capacity.track_change(db, None, slot_capacity.slot_key(db_appointment))
+    db.flush()
+    # Keep the returned values as written; a later booking may replace the row
+    db.expunge(db_appointment)
+    return db_appointment, [existing.appointmentId for existing in existing_appointments]
+
+def create_appointment(db: Session, appointment: AppointmentCreateRequest) -> Tuple[AppointmentModel, List[str]]:
+    """Atomically replace the patient's appointment; return the new one and the replaced IDs
+
+    Raises reservations.SlotUnavailableError if the slot is booked, held or being booked.
+    """
+    values = appointment.dict(exclude={"holdId"})
+    values["phone_normalized"] = normalize_phone(appointment.userPhoneNumber)
+    try:
+        # Fail fast on a contended slot before doing any other work
+        reservations.reserve_slot(
+            db, appointment.doctorName, appointment.date, appointment.time, appointment.holdId, appointment.patientId
+        )
+        values["appointmentId"] = allocator.allocate(db)
+        logger.debug("Creating appointment %s for patient %s on %s at %s", values['appointmentId'], appointment.patientId, appointment.date, appointment.time)
+        if db.get_bind().dialect.name == "postgresql":
+            created = _create_appointment_statement(db, values)
+        else:
+            created = _create_appointment_orm(db, values)
+        db.commit()
+        return created
+    except IntegrityError as e:
+        db.rollback()
+        if reservations.is_slot_conflict(e):
+            raise reservations.SlotUnavailableError("Slot is already booked") from e
+        raise BookingConflictError(f"Concurrent booking for patient {appointment.patientId}") from e
+    except Exception:
+        db.rollback()
+        raise
+
+def patch_appointment(db: Session, appointmentId: str, update_data: Dict[str, Any]) -> Optional[AppointmentModel]:
+    """Apply the provided fields to an appointment; return None if it does not exist"""
+    try:
+        db_appointment = get_appointment(db, appointmentId)
+        if db_appointment is None:
+            return None
+
+        logger.debug("Fields to update: %s", list(update_data.keys()))
+        slot_before = slot_capacity.slot_key(db_appointment)
+        for key, value in update_data.items():
+            if value is not None:
+                logger.debug("Setting %s = %s", key, value)
+                setattr(db_appointment, key, value)
+
+        slot_after = slot_capacity.slot_key(db_appointment)
+        if slot_after is not None and (slot_before is None or {"date", "time", "doctorName"} & set(update_data)):
+            reservations.reserve_slot(db, db_appointment.doctorName, db_appointment.date, db_appointment.time)
+        # Move the booking between slot counters if the date, doctor, department or cancellation changed
+        slot_capacity.track_change(db, slot_before, slot_after)
+        db.commit()
+        db.refresh(db_appointment)
+        return db_appointment
+    except IntegrityError as e:
+        db.rollback()
+        if reservations.is_slot_conflict(e):
+            raise reservations.SlotUnavailableError("Slot is already booked") from e
+        raise
+    except Exception:
+        db.rollback()
+        raise
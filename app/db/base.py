@@ -1,45 +1,184 @@
-from sqlalchemy import create_engine
+from sqlalchemy import DateTime, create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.functions import FunctionElement
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Callable, Dict, List, Optional, Union
 import os
+import ssl
 import logging
-from dotenv import load_dotenv
+import threading
 import certifi
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Serve requests through AsyncSession + asyncpg instead of the blocking driver
+DB_ASYNC = os.getenv("DB_ASYNC", "False").lower() == "true"
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-logger.info("Connecting to database")
-logger.debug(f"Database URL: {DATABASE_URL.split('@')[0].split(':')[0]}:***@{DATABASE_URL.split('@')[1]}")
+# libpq sslmode; "disable" is only meant for local databases such as the benchmark stack
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
 
-# Create engine with SSL configuration
-try:
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={
-            "sslmode": "require",
+# Connection pool sizing, shared by the sync and async engines
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Connections opened at startup, so the first requests of a new worker do not pay for them
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", str(DB_POOL_SIZE)))
+
+# Run create_all when a server process starts; migrations (alembic upgrade head) are preferred
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "True").lower() == "true"
+
+# Engines are created on first use, so importing the app needs neither DATABASE_URL nor the network.
+# `engine` and `async_engine` still resolve as module attributes (see __getattr__ below).
+_engine: Optional[Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_engine_lock = threading.Lock()
+_engine_hooks: List[Callable[[str, Engine], None]] = []
+
+def database_url() -> str:
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        raise RuntimeError("DATABASE_URL is not set")
+    return url
+
+def on_engine_created(hook: Callable[[str, Engine], None]):
+    """Call hook(name, sync engine) for each engine ("sync", "async", replicas), once created
+
+    Hooks registered after an engine was created are called for the primary engines only.
+    """
+    _engine_hooks.append(hook)
+    if _engine is not None:
+        hook("sync", _engine)
+    if _async_engine is not None:
+        hook("async", _async_engine.sync_engine)
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """create_engine arguments for the database in `url`: PostgreSQL, or SQLite (a file or in memory)"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        options: Dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+        if parsed.database in (None, "", ":memory:"):
+            # Every connection to :memory: would open a new, empty database; share one instead
+            options["poolclass"] = StaticPool
+        return options
+    return {
+        "connect_args": {
+            "sslmode": DB_SSLMODE,
             "sslcert": None,
             "sslkey": None,
             "sslrootcert": certifi.where()
         },
-        pool_pre_ping=True,  # Enable connection health checks
-        pool_recycle=300,    # Recycle connections every 5 minutes
-        pool_size=5,         # Maximum number of connections in the pool
-        max_overflow=10      # Maximum number of connections that can be created beyond pool_size
-    )
-    logger.info("Database engine created successfully")
-except Exception as e:
-    logger.error(f"Error creating database engine: {str(e)}")
-    raise
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-logger.debug("Session factory created")
+        "pool_pre_ping": True,  # Enable connection health checks
+        "pool_recycle": 300,    # Recycle connections every 5 minutes
+        "pool_size": DB_POOL_SIZE,         # Maximum number of connections in the pool
+        "max_overflow": DB_MAX_OVERFLOW    # Maximum number of connections that can be created beyond pool_size
+    }
+
+def build_engine(name: str, url: str) -> Engine:
+    """Create an engine for `url` and run the on_engine_created hooks for it"""
+    logger.debug("Database URL (%s): %s", name, make_url(url).render_as_string(hide_password=True))
+    try:
+        created = create_engine(url, **engine_options(url))
+        logger.info("Database engine created successfully")
+    except Exception as e:
+        logger.error("Error creating database engine: %s", e)
+        raise
+    for hook in _engine_hooks:
+        hook(name, created)
+    return created
+
+def get_engine() -> Engine:
+    """Return the engine, creating it with SSL configuration on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                logger.info("Connecting to database")
+                _engine = build_engine("sync", database_url())
+    return _engine
+
+def _async_database_url(url: str):
+    """Point a postgresql:// URL at the asyncpg driver (asyncpg takes `ssl`, not `sslmode`)"""
+    return make_url(url).set(drivername="postgresql+asyncpg").difference_update_query(["sslmode"])
+
+def build_async_engine(name: str, url: str) -> AsyncEngine:
+    """Create an asyncpg engine for a postgresql:// `url` and run the on_engine_created hooks for it"""
+    if make_url(url).get_backend_name() != "postgresql":
+        raise RuntimeError("DB_ASYNC requires a PostgreSQL DATABASE_URL")
+    try:
+        created = create_async_engine(
+            _async_database_url(url),
+            connect_args={
+                "ssl": ssl.create_default_context(cafile=certifi.where()) if DB_SSLMODE != "disable" else False
+            },
+            pool_pre_ping=True,
+            pool_recycle=300,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW
+        )
+        logger.info("Async database engine created successfully")
+    except Exception as e:
+        logger.error("Error creating async database engine: %s", e)
+        raise
+    for hook in _engine_hooks:
+        hook(name, created.sync_engine)
+    return created
+
+def get_async_engine() -> Optional[AsyncEngine]:
+    """Return the async engine when DB_ASYNC is set, creating it on first use"""
+    global _async_engine
+    if not DB_ASYNC:
+        return None
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = build_async_engine("async", database_url())
+    return _async_engine
+
+def __getattr__(name: str):
+    # `from app.db.base import engine` keeps working; it creates the engine at that point
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def dispose_engines():
+    """Close the pooled connections of the engines created so far"""
+    if _engine is not None:
+        _engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker that binds the engine when the first session is opened"""
+
+    def __call__(self, **local_kw) -> Session:
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+class _LazyAsyncSessionmaker(async_sessionmaker):
+    """async_sessionmaker that binds the async engine when the first session is opened"""
+
+    def __call__(self, **local_kw) -> AsyncSession:
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_async_engine())
+        return super().__call__(**local_kw)
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+
+# Objects must stay readable after commit without an implicit (blocking) refresh
+AsyncSessionLocal = _LazyAsyncSessionmaker(autoflush=False, expire_on_commit=False) if DB_ASYNC else None
 
 Base = declarative_base()
 
+DbSession = Union[Session, AsyncSession]
+
 def get_db():
     logger.debug("Getting database session")
     db = SessionLocal()
@@ -47,8 +186,90 @@ def get_db():
         logger.debug("Database session obtained")
         yield db
     except Exception as e:
-        logger.error(f"Database session error: {str(e)}")
+        logger.error("Database session error: %s", e)
         raise
     finally:
         logger.debug("Closing database session")
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    logger.debug("Getting async database session")
+    db = AsyncSessionLocal()
+    try:
+        logger.debug("Async database session obtained")
+        yield db
+    except Exception as e:
+        logger.error("Database session error: %s", e)
+        raise
+    finally:
+        logger.debug("Closing async database session")
+        await db.close()
+
+# Dependency used by the route handlers
+get_session = get_async_db if DB_ASYNC else get_db
+
+def create_schema():
+    """Create missing tables for every model"""
+    from app.models import appointment, appointment_archive, notification, schedule, slot_capacity, slot_hold  # noqa: F401
+    logger.info("Creating database tables if they don't exist")
+    Base.metadata.create_all(bind=get_engine())
+
+def warm_pool(connections: int = DB_POOL_WARM):
+    """Open up to `connections` pooled connections at once and return them to the pool"""
+    connections = min(connections, DB_POOL_SIZE)
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = get_engine().connect()
+            opened.append(connection)
+            connection.exec_driver_sql("SELECT 1")
+    finally:
+        for connection in opened:
+            connection.close()
+    logger.debug("Warmed %s pooled connection(s)", len(opened))
+
+async def warm_async_pool(connections: int = DB_POOL_WARM):
+    """warm_pool() for the async engine"""
+    connections = min(connections, DB_POOL_SIZE)
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = await get_async_engine().connect()
+            opened.append(connection)
+            await connection.exec_driver_sql("SELECT 1")
+    finally:
+        for connection in opened:
+            await connection.close()
+    logger.debug("Warmed %s pooled async connection(s)", len(opened))
+
+class seconds_from_now(FunctionElement):
+    """SQL for the database clock plus a number of seconds; `now() + interval` does not exist in SQLite"""
+    type = DateTime()
+    name = "seconds_from_now"
+    inherit_cache = True
+
+@compiles(seconds_from_now)
+def _seconds_from_now(element, compiler, **kw):
+    return f"now() + make_interval(secs => {compiler.process(element.clauses, **kw)})"
+
+@compiles(seconds_from_now, "sqlite")
+def _seconds_from_now_sqlite(element, compiler, **kw):
+    # Same text format as CURRENT_TIMESTAMP, which SQLAlchemy's func.now() renders on SQLite
+    return f"datetime('now', ({compiler.process(element.clauses, **kw)}) || ' seconds')"
+
+def dialect_insert(db: Session):
+    """Return the dialect specific INSERT construct that supports ON CONFLICT"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported for dialect {dialect}")
+    return insert
+
+async def run_db(db: DbSession, fn, *args, **kwargs):
+    """Run a synchronous database function with either session type without blocking the event loop"""
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
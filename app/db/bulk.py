@@ -0,0 +1,358 @@
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from typing import Any, Dict, Iterable, IO, Iterator, List, Optional, Set, Tuple
+import csv
+import io
+import itertools
+import json
+import logging
+
+from app.core.phone import normalize_phone
+from app.models.appointment import Appointment as AppointmentModel
+from app.models.appointment_archive import COPIED_COLUMNS, ArchivedAppointment
+from app.models.slot_hold import SlotHold
+from app.schemas.appointment import AppointmentImportRecord
+from app.services import reservations, slot_capacity
+from app.services.id_allocator import allocator
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Rows validated and copied per batch
+BATCH_SIZE = 5000
+
+# Columns of an appointment as imported and exported
+RECORD_COLUMNS = [
+    "appointmentId", "patientId", "name", "date", "time",
+    "department", "doctorName", "userPhoneNumber",
+]
+
+# Columns loaded into the staging table, in COPY order
+IMPORT_COLUMNS = RECORD_COLUMNS + ["phone_normalized", "isCancelled"]
+
+# Columns written by export, in COPY order
+EXPORT_COLUMNS = RECORD_COLUMNS + ["isCancelled", "created_at", "updated_at"]
+
+def _quoted(columns: List[str]) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+_CREATE_STAGING_SQL = f"""
+CREATE TEMP TABLE appointments_import ON COMMIT DROP AS
+SELECT {_quoted(IMPORT_COLUMNS)} FROM appointments WITH NO DATA
+"""
+
+# Imported patients replace their existing appointment, which is archived as with POST /appointments/
+_REMOVE_REPLACED_SQL = f"""
+WITH removed AS (
+    DELETE FROM appointments a
+    USING appointments_import i
+    WHERE a."patientId" = i."patientId"
+    RETURNING a.*
+),
+archived AS (
+    INSERT INTO appointments_archive ({_quoted(COPIED_COLUMNS)}, "archivedAt", "archiveReason")
+    SELECT {_quoted(COPIED_COLUMNS)}, now(), 'replaced' FROM removed
+)
+INSERT INTO slot_capacity ("date", "doctorName", "department", "bookedCount")
+SELECT "date", "doctorName", "department", -COUNT(*)
+FROM removed
+WHERE NOT COALESCE("isCancelled", FALSE)
+GROUP BY "date", "doctorName", "department"
+ON CONFLICT ("date", "doctorName", "department")
+DO UPDATE SET "bookedCount" = slot_capacity."bookedCount" + EXCLUDED."bookedCount",
+              "updated_at" = now()
+"""
+
+# Active staged rows whose slot is held, or booked by a patient the import does not move away
+_REJECT_TAKEN_SLOTS_SQL = """
+DELETE FROM appointments_import i
+WHERE NOT i."isCancelled" AND (EXISTS (
+    SELECT 1 FROM appointments a
+    WHERE a."doctorName" = i."doctorName" AND a."date" = i."date" AND a."time" = i."time"
+      AND NOT a."isCancelled"
+      AND NOT EXISTS (SELECT 1 FROM appointments_import j WHERE j."patientId" = a."patientId")
+) OR EXISTS (
+    SELECT 1 FROM slot_holds h
+    WHERE h."doctorName" = i."doctorName" AND h."date" = i."date" AND h."time" = i."time"
+      AND h."expiresAt" > :now
+))
+RETURNING i."appointmentId"
+"""
+
+_INSERT_IMPORTED_SQL = f"""
+WITH inserted AS (
+    INSERT INTO appointments ({_quoted(IMPORT_COLUMNS)})
+    SELECT {_quoted(IMPORT_COLUMNS)} FROM appointments_import
+    RETURNING "date", "doctorName", "department", "isCancelled"
+)
+INSERT INTO slot_capacity ("date", "doctorName", "department", "bookedCount")
+SELECT "date", "doctorName", "department", COUNT(*)
+FROM inserted
+WHERE NOT "isCancelled"
+GROUP BY "date", "doctorName", "department"
+ON CONFLICT ("date", "doctorName", "department")
+DO UPDATE SET "bookedCount" = slot_capacity."bookedCount" + EXCLUDED."bookedCount",
+              "updated_at" = now()
+"""
+
+_INSERT_STAGING_SQL = text(
+    f"INSERT INTO appointments_import ({_quoted(IMPORT_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + column for column in IMPORT_COLUMNS)})"
+)
+
+def parse_records(body: bytes, ndjson: bool) -> Iterator[Any]:
+    """Yield the records of a JSON array or NDJSON body; undecodable NDJSON lines yield the error"""
+    if not ndjson:
+        records = json.loads(body)
+        if not isinstance(records, list):
+            raise ValueError("Expected a JSON array of appointments")
+        yield from records
+        return
+    for line in body.decode().splitlines():
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+def read_file_records(f: IO[str], file_format: str) -> Iterator[Any]:
+    """Yield records from a CSV (with header), NDJSON or JSON array file"""
+    if file_format == "csv":
+        yield from csv.DictReader(f)
+    elif file_format == "ndjson":
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+    else:
+        yield from json.load(f)
+
+def _validate_batch(
+    batch: List[Tuple[int, Any]],
+    seen_patients: Set[str],
+    seen_slots: Set[Tuple[Any, ...]],
+    seen_ids: Set[str],
+) -> Tuple[List[Tuple[int, AppointmentImportRecord]], List[Dict[str, Any]]]:
+    valid, errors = [], []
+    for row, record in batch:
+        if isinstance(record, Exception):
+            errors.append({"row": row, "errors": [f"Invalid JSON: {record}"]})
+            continue
+        if not isinstance(record, dict):
+            errors.append({"row": row, "errors": ["Expected a JSON object"]})
+            continue
+        try:
+            appointment = AppointmentImportRecord(**record)
+        except ValidationError as e:
+            messages = [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+            errors.append({"row": row, "errors": messages})
+            continue
+        if appointment.patientId in seen_patients:
+            errors.append({"row": row, "errors": [f"patientId: duplicate of an earlier row ({appointment.patientId})"]})
+            continue
+        if appointment.appointmentId is not None and appointment.appointmentId in seen_ids:
+            errors.append({"row": row, "errors": [f"appointmentId: duplicate of an earlier row ({appointment.appointmentId})"]})
+            continue
+        # Cancelled appointments do not occupy their slot
+        slot = (appointment.doctorName, appointment.date, appointment.time)
+        if not appointment.isCancelled and slot in seen_slots:
+            errors.append({"row": row, "errors": [f"time: slot already taken by an earlier row ({appointment.doctorName}, {appointment.date} {appointment.time})"]})
+            continue
+        seen_patients.add(appointment.patientId)
+        if appointment.appointmentId is not None:
+            seen_ids.add(appointment.appointmentId)
+        if not appointment.isCancelled:
+            seen_slots.add(slot)
+        valid.append((row, appointment))
+    return valid, errors
+
+def validate_records(records: Iterable[Any]) -> Tuple[List[Tuple[int, AppointmentImportRecord]], List[Dict[str, Any]]]:
+    """(row number, appointment) of the valid records and the errors of the others, rows numbered from 1"""
+    return _validate_batch(list(enumerate(records, start=1)), set(), set(), set())
+
+def _assign_ids(db: Session, appointments: List[AppointmentImportRecord]) -> List[str]:
+    """The appointmentId each row is imported with: its own when no other patient's appointment,
+    current or archived, has that ID (re-importing an export keeps its IDs), else a fresh one"""
+    requested = {appointment.appointmentId for appointment in appointments if appointment.appointmentId is not None}
+    owners: Dict[str, Set[str]] = {}
+    for model in (AppointmentModel, ArchivedAppointment):
+        for appointment_id, patient_id in db.execute(
+            select(model.appointmentId, model.patientId).where(model.appointmentId.in_(requested))
+        ):
+            owners.setdefault(appointment_id, set()).add(patient_id)
+    assigned = []
+    for appointment in appointments:
+        if appointment.appointmentId is not None and owners.get(appointment.appointmentId, set()) <= {appointment.patientId}:
+            assigned.append(appointment.appointmentId)
+            continue
+        fresh = allocator.allocate(db)
+        while fresh in requested:
+            fresh = allocator.allocate(db)
+        assigned.append(fresh)
+    return assigned
+
+def _copy_into_staging(db: Session, rows: List[Dict[str, Any]]):
+    """Load rows into the staging table with COPY FROM STDIN (executemany on other drivers)"""
+    cursor = db.connection().connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        db.execute(_INSERT_STAGING_SQL, rows)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in IMPORT_COLUMNS])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY appointments_import ({_quoted(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+def _merge_rows_portable(db: Session, rows: List[Dict[str, Any]]) -> List[str]:
+    """Same as the staging-table statements below, for databases without COPY or data-modifying
+    CTEs (SQLite); returns the appointmentIds rejected because their slot is taken"""
+    now = reservations.utcnow()
+    # (held, current owner) of each active row's slot; cancelled rows take no slot
+    blockers: Dict[str, Tuple[bool, Optional[str]]] = {}
+    for row in rows:
+        if row["isCancelled"]:
+            continue
+        owner = db.execute(select(AppointmentModel.patientId).where(
+            AppointmentModel.doctorName == row["doctorName"],
+            AppointmentModel.date == row["date"],
+            AppointmentModel.time == row["time"],
+            AppointmentModel.isCancelled == False,
+        )).scalar()
+        held = db.execute(select(SlotHold.holdId).where(
+            SlotHold.doctorName == row["doctorName"],
+            SlotHold.date == row["date"],
+            SlotHold.time == row["time"],
+            SlotHold.expiresAt > now,
+        )).first()
+        blockers[row["appointmentId"]] = (held is not None, owner)
+
+    accepted, rejected = rows, []
+    # A patient whose own row is rejected keeps their slot, which can reject further rows
+    while True:
+        patients = {row["patientId"] for row in accepted}
+        taken = {
+            appointment_id for appointment_id, (held, owner) in blockers.items()
+            if held or (owner is not None and owner not in patients)
+        }
+        if not taken:
+            break
+        for appointment_id in taken:
+            del blockers[appointment_id]
+        rejected.extend(sorted(taken))
+        accepted = [row for row in accepted if row["appointmentId"] not in taken]
+
+    moving = [row["patientId"] for row in accepted]
+    for start in range(0, len(moving), BATCH_SIZE):
+        replaced = db.execute(
+            select(AppointmentModel).where(AppointmentModel.patientId.in_(moving[start:start + BATCH_SIZE]))
+        ).scalars().all()
+        for existing in replaced:
+            slot_capacity.track_change(db, slot_capacity.slot_key(existing), None)
+            db.add(ArchivedAppointment(
+                archiveReason="replaced", **{column: getattr(existing, column) for column in COPIED_COLUMNS}
+            ))
+            db.delete(existing)
+    db.flush()
+    for row in accepted:
+        appointment = AppointmentModel(**row)
+        db.add(appointment)
+        slot_capacity.track_change(db, None, slot_capacity.slot_key(appointment))
+    db.flush()
+    return rejected
+
+def import_appointments(db: Session, records: Iterable[Any]) -> Dict[str, Any]:
+    """Validate records in batches and load the valid ones in one transaction; report per-row errors"""
+    postgres = db.get_bind().dialect.name == "postgresql"
+    imported = 0
+    errors: List[Dict[str, Any]] = []
+    seen_patients: Set[str] = set()
+    seen_slots: Set[Tuple[Any, ...]] = set()
+    seen_ids: Set[str] = set()
+    # Staged appointmentId -> input row number, to report rows rejected after staging
+    staged_rows: Dict[str, int] = {}
+    # Valid rows kept in memory when there is no staging table
+    pending: List[Dict[str, Any]] = []
+    numbered = enumerate(records, start=1)
+    try:
+        if postgres:
+            db.execute(text(_CREATE_STAGING_SQL))
+        while True:
+            batch = list(itertools.islice(numbered, BATCH_SIZE))
+            if not batch:
+                break
+            valid, batch_errors = _validate_batch(batch, seen_patients, seen_slots, seen_ids)
+            errors.extend(batch_errors)
+            rows = []
+            appointment_ids = _assign_ids(db, [appointment for _, appointment in valid])
+            for (row_number, appointment), appointment_id in zip(valid, appointment_ids):
+                row = appointment.dict(exclude={"holdId"})
+                row["appointmentId"] = appointment_id
+                row["phone_normalized"] = normalize_phone(appointment.userPhoneNumber)
+                staged_rows[row["appointmentId"]] = row_number
+                rows.append(row)
+            if rows and postgres:
+                _copy_into_staging(db, rows)
+            elif rows:
+                pending.extend(rows)
+            imported += len(rows)
+            logger.debug("Staged batch of %s record(s): %s valid, %s rejected", len(batch), len(rows), len(batch_errors))
+        if imported and postgres:
+            # Autovacuum never analyzes temp tables; without stats the merge scans appointments
+            db.execute(text("ANALYZE appointments_import"))
+            rejected, now = [], reservations.utcnow()
+            # A patient whose own row is rejected keeps their slot, which can reject further rows
+            while True:
+                taken = list(db.execute(text(_REJECT_TAKEN_SLOTS_SQL), {"now": now}).scalars())
+                if not taken:
+                    break
+                rejected.extend(taken)
+            db.execute(text(_REMOVE_REPLACED_SQL))
+            db.execute(text(_INSERT_IMPORTED_SQL))
+        elif imported:
+            rejected = _merge_rows_portable(db, pending)
+        else:
+            rejected = []
+        for appointment_id in rejected:
+            errors.append({"row": staged_rows[appointment_id], "errors": ["time: slot is already booked or held"]})
+            imported -= 1
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if reservations.is_slot_conflict(e):
+            raise reservations.SlotUnavailableError("A slot in the import was booked concurrently") from e
+        raise
+    except Exception:
+        db.rollback()
+        raise
+    errors.sort(key=lambda error: error["row"])
+    logger.info("Imported %s appointment(s), rejected %s", imported, len(errors))
+    return {"imported": imported, "failed": len(errors), "errors": errors}
+
+def export_appointments(db: Session, out: IO[str]):
+    """Write every appointment to `out` as CSV with a header row, using COPY TO STDOUT (a query on SQLite)"""
+    cursor = db.connection().connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        writer = csv.writer(out)
+        writer.writerow(EXPORT_COLUMNS)
+        rows = db.execute(
+            select(*(getattr(AppointmentModel, column) for column in EXPORT_COLUMNS)).order_by(
+                AppointmentModel.date, AppointmentModel.time, AppointmentModel.appointmentId
+            ).execution_options(yield_per=BATCH_SIZE)
+        )
+        writer.writerows(rows)
+        return
+    cursor.copy_expert(
+        f"COPY (SELECT {_quoted(EXPORT_COLUMNS)} FROM appointments "
+        f'ORDER BY "date", "time", "appointmentId") TO STDOUT WITH (FORMAT csv, HEADER)',
+        out
+    )
@@ -5,9 +5,29 @@ DROP TRIGGER IF EXISTS update_appointments_updated_at ON appointments;
 DROP FUNCTION IF EXISTS update_updated_at_column();
 
 -- Drop indexes
-DROP INDEX IF EXISTS idx_appointments_patientid;
-DROP INDEX IF EXISTS idx_appointments_userphone;
-DROP INDEX IF EXISTS idx_appointments_date;
+DROP INDEX IF EXISTS "ix_appointments_patientId";
+DROP INDEX IF EXISTS idx_appointments_phone_upcoming;
+DROP INDEX IF EXISTS idx_appointments_date_doctor;
+DROP INDEX IF EXISTS idx_appointments_date_time_id;
+DROP INDEX IF EXISTS uq_appointments_active_slot;
+DROP INDEX IF EXISTS idx_appointments_archive_patient;
+DROP INDEX IF EXISTS idx_appointments_archive_phone;
+DROP INDEX IF EXISTS idx_slot_holds_expires;
+DROP INDEX IF EXISTS idx_notifications_pending;
+DROP INDEX IF EXISTS idx_doctors_department;
+DROP INDEX IF EXISTS idx_schedule_templates_doctor;
+DROP INDEX IF EXISTS idx_doctor_leave_doctor_dates;
 
 -- Drop tables
-DROP TABLE IF EXISTS appointments CASCADE; 
\ No newline at end of file
+DROP TABLE IF EXISTS doctor_leave CASCADE;
+DROP TABLE IF EXISTS schedule_templates CASCADE;
+DROP TABLE IF EXISTS doctors CASCADE;
+DROP TABLE IF EXISTS departments CASCADE;
+DROP TABLE IF EXISTS notifications CASCADE;
+DROP TABLE IF EXISTS slot_holds CASCADE;
+DROP TABLE IF EXISTS slot_capacity CASCADE;
+DROP TABLE IF EXISTS appointments CASCADE;
+DROP TABLE IF EXISTS appointments_archive CASCADE;  -- with its partitions
+
+-- Drop sequences
+DROP SEQUENCE IF EXISTS appointment_id_seq; 
\ No newline at end of file
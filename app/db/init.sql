@@ -8,15 +8,126 @@ CREATE TABLE IF NOT EXISTS appointments (
     "department" VARCHAR NOT NULL,
     "doctorName" VARCHAR NOT NULL,
     "userPhoneNumber" VARCHAR NOT NULL,
+    "phone_normalized" VARCHAR,  -- E.164 form of "userPhoneNumber", set by the application
     "isCancelled" BOOLEAN DEFAULT FALSE,
     "created_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     "updated_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create indexes
-CREATE INDEX IF NOT EXISTS idx_appointments_patientid ON appointments("patientId");
-CREATE INDEX IF NOT EXISTS idx_appointments_userphone ON appointments("userPhoneNumber");
-CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments("date");
+-- Create the sequence behind appointment IDs (permuted into 6-digit IDs by the application)
+CREATE SEQUENCE IF NOT EXISTS appointment_id_seq MINVALUE 0 MAXVALUE 999999 START 0 NO CYCLE;
+
+-- Create indexes (keep in sync with app/db/migrations)
+CREATE UNIQUE INDEX IF NOT EXISTS "ix_appointments_patientId" ON appointments("patientId");
+CREATE INDEX IF NOT EXISTS idx_appointments_phone_upcoming ON appointments("phone_normalized", "date", "time") INCLUDE ("appointmentId", "name") WHERE NOT "isCancelled";
+CREATE INDEX IF NOT EXISTS idx_appointments_date_doctor ON appointments("date", "doctorName");
+CREATE INDEX IF NOT EXISTS idx_appointments_date_time_id ON appointments("date", "time", "appointmentId");
+CREATE UNIQUE INDEX IF NOT EXISTS uq_appointments_active_slot ON appointments("doctorName", "date", "time") WHERE NOT "isCancelled";
+
+-- Create the archive of past, cancelled and replaced appointments, partitioned by month of "date"
+-- (monthly partitions are created by app.services.archive; rows of other months go to the default one)
+CREATE TABLE IF NOT EXISTS appointments_archive (
+    "appointmentId" VARCHAR NOT NULL,
+    "patientId" VARCHAR,
+    "name" VARCHAR,
+    "date" DATE NOT NULL,
+    "time" TIME,
+    "department" VARCHAR,
+    "doctorName" VARCHAR,
+    "userPhoneNumber" VARCHAR,
+    "phone_normalized" VARCHAR,
+    "isCancelled" BOOLEAN,
+    "created_at" TIMESTAMP,
+    "updated_at" TIMESTAMP,
+    "archivedAt" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "archiveReason" VARCHAR NOT NULL,
+    CONSTRAINT pk_appointments_archive PRIMARY KEY ("appointmentId", "date", "archivedAt")
+) PARTITION BY RANGE ("date");
+CREATE TABLE IF NOT EXISTS appointments_archive_default PARTITION OF appointments_archive DEFAULT;
+CREATE INDEX IF NOT EXISTS idx_appointments_archive_patient ON appointments_archive("patientId", "date");
+CREATE INDEX IF NOT EXISTS idx_appointments_archive_phone ON appointments_archive("phone_normalized", "date");
+
+-- Create slot capacity counters (active appointments per date, doctor and department)
+CREATE TABLE IF NOT EXISTS slot_capacity (
+    "date" DATE NOT NULL,
+    "doctorName" VARCHAR NOT NULL,
+    "department" VARCHAR NOT NULL,
+    "bookedCount" INTEGER NOT NULL DEFAULT 0,
+    "updated_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY ("date", "doctorName", "department")
+);
+
+-- Create short-lived slot holds (see app.services.reservations)
+CREATE TABLE IF NOT EXISTS slot_holds (
+    "holdId" VARCHAR PRIMARY KEY,
+    "doctorName" VARCHAR NOT NULL,
+    "department" VARCHAR NOT NULL,
+    "date" DATE NOT NULL,
+    "time" TIME NOT NULL,
+    "patientId" VARCHAR,
+    "expiresAt" TIMESTAMP NOT NULL,
+    "created_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_slot_holds_slot UNIQUE ("doctorName", "date", "time")
+);
+CREATE INDEX IF NOT EXISTS idx_slot_holds_expires ON slot_holds("expiresAt");
+
+-- Create the SMS notification queue (delivered by app.services.notification_worker)
+CREATE TABLE IF NOT EXISTS notifications (
+    "notificationId" SERIAL PRIMARY KEY,
+    "provider" VARCHAR NOT NULL,
+    "kind" VARCHAR NOT NULL,
+    "recipient" VARCHAR NOT NULL,
+    "message" TEXT NOT NULL,
+    "dedupeKey" VARCHAR NOT NULL UNIQUE,
+    "status" VARCHAR NOT NULL,
+    "attempts" INTEGER NOT NULL,
+    "nextAttemptAt" TIMESTAMP NOT NULL,
+    "lockedUntil" TIMESTAMP,
+    "lastError" TEXT,
+    "providerMessageId" VARCHAR,
+    "sentAt" TIMESTAMP,
+    "created_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_pending ON notifications("provider", "nextAttemptAt")
+    WHERE status IN ('queued', 'sending');
+
+-- Create doctors and their weekly schedules (free slots are computed by app.services.schedule)
+CREATE TABLE IF NOT EXISTS departments (
+    "departmentId" SERIAL PRIMARY KEY,
+    "name" VARCHAR NOT NULL UNIQUE,
+    "created_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS doctors (
+    "doctorId" SERIAL PRIMARY KEY,
+    "name" VARCHAR NOT NULL UNIQUE,
+    "departmentId" INTEGER NOT NULL REFERENCES departments("departmentId"),
+    "isActive" BOOLEAN NOT NULL DEFAULT TRUE,
+    "created_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS schedule_templates (
+    "templateId" SERIAL PRIMARY KEY,
+    "doctorId" INTEGER NOT NULL REFERENCES doctors("doctorId") ON DELETE CASCADE,
+    "weekday" INTEGER NOT NULL,
+    "startTime" TIME NOT NULL,
+    "endTime" TIME NOT NULL,
+    "slotMinutes" INTEGER NOT NULL,
+    "breakStart" TIME,
+    "breakEnd" TIME,
+    "validFrom" DATE,
+    "validTo" DATE
+);
+CREATE TABLE IF NOT EXISTS doctor_leave (
+    "leaveId" SERIAL PRIMARY KEY,
+    "doctorId" INTEGER NOT NULL REFERENCES doctors("doctorId") ON DELETE CASCADE,
+    "startDate" DATE NOT NULL,
+    "endDate" DATE NOT NULL,
+    "reason" VARCHAR
+);
+CREATE INDEX IF NOT EXISTS idx_doctors_department ON doctors("departmentId");
+CREATE INDEX IF NOT EXISTS idx_schedule_templates_doctor ON schedule_templates("doctorId");
+CREATE INDEX IF NOT EXISTS idx_doctor_leave_doctor_dates ON doctor_leave("doctorId", "startDate");
 
 -- Create function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -34,4 +145,13 @@ CREATE OR REPLACE TRIGGER update_appointments_updated_at
     EXECUTE FUNCTION update_updated_at_column();
 
 -- Grant permissions (adjust according to your needs)
-GRANT SELECT, INSERT, UPDATE, DELETE ON appointments TO neondb_owner; 
\ No newline at end of file
+GRANT SELECT, INSERT, UPDATE, DELETE ON appointments TO neondb_owner;
+GRANT SELECT, INSERT, UPDATE, DELETE ON appointments_archive TO neondb_owner;
+GRANT SELECT, INSERT, UPDATE, DELETE ON slot_capacity TO neondb_owner;
+GRANT SELECT, INSERT, UPDATE, DELETE ON slot_holds TO neondb_owner;
+GRANT USAGE, SELECT ON SEQUENCE appointment_id_seq TO neondb_owner;
+GRANT SELECT, INSERT, UPDATE, DELETE ON notifications TO neondb_owner;
+GRANT USAGE, SELECT ON SEQUENCE "notifications_notificationId_seq" TO neondb_owner;
+GRANT SELECT, INSERT, UPDATE, DELETE ON departments, doctors, schedule_templates, doctor_leave TO neondb_owner;
+GRANT USAGE, SELECT ON SEQUENCE "departments_departmentId_seq", "doctors_doctorId_seq",
+    "schedule_templates_templateId_seq", "doctor_leave_leaveId_seq" TO neondb_owner;
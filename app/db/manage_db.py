@@ -2,10 +2,6 @@ import os
 import psycopg2
 import certifi
 import logging
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
 
 # Configure logger
 log_level = logging.DEBUG if os.getenv("DEBUG", "False").lower() == "true" else logging.INFO
@@ -22,12 +18,12 @@ def get_db_connection():
     """Create a database connection with SSL configuration"""
     db_url = os.getenv("DATABASE_URL")
     logger.info("Establishing database connection")
-    logger.debug(f"Database URL: {db_url.split('@')[0].split(':')[0]}:***@{db_url.split('@')[1]}")
+    logger.debug("Database URL: %s:***@%s", db_url.split('@')[0].split(':')[0], db_url.split('@')[1])
     
     try:
         conn = psycopg2.connect(
             db_url,
-            sslmode='require',
+            sslmode=os.getenv("DB_SSLMODE", "require"),
             sslcert=None,
             sslkey=None,
             sslrootcert=certifi.where()
@@ -35,7 +31,7 @@ def get_db_connection():
         logger.info("Database connection established")
         return conn
     except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
+        logger.error("Database connection error: %s", e)
         raise
 
 def init_db():
@@ -47,15 +43,15 @@ def init_db():
     try:
         # Read and execute the init.sql script
         script_path = os.path.join(os.path.dirname(__file__), 'init.sql')
-        logger.debug(f"Reading init script from {script_path}")
+        logger.debug("Reading init script from %s", script_path)
         with open(script_path, 'r') as f:
             sql_script = f.read()
-            logger.debug(f"Executing init script ({len(sql_script.splitlines())} lines)")
+            logger.debug("Executing init script (%s lines)", len(sql_script.splitlines()))
             cur.execute(sql_script)
         conn.commit()
         logger.info("Database initialized successfully!")
     except Exception as e:
-        logger.error(f"Error initializing database: {str(e)}")
+        logger.error("Error initializing database: %s", e)
         conn.rollback()
         raise
     finally:
@@ -72,15 +68,39 @@ def clean_db():
     try:
         # Read and execute the clean.sql script
         script_path = os.path.join(os.path.dirname(__file__), 'clean.sql')
-        logger.debug(f"Reading cleanup script from {script_path}")
+        logger.debug("Reading cleanup script from %s", script_path)
         with open(script_path, 'r') as f:
             sql_script = f.read()
-            logger.debug(f"Executing cleanup script ({len(sql_script.splitlines())} lines)")
+            logger.debug("Executing cleanup script (%s lines)", len(sql_script.splitlines()))
             cur.execute(sql_script)
         conn.commit()
         logger.info("Database cleaned successfully!")
     except Exception as e:
-        logger.error(f"Error cleaning database: {str(e)}")
+        logger.error("Error cleaning database: %s", e)
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+        logger.debug("Database connection closed")
+
+def rebuild_slot_capacity():
+    """Recompute the slot capacity counters from the appointments table"""
+    logger.info("Starting slot capacity rebuild")
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        script_path = os.path.join(os.path.dirname(__file__), 'rebuild_slot_capacity.sql')
+        logger.debug("Reading rebuild script from %s", script_path)
+        with open(script_path, 'r') as f:
+            sql_script = f.read()
+            logger.debug("Executing rebuild script (%s lines)", len(sql_script.splitlines()))
+            cur.execute(sql_script)
+        conn.commit()
+        logger.info("Slot capacity rebuilt successfully!")
+    except Exception as e:
+        logger.error("Error rebuilding slot capacity: %s", e)
         conn.rollback()
         raise
     finally:
@@ -88,6 +108,73 @@ def clean_db():
         conn.close()
         logger.debug("Database connection closed")
 
+def get_db_session():
+    """Create a SQLAlchemy session whose connection comes from get_db_connection"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.pool import NullPool
+
+    engine = create_engine("postgresql+psycopg2://", creator=get_db_connection, poolclass=NullPool)
+    return Session(bind=engine)
+
+def import_appointments(path):
+    """Import appointments from a CSV, NDJSON or JSON array file"""
+    # Imported lazily so init/clean/reset keep working when run as a plain script
+    from app.db import bulk
+
+    file_format = "csv" if path.endswith(".csv") else "ndjson" if path.endswith((".ndjson", ".jsonl")) else "json"
+    logger.info("Importing appointments from %s (%s)", path, file_format)
+    db = get_db_session()
+    try:
+        with open(path, 'r', newline='') as f:
+            result = bulk.import_appointments(db, bulk.read_file_records(f, file_format))
+        for error in result["errors"]:
+            logger.warning("Row %s rejected: %s", error['row'], '; '.join(error['errors']))
+        logger.info("Imported %s appointment(s), rejected %s", result['imported'], result['failed'])
+        return result
+    finally:
+        db.close()
+
+def export_appointments(path):
+    """Export all appointments to a CSV file"""
+    from app.db import bulk
+
+    logger.info("Exporting appointments to %s", path)
+    db = get_db_session()
+    try:
+        with open(path, 'w', newline='') as f:
+            bulk.export_appointments(db, f)
+        logger.info("Appointments exported successfully!")
+    finally:
+        db.close()
+
+def load_schedules(path):
+    """Create or update doctors and their weekly schedules from a JSON file"""
+    import json
+    from app.services import schedule
+
+    logger.info("Loading schedules from %s", path)
+    db = get_db_session()
+    try:
+        with open(path, 'r') as f:
+            counts = schedule.load_schedule_config(db, json.load(f))
+        logger.info("Loaded %s doctor(s) with %s schedule template(s)", counts['doctors'], counts['templates'])
+        return counts
+    finally:
+        db.close()
+
+def archive_appointments():
+    """Move past and cancelled appointments into the partitioned archive table"""
+    from app.services import archive
+
+    logger.info("Archiving appointments dated over %s day(s) ago or cancelled over %s day(s) ago",
+                archive.ARCHIVE_AFTER_DAYS, archive.ARCHIVE_CANCELLED_AFTER_DAYS)
+    db = get_db_session()
+    try:
+        return archive.archive_appointments(db)
+    finally:
+        db.close()
+
 def reset_db():
     """Reset the database by cleaning and reinitializing"""
     logger.info("Starting database reset")
@@ -100,11 +187,11 @@ if __name__ == "__main__":
     
     if len(sys.argv) < 2:
         logger.error("Missing command argument")
-        print("Usage: python manage_db.py [init|clean|reset]")
+        print("Usage: python manage_db.py [init|clean|reset|rebuild-slots|archive|import <file>|export <file>|load-schedules <file>]")
         sys.exit(1)
     
     command = sys.argv[1].lower()
-    logger.info(f"Executing command: {command}")
+    logger.info("Executing command: %s", command)
     
     try:
         if command == "init":
@@ -113,10 +200,25 @@ if __name__ == "__main__":
             clean_db()
         elif command == "reset":
             reset_db()
+        elif command == "rebuild-slots":
+            rebuild_slot_capacity()
+        elif command == "archive":
+            archive_appointments()
+        elif command in ("import", "export", "load-schedules"):
+            if len(sys.argv) < 3:
+                logger.error("Missing file argument for %s", command)
+                print(f"Usage: python -m app.db.manage_db {command} <file>")
+                sys.exit(1)
+            if command == "import":
+                import_appointments(sys.argv[2])
+            elif command == "load-schedules":
+                load_schedules(sys.argv[2])
+            else:
+                export_appointments(sys.argv[2])
         else:
-            logger.error(f"Invalid command: {command}")
-            print("Invalid command. Use 'init', 'clean', or 'reset'")
+            logger.error("Invalid command: %s", command)
+            print("Invalid command. Use 'init', 'clean', 'reset', 'rebuild-slots', 'archive', 'import', 'export', or 'load-schedules'")
             sys.exit(1)
     except Exception as e:
-        logger.critical(f"Command failed with error: {str(e)}")
+        logger.critical("Command failed with error: %s", e)
         sys.exit(1) 
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""Baseline schema: appointments, slot capacity counters and the appointment ID sequence
+
+Written with IF NOT EXISTS so it also brings databases created by init.sql or
+Base.metadata.create_all up to date before they are put under Alembic.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS appointments (
+            "appointmentId" VARCHAR PRIMARY KEY,
+            "patientId" VARCHAR,
+            "name" VARCHAR,
+            "date" DATE,
+            "time" TIME,
+            "department" VARCHAR,
+            "doctorName" VARCHAR,
+            "userPhoneNumber" VARCHAR,
+            "isCancelled" BOOLEAN DEFAULT FALSE,
+            "created_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            "updated_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS slot_capacity (
+            "date" DATE NOT NULL,
+            "doctorName" VARCHAR NOT NULL,
+            "department" VARCHAR NOT NULL,
+            "bookedCount" INTEGER NOT NULL DEFAULT 0,
+            "updated_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY ("date", "doctorName", "department")
+        )
+    """)
+    op.execute(
+        "CREATE SEQUENCE IF NOT EXISTS appointment_id_seq MINVALUE 0 MAXVALUE 999999 START 0 NO CYCLE"
+    )
+
+    # One appointment per patient; which of several to keep is for the operator to decide
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT "patientId", COUNT(*), MIN("appointmentId"), MAX("appointmentId") FROM appointments '
+        'GROUP BY "patientId" HAVING COUNT(*) > 1 ORDER BY "patientId" LIMIT 10'
+    )).all()
+    if duplicates:
+        listed = "; ".join(
+            f"{patient} x{count} ({first}..{last})" for patient, count, first, last in duplicates
+        )
+        raise RuntimeError(
+            f"Remove or reassign appointments of patients with more than one before upgrading "
+            f"(first {len(duplicates)}: {listed})"
+        )
+    op.execute('CREATE UNIQUE INDEX IF NOT EXISTS "ix_appointments_patientId" ON appointments ("patientId")')
+    op.execute('DROP INDEX IF EXISTS idx_appointments_patientid')
+    op.execute('CREATE INDEX IF NOT EXISTS "ix_appointments_userPhoneNumber" ON appointments ("userPhoneNumber")')
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS idx_appointments_date_time_id ON appointments ("date", "time", "appointmentId")'
+    )
+
+    # Counters may predate this revision or be missing entirely
+    op.execute("DELETE FROM slot_capacity")
+    op.execute("""
+        INSERT INTO slot_capacity ("date", "doctorName", "department", "bookedCount")
+        SELECT "date", "doctorName", "department", COUNT(*)
+        FROM appointments
+        WHERE NOT COALESCE("isCancelled", FALSE)
+        GROUP BY "date", "doctorName", "department"
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP SEQUENCE IF EXISTS appointment_id_seq")
+    op.execute("DROP TABLE IF EXISTS slot_capacity")
+    op.execute("DROP TABLE IF EXISTS appointments")
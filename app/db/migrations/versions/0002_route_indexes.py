@@ -0,0 +1,40 @@
+"""Indexes for the route queries
+
+- active appointments by phone number (partial on NOT "isCancelled")
+- appointments by date and doctor
+- drop indexes that duplicate the primary key or the (date, time, appointmentId) index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_appointments_phone_active",
+        "appointments",
+        ["userPhoneNumber"],
+        postgresql_where=sa.text('NOT "isCancelled"'),
+    )
+    op.create_index("idx_appointments_date_doctor", "appointments", ["date", "doctorName"])
+    op.execute('DROP INDEX IF EXISTS "ix_appointments_userPhoneNumber"')
+    op.execute('DROP INDEX IF EXISTS idx_appointments_userphone')
+    op.execute('DROP INDEX IF EXISTS "ix_appointments_appointmentId"')
+    op.execute('DROP INDEX IF EXISTS idx_appointments_date')
+
+
+def downgrade() -> None:
+    op.create_index("ix_appointments_userPhoneNumber", "appointments", ["userPhoneNumber"])
+    op.drop_index("idx_appointments_date_doctor", table_name="appointments")
+    op.drop_index("idx_appointments_phone_active", table_name="appointments")
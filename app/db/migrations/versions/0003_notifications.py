@@ -0,0 +1,51 @@
+"""Notification queue for SMS delivered by the notification worker
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The API creates missing tables (with their indexes) on startup
+    if "notifications" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "notifications",
+        sa.Column("notificationId", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("provider", sa.String(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("recipient", sa.String(), nullable=False),
+        sa.Column("message", sa.Text(), nullable=False),
+        sa.Column("dedupeKey", sa.String(), nullable=False, unique=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("nextAttemptAt", sa.DateTime(), nullable=False),
+        sa.Column("lockedUntil", sa.DateTime()),
+        sa.Column("lastError", sa.Text()),
+        sa.Column("providerMessageId", sa.String()),
+        sa.Column("sentAt", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index(
+        "idx_notifications_pending",
+        "notifications",
+        ["provider", "nextAttemptAt"],
+        postgresql_where=sa.text("status IN ('queued', 'sending')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_notifications_pending", table_name="notifications")
+    op.drop_table("notifications")
@@ -0,0 +1,74 @@
+"""Departments, doctors, weekly schedule templates and leave
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The API creates missing tables (with their indexes) on startup
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if "departments" not in existing:
+        op.create_table(
+            "departments",
+            sa.Column("departmentId", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("name", sa.String(), nullable=False, unique=True),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        )
+    if "doctors" not in existing:
+        op.create_table(
+            "doctors",
+            sa.Column("doctorId", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("name", sa.String(), nullable=False, unique=True),
+            sa.Column("departmentId", sa.Integer(), sa.ForeignKey("departments.departmentId"), nullable=False),
+            sa.Column("isActive", sa.Boolean(), nullable=False, server_default=sa.true()),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+        )
+        op.create_index("idx_doctors_department", "doctors", ["departmentId"])
+    if "schedule_templates" not in existing:
+        op.create_table(
+            "schedule_templates",
+            sa.Column("templateId", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("doctorId", sa.Integer(), sa.ForeignKey("doctors.doctorId", ondelete="CASCADE"), nullable=False),
+            sa.Column("weekday", sa.Integer(), nullable=False),
+            sa.Column("startTime", sa.Time(), nullable=False),
+            sa.Column("endTime", sa.Time(), nullable=False),
+            sa.Column("slotMinutes", sa.Integer(), nullable=False),
+            sa.Column("breakStart", sa.Time()),
+            sa.Column("breakEnd", sa.Time()),
+            sa.Column("validFrom", sa.Date()),
+            sa.Column("validTo", sa.Date()),
+        )
+        op.create_index("idx_schedule_templates_doctor", "schedule_templates", ["doctorId"])
+    if "doctor_leave" not in existing:
+        op.create_table(
+            "doctor_leave",
+            sa.Column("leaveId", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("doctorId", sa.Integer(), sa.ForeignKey("doctors.doctorId", ondelete="CASCADE"), nullable=False),
+            sa.Column("startDate", sa.Date(), nullable=False),
+            sa.Column("endDate", sa.Date(), nullable=False),
+            sa.Column("reason", sa.String()),
+        )
+        op.create_index("idx_doctor_leave_doctor_dates", "doctor_leave", ["doctorId", "startDate"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_doctor_leave_doctor_dates", table_name="doctor_leave")
+    op.drop_table("doctor_leave")
+    op.drop_index("idx_schedule_templates_doctor", table_name="schedule_templates")
+    op.drop_table("schedule_templates")
+    op.drop_index("idx_doctors_department", table_name="doctors")
+    op.drop_table("doctors")
+    op.drop_table("departments")
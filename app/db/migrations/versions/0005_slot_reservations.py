@@ -0,0 +1,65 @@
+"""One active appointment per slot, and slot holds
+
+- partial unique index on appointments ("doctorName", "date", "time") WHERE NOT "isCancelled"
+- slot_holds table for the hold/confirm booking flow
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text(
+        'SELECT "doctorName", "date", "time", COUNT(*) FROM appointments '
+        'WHERE NOT "isCancelled" GROUP BY "doctorName", "date", "time" HAVING COUNT(*) > 1 '
+        'ORDER BY "date", "time" LIMIT 10'
+    )).all()
+    if duplicates:
+        listed = "; ".join(f"{doctor} {day} {slot} x{count}" for doctor, day, slot, count in duplicates)
+        raise RuntimeError(
+            f"Cancel or move double-booked appointments before upgrading (first {len(duplicates)}: {listed})"
+        )
+    inspector = sa.inspect(bind)
+    if "uq_appointments_active_slot" not in {index["name"] for index in inspector.get_indexes("appointments")}:
+        op.create_index(
+            "uq_appointments_active_slot",
+            "appointments",
+            ["doctorName", "date", "time"],
+            unique=True,
+            postgresql_where=sa.text('NOT "isCancelled"'),
+            sqlite_where=sa.text('NOT "isCancelled"'),
+        )
+
+    # The API creates missing tables (with their indexes) on startup
+    if "slot_holds" not in set(inspector.get_table_names()):
+        op.create_table(
+            "slot_holds",
+            sa.Column("holdId", sa.String(), primary_key=True),
+            sa.Column("doctorName", sa.String(), nullable=False),
+            sa.Column("department", sa.String(), nullable=False),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("time", sa.Time(), nullable=False),
+            sa.Column("patientId", sa.String()),
+            sa.Column("expiresAt", sa.DateTime(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+            sa.UniqueConstraint("doctorName", "date", "time", name="uq_slot_holds_slot"),
+        )
+        op.create_index("idx_slot_holds_expires", "slot_holds", ["expiresAt"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_slot_holds_expires", table_name="slot_holds")
+    op.drop_table("slot_holds")
+    op.drop_index("uq_appointments_active_slot", table_name="appointments")
@@ -0,0 +1,55 @@
+"""Archive table for past, cancelled and replaced appointments
+
+- appointments_archive, partitioned by RANGE ("date") on PostgreSQL, with a DEFAULT
+  partition; monthly partitions are created by app.services.archive
+- indexes by patient and by phone number, each with "date"
+
+Existing history is moved by `python -m app.db.manage_db archive`, not by this revision.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The API creates missing tables (with their indexes) on startup
+    if "appointments_archive" in set(sa.inspect(op.get_bind()).get_table_names()):
+        return
+    op.create_table(
+        "appointments_archive",
+        sa.Column("appointmentId", sa.String(), nullable=False),
+        sa.Column("patientId", sa.String()),
+        sa.Column("name", sa.String()),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("time", sa.Time()),
+        sa.Column("department", sa.String()),
+        sa.Column("doctorName", sa.String()),
+        sa.Column("userPhoneNumber", sa.String()),
+        sa.Column("isCancelled", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.Column("archivedAt", sa.DateTime(), nullable=False),
+        sa.Column("archiveReason", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("appointmentId", "date", "archivedAt", name="pk_appointments_archive"),
+        postgresql_partition_by='RANGE ("date")',
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE TABLE appointments_archive_default PARTITION OF appointments_archive DEFAULT")
+    op.create_index("idx_appointments_archive_patient", "appointments_archive", ["patientId", "date"])
+    op.create_index("idx_appointments_archive_phone", "appointments_archive", ["userPhoneNumber", "date"])
+
+
+def downgrade() -> None:
+    # Drops the partitions and their archived rows too
+    op.drop_table("appointments_archive")
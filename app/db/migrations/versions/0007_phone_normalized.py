@@ -0,0 +1,92 @@
+"""Normalized phone numbers for the /details lookup
+
+- "phone_normalized" (E.164) on appointments and appointments_archive, backfilled from
+  "userPhoneNumber" with app.core.phone.normalize_phone
+- idx_appointments_phone_upcoming on ("phone_normalized", "date", "time") INCLUDE
+  ("appointmentId", "name") WHERE NOT "isCancelled", replacing idx_appointments_phone_active
+- the archive's phone index moves to "phone_normalized"
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.phone import normalize_phone
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Phone numbers mapped per INSERT into the temporary table
+BACKFILL_BATCH_SIZE = 5000
+
+phone_map = sa.table(
+    "phone_normalized_map",
+    sa.column("raw", sa.String()),
+    sa.column("normalized", sa.String()),
+)
+
+
+def _backfill(bind, tables) -> None:
+    """Normalize each distinct phone number once in Python, then update every table with one
+    UPDATE ... FROM the mapping instead of a statement per row"""
+    phones = set()
+    for table in tables:
+        phones.update(bind.execute(sa.text(
+            f'SELECT DISTINCT "userPhoneNumber" FROM {table} WHERE "userPhoneNumber" IS NOT NULL'
+        )).scalars())
+    op.execute("CREATE TEMPORARY TABLE phone_normalized_map (raw VARCHAR PRIMARY KEY, normalized VARCHAR)")
+    rows = [{"raw": raw, "normalized": normalize_phone(raw)} for raw in sorted(phones)]
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        bind.execute(phone_map.insert(), rows[start:start + BACKFILL_BATCH_SIZE])
+    for table in tables:
+        op.execute(
+            f'UPDATE {table} SET "phone_normalized" = phone_normalized_map.normalized '
+            f'FROM phone_normalized_map WHERE {table}."userPhoneNumber" = phone_normalized_map.raw'
+        )
+    op.execute("DROP TABLE phone_normalized_map")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    tables = []
+    for table in ("appointments", "appointments_archive"):
+        # The API creates missing tables (with their columns) on startup
+        if "phone_normalized" not in {column["name"] for column in sa.inspect(bind).get_columns(table)}:
+            op.add_column(table, sa.Column("phone_normalized", sa.String()))
+            tables.append(table)
+    if tables:
+        _backfill(bind, tables)
+
+    op.execute("DROP INDEX IF EXISTS idx_appointments_phone_active")
+    op.execute("DROP INDEX IF EXISTS idx_appointments_phone_upcoming")
+    op.create_index(
+        "idx_appointments_phone_upcoming",
+        "appointments",
+        ["phone_normalized", "date", "time"],
+        postgresql_include=["appointmentId", "name"],
+        postgresql_where=sa.text('NOT "isCancelled"'),
+        sqlite_where=sa.text('NOT "isCancelled"'),
+    )
+    op.execute("DROP INDEX IF EXISTS idx_appointments_archive_phone")
+    op.create_index("idx_appointments_archive_phone", "appointments_archive", ["phone_normalized", "date"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_appointments_archive_phone", table_name="appointments_archive")
+    op.create_index("idx_appointments_archive_phone", "appointments_archive", ["userPhoneNumber", "date"])
+    op.drop_index("idx_appointments_phone_upcoming", table_name="appointments")
+    op.create_index(
+        "idx_appointments_phone_active",
+        "appointments",
+        ["userPhoneNumber"],
+        postgresql_where=sa.text('NOT "isCancelled"'),
+    )
+    op.drop_column("appointments_archive", "phone_normalized")
+    op.drop_column("appointments", "phone_normalized")
@@ -0,0 +1,10 @@
+-- Recompute slot capacity counters from the appointments table
+LOCK TABLE slot_capacity IN EXCLUSIVE MODE;
+
+DELETE FROM slot_capacity;
+
+INSERT INTO slot_capacity ("date", "doctorName", "department", "bookedCount")
+SELECT "date", "doctorName", "department", COUNT(*)
+FROM appointments
+WHERE NOT COALESCE("isCancelled", FALSE)
+GROUP BY "date", "doctorName", "department";
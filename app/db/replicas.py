@@ -0,0 +1,182 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import logging
+import os
+import threading
+import time
+
+from app.db import base
+from app.db.base import get_session
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Comma-separated URLs of streaming replicas that serve read-only routes; empty = primary only
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Replicas further behind the primary than this are skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+# How long a measured lag (or a failed check) is trusted before the replica is checked again
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "2"))
+# After a write, the caller's reads go to the primary for this long (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+
+# Cookie holding the time (epoch seconds) until which the caller reads from the primary
+PRIMARY_COOKIE = "db_primary_until"
+
+# Session.info key telling where a read session's rows come from: READ_FROM_REPLICA, or
+# READ_FROM_PINNED_PRIMARY for a caller whose recent write may not have reached the replicas
+READ_SOURCE = "read_source"
+READ_FROM_REPLICA = "replica"
+READ_FROM_PINNED_PRIMARY = "pinned-primary"
+
+# Seconds since the last replayed transaction, 0 when everything received has been replayed
+# (an idle primary sends nothing new) and on a server that is not in recovery, or NULL when no
+# WAL receiver is running: a replica cut off from the primary receives nothing, so its received
+# and replayed positions stay equal however far behind it falls
+_LAG_SQL = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver) THEN NULL
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+class Replica:
+    """A replica engine, created on first use, with its last measured lag"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.lag: Optional[float] = None  # None: unknown or unreachable
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self._sessionmaker = None
+
+    def sessionmaker(self):
+        if self._sessionmaker is None:
+            with self._lock:
+                if self._sessionmaker is None:
+                    if base.DB_ASYNC:
+                        engine = base.build_async_engine(self.name, self.url)
+                        self._sessionmaker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+                    else:
+                        engine = base.build_engine(self.name, self.url)
+                        self._sessionmaker = sessionmaker(engine, autocommit=False, autoflush=False)
+        return self._sessionmaker
+
+    def due_for_check(self, now: float) -> bool:
+        return now - self.checked_at >= REPLICA_CHECK_SECONDS
+
+    def record(self, lag: Optional[float], now: float):
+        if lag is None:
+            logger.warning("Replica %s is unreachable or not streaming; reading from the primary", self.name)
+        elif lag > REPLICA_MAX_LAG_SECONDS:
+            logger.warning("Replica %s is %.1fs behind the primary", self.name, lag)
+        self.lag = lag
+        self.checked_at = now
+
+    def usable(self) -> bool:
+        return self.lag is not None and self.lag <= REPLICA_MAX_LAG_SECONDS
+
+    def measure_lag(self) -> Optional[float]:
+        try:
+            with self.sessionmaker()() as db:
+                lag = db.execute(_LAG_SQL).scalar()
+        except Exception as e:
+            logger.debug("Lag check of replica %s failed: %s", self.name, e)
+            return None
+        return None if lag is None else float(lag)
+
+    async def ameasure_lag(self) -> Optional[float]:
+        try:
+            async with self.sessionmaker()() as db:
+                lag = (await db.execute(_LAG_SQL)).scalar()
+        except Exception as e:
+            logger.debug("Lag check of replica %s failed: %s", self.name, e)
+            return None
+        return None if lag is None else float(lag)
+
+    async def dispose(self):
+        if self._sessionmaker is not None:
+            engine = self._sessionmaker.kw["bind"]
+            if isinstance(engine, AsyncEngine):
+                await engine.dispose()
+            else:
+                engine.dispose()
+
+replicas: List[Replica] = [Replica(f"replica-{index}", url) for index, url in enumerate(DATABASE_REPLICA_URLS)]
+
+# Round-robin position over the usable replicas
+_next_replica = 0
+
+async def check_replica(replica: Replica):
+    """Measure the replica's lag unless a recent measurement exists"""
+    now = time.monotonic()
+    if not replica.due_for_check(now):
+        return
+    # Claim the check first, so concurrent requests keep using the last result meanwhile
+    replica.checked_at = now
+    if base.DB_ASYNC:
+        lag = await replica.ameasure_lag()
+    else:
+        lag = await run_in_threadpool(replica.measure_lag)
+    replica.record(lag, time.monotonic())
+
+async def choose_replica() -> Optional[Replica]:
+    """Return the next replica within REPLICA_MAX_LAG_SECONDS, or None to use the primary"""
+    global _next_replica
+    for _ in range(len(replicas)):
+        replica = replicas[_next_replica % len(replicas)]
+        _next_replica += 1
+        await check_replica(replica)
+        if replica.usable():
+            return replica
+    return None
+
+def reads_pinned_to_primary(request: Request) -> bool:
+    """True while the caller's last write may not have reached the replicas yet"""
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+def pin_reads_to_primary(response: Response):
+    """Route dependency for writes: send the caller's next reads to the primary"""
+    if replicas:
+        until = time.time() + READ_YOUR_WRITES_SECONDS
+        response.set_cookie(PRIMARY_COOKIE, f"{until:.0f}", max_age=int(READ_YOUR_WRITES_SECONDS) + 1, httponly=True)
+
+async def _routed_read_session(request: Request):
+    """A session on a replica that is caught up, or on the primary"""
+    replica = None
+    pinned = reads_pinned_to_primary(request)
+    if not pinned:
+        replica = await choose_replica()
+    if replica is not None:
+        logger.debug("Reading from %s", replica.name)
+        db = replica.sessionmaker()()
+        db.info[READ_SOURCE] = READ_FROM_REPLICA
+    else:
+        db = base.AsyncSessionLocal() if base.DB_ASYNC else base.SessionLocal()
+        if pinned:
+            db.info[READ_SOURCE] = READ_FROM_PINNED_PRIMARY
+    try:
+        yield db
+    finally:
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            await run_in_threadpool(db.close)
+
+# Dependency used by read-only route handlers; without replicas it is get_session itself
+get_read_session = _routed_read_session if replicas else get_session
+
+async def dispose_replicas():
+    """Close the pooled connections of the replica engines created so far"""
+    for replica in replicas:
+        await replica.dispose()
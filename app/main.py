@@ -1,37 +1,80 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import anyio
 import os
 import logging
-import time
-from dotenv import load_dotenv
 
 from app.api.appointments import router as appointments_router
 from app.api.appointments import fixed_router as appointments_fixed_router
 from app.api.appointments import nested_router as appointments_nested_router
 from app.api.appointments import auth_router, notifications_router
-from app.db.base import Base, engine
+from app.core import http_cache
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.logs import RequestContextMiddleware, configure_logging
+from app.core.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.core.responses import FastJSONResponse
+from app.core.server import threadpool_size
+from app.db import base as db_base
+from app.db import replicas
+from app.db.base import AsyncSessionLocal, SessionLocal
+from app.services import appointment_cache, appointment_repository
+from app.services.appointment_repository import SqlAppointmentRepository
+from app.services.archive import ARCHIVE_WORKER, worker as archive_worker
+from app.services.notification_worker import NOTIFICATION_WORKER, worker as notification_worker
 
-# Load environment variables
-load_dotenv()
-
-# Configure logging
-log_level = logging.DEBUG if os.getenv("DEBUG", "False").lower() == "true" else logging.INFO
-logging.basicConfig(
-    level=log_level,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: JSON records written off the event loop (see app/core/logs.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Create database tables
-logger.info("Creating database tables if they don't exist")
-Base.metadata.create_all(bind=engine)
-
 # API prefix from env
 api_prefix = os.getenv("API_PREFIX", "/v1")
-logger.debug(f"API prefix set to: {api_prefix}")
+logger.debug("API prefix set to: %s", api_prefix)
+
+async def warm_up():
+    """Open pooled connections and fill the cache before the worker takes traffic"""
+    try:
+        if db_base.DB_ASYNC:
+            await db_base.warm_async_pool()
+            async with AsyncSessionLocal() as db:
+                await appointment_cache.warm_appointments(SqlAppointmentRepository(db))
+        else:
+            await run_in_threadpool(db_base.warm_pool)
+            with SessionLocal() as db:
+                await appointment_cache.warm_appointments(SqlAppointmentRepository(db))
+    except Exception as e:
+        # A cold pool and cache only make the first requests slower
+        logger.warning("Warm-up failed: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare the worker on startup; on shutdown (SIGTERM, after in-flight requests) release it"""
+    if appointment_repository.STORAGE_BACKEND == "memory":
+        # Appointments are served from the worker's memory; nothing to connect to or warm
+        if appointment_repository.MEMORY_STORE_SNAPSHOT:
+            appointment_repository.load_snapshot(
+                appointment_repository.memory_repository, appointment_repository.MEMORY_STORE_SNAPSHOT
+            )
+    else:
+        # Under gunicorn the master creates the schema once, before forking (see gunicorn.conf.py)
+        if db_base.DB_CREATE_SCHEMA:
+            await run_in_threadpool(db_base.create_schema)
+        # Blocking database calls run in this pool; more threads than connections would only queue
+        anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size()
+        await warm_up()
+        if ARCHIVE_WORKER:
+            archive_worker.start()
+    if NOTIFICATION_WORKER:
+        notification_worker.start()
+    yield
+    if NOTIFICATION_WORKER:
+        await notification_worker.stop()
+    await archive_worker.stop()
+    await db_base.dispose_engines()
+    await replicas.dispose_replicas()
+    await http_cache.close()
+    logger.info("Worker shut down")
 
 # Create FastAPI app
 app = FastAPI(
@@ -41,8 +84,17 @@ app = FastAPI(
     openapi_url=f"{api_prefix}/openapi.json",
     docs_url=f"{api_prefix}/docs",
     redoc_url=f"{api_prefix}/redoc",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+# Replay responses to POSTs retried with the same Idempotency-Key; added first so it
+# runs inside CORS and metrics, and replays still get CORS headers and are measured
+app.add_middleware(IdempotencyMiddleware)
+
+# Strong ETags and 304s for the hot read routes, so clients and nginx can revalidate cheaply
+app.add_middleware(http_cache.ConditionalGetMiddleware, rules=http_cache.read_route_rules(api_prefix))
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -52,15 +104,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware to log requests and response times
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    logger.info(f"Request started: {request.method} {request.url.path}")
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    logger.info(f"Request completed: {request.method} {request.url.path} - Status: {response.status_code} - Duration: {process_time:.4f}s")
-    return response
+# Record request latency, in-flight requests and DB statements per route (served at /metrics)
+app.add_middleware(MetricsMiddleware)
+db_base.on_engine_created(instrument_engine)
+
+# Outermost: correlation ID for every log record of the request, and sampled access logs
+app.add_middleware(RequestContextMiddleware)
 
 # Include routers
 logger.info("Registering API routers")
@@ -79,4 +128,9 @@ def root():
 @app.get(f"{api_prefix}/health", tags=["health"])
 def health_check():
     logger.debug("Health check endpoint called")
-    return {"status": "healthy"} 
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get(f"{api_prefix}/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type) 
\ No newline at end of file
@@ -1,35 +1,75 @@
-from sqlalchemy import Column, String, DateTime, Date, Time, Boolean
-from sqlalchemy.sql import func
+from sqlalchemy import DDL, Column, String, DateTime, Date, Time, Boolean, Index, Sequence, event
+from sqlalchemy.orm import validates
+from sqlalchemy.sql import func, text
 import uuid
-import random
 import logging
+from app.core.phone import normalize_phone
 from app.db.base import Base
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Source of appointment IDs; values are permuted into 6-digit IDs by app.services.id_allocator
+appointment_id_seq = Sequence(
+    "appointment_id_seq", start=0, minvalue=0, maxvalue=999999, metadata=Base.metadata
+)
+# SQLite has no sequences: a one-row table holds the next value instead
+APPOINTMENT_ID_COUNTER = "appointment_id_counter"
+
+# Listened on the metadata, so databases created before the counter existed get it too
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(f'CREATE TABLE IF NOT EXISTS {APPOINTMENT_ID_COUNTER} ("nextValue" INTEGER NOT NULL)').execute_if(dialect="sqlite"),
+)
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(
+        f'INSERT INTO {APPOINTMENT_ID_COUNTER} ("nextValue") '
+        f'SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM {APPOINTMENT_ID_COUNTER})'
+    ).execute_if(dialect="sqlite"),
+)
+
 class Appointment(Base):
     __tablename__ = "appointments"
+    # Keep in sync with the Alembic revisions in app/db/migrations/versions
+    __table_args__ = (
+        # Keyset pagination order for listing appointments
+        Index("idx_appointments_date_time_id", "date", "time", "appointmentId"),
+        # Upcoming active appointments by phone number; covers the /details columns for index-only scans
+        Index(
+            "idx_appointments_phone_upcoming", "phone_normalized", "date", "time",
+            postgresql_include=["appointmentId", "name"],
+            postgresql_where=text('NOT "isCancelled"'), sqlite_where=text('NOT "isCancelled"'),
+        ),
+        Index("idx_appointments_date_doctor", "date", "doctorName"),
+        # One active appointment per doctor and time slot; cancelled ones free the slot
+        Index(
+            "uq_appointments_active_slot", "doctorName", "date", "time", unique=True,
+            postgresql_where=text('NOT "isCancelled"'), sqlite_where=text('NOT "isCancelled"'),
+        ),
+    )
 
-    appointmentId = Column(String, primary_key=True, index=True)
-    patientId = Column(String, index=True)
+    appointmentId = Column(String, primary_key=True)
+    patientId = Column(String, index=True, unique=True)  # one active booking per patient
     name = Column(String)
     date = Column(Date)
     time = Column(Time)
     department = Column(String)
     doctorName = Column(String)
-    userPhoneNumber = Column(String, index=True)
+    userPhoneNumber = Column(String)
+    # E.164 form of userPhoneNumber, kept in step by the validator below (None if unparseable)
+    phone_normalized = Column(String)
     isCancelled = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
-    @staticmethod
-    def generate_id():
-        """Generate a 6-digit appointment number"""
-        appointment_id = ''.join(random.choices('0123456789', k=6))
-        logger.debug(f"Generated appointment ID: {appointment_id}")
-        return appointment_id
-    
+    @validates("userPhoneNumber")
+    def _normalize_phone(self, key, userPhoneNumber):
+        self.phone_normalized = normalize_phone(userPhoneNumber)
+        return userPhoneNumber
+
     @property
     def appointment_number(self):
         """Use appointmentId as the appointment number"""
@@ -0,0 +1,59 @@
+from sqlalchemy import Column, String, DateTime, Date, Time, Boolean, Index, PrimaryKeyConstraint, DDL, event
+from sqlalchemy.sql import func
+import logging
+from app.db.base import Base
+from app.models.appointment import Appointment
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Partitions are named appointments_archive_yYYYYmMM, plus a catch-all for rows whose month
+# has no partition yet (see app.services.archive)
+PARTITION_PREFIX = "appointments_archive_"
+DEFAULT_PARTITION = f"{PARTITION_PREFIX}default"
+
+class ArchivedAppointment(Base):
+    """A past, cancelled or replaced appointment moved out of the hot appointments table
+
+    On PostgreSQL the table is partitioned by month of "date"; app.services.archive creates the
+    partitions. Appointment IDs come from a permuted sequence and are never reused, but one
+    appointment can be archived more than once (re-importing an export brings it back), so
+    "archivedAt" is part of the key.
+    """
+    __tablename__ = "appointments_archive"
+    # Keep in sync with the Alembic revisions in app/db/migrations/versions
+    __table_args__ = (
+        # A partitioned table's primary key must include the partition column
+        PrimaryKeyConstraint("appointmentId", "date", "archivedAt", name="pk_appointments_archive"),
+        Index("idx_appointments_archive_patient", "patientId", "date"),
+        Index("idx_appointments_archive_phone", "phone_normalized", "date"),
+        {"postgresql_partition_by": 'RANGE ("date")'},
+    )
+
+    appointmentId = Column(String, nullable=False)
+    patientId = Column(String)
+    name = Column(String)
+    date = Column(Date, nullable=False)
+    time = Column(Time)
+    department = Column(String)
+    doctorName = Column(String)
+    userPhoneNumber = Column(String)
+    phone_normalized = Column(String)
+    isCancelled = Column(Boolean, default=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archivedAt = Column(DateTime, nullable=False, default=func.now())
+    # replaced (by the patient's next booking), cancelled or past
+    archiveReason = Column(String, nullable=False)
+
+    def __repr__(self):
+        return f"<ArchivedAppointment(id={self.appointmentId}, date={self.date}, reason={self.archiveReason})>"
+
+# Columns copied from appointments when a row is archived
+COPIED_COLUMNS = [column.key for column in Appointment.__table__.columns]
+
+event.listen(
+    ArchivedAppointment.__table__,
+    "after_create",
+    DDL(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF appointments_archive DEFAULT").execute_if(dialect="postgresql"),
+)
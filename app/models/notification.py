@@ -0,0 +1,46 @@
+from sqlalchemy import Column, String, DateTime, Integer, Text, Index
+from sqlalchemy.sql import func, text
+import logging
+from app.db.base import Base
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Delivery states of a queued SMS
+NOTIFICATION_QUEUED = "queued"
+NOTIFICATION_SENDING = "sending"
+NOTIFICATION_SENT = "sent"
+NOTIFICATION_FAILED = "failed"
+
+class Notification(Base):
+    """Outgoing SMS, queued by the API and delivered by app.services.notification_worker"""
+    __tablename__ = "notifications"
+    # Keep in sync with the Alembic revisions in app/db/migrations/versions
+    __table_args__ = (
+        # Pending messages per provider, in the order workers claim them
+        Index(
+            "idx_notifications_pending",
+            "provider", "nextAttemptAt",
+            postgresql_where=text("status IN ('queued', 'sending')"),
+        ),
+    )
+
+    notificationId = Column(Integer, primary_key=True, autoincrement=True)
+    provider = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # booking, cancellation, reschedule or otp
+    recipient = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    dedupeKey = Column(String, nullable=False, unique=True)
+    status = Column(String, nullable=False, default=NOTIFICATION_QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    nextAttemptAt = Column(DateTime, nullable=False, default=func.now())
+    # A worker that crashes mid-send releases its claim when this passes
+    lockedUntil = Column(DateTime)
+    lastError = Column(Text)
+    providerMessageId = Column(String)
+    sentAt = Column(DateTime)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Notification(id={self.notificationId}, kind={self.kind}, recipient={self.recipient}, status={self.status})>"
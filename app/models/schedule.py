@@ -0,0 +1,73 @@
+from sqlalchemy import Column, String, DateTime, Date, Time, Integer, Boolean, ForeignKey, Index
+from sqlalchemy.sql import func
+import logging
+from app.db.base import Base
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+class Department(Base):
+    __tablename__ = "departments"
+
+    departmentId = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+    created_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<Department(id={self.departmentId}, name={self.name})>"
+
+class Doctor(Base):
+    """A doctor taking appointments; appointments refer to doctors by name"""
+    __tablename__ = "doctors"
+    __table_args__ = (
+        Index("idx_doctors_department", "departmentId"),
+    )
+
+    doctorId = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+    departmentId = Column(Integer, ForeignKey("departments.departmentId"), nullable=False)
+    isActive = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Doctor(id={self.doctorId}, name={self.name}, department={self.departmentId})>"
+
+class ScheduleTemplate(Base):
+    """Weekly working hours of a doctor: one row per weekday and shift"""
+    __tablename__ = "schedule_templates"
+    __table_args__ = (
+        Index("idx_schedule_templates_doctor", "doctorId"),
+    )
+
+    templateId = Column(Integer, primary_key=True, autoincrement=True)
+    doctorId = Column(Integer, ForeignKey("doctors.doctorId", ondelete="CASCADE"), nullable=False)
+    weekday = Column(Integer, nullable=False)  # 0 = Monday, as date.weekday()
+    startTime = Column(Time, nullable=False)
+    endTime = Column(Time, nullable=False)
+    slotMinutes = Column(Integer, nullable=False, default=15)
+    # Optional break inside the shift, e.g. lunch; slots overlapping it are not offered
+    breakStart = Column(Time)
+    breakEnd = Column(Time)
+    # Optional validity window, for schedule changes announced in advance
+    validFrom = Column(Date)
+    validTo = Column(Date)
+
+    def __repr__(self):
+        return f"<ScheduleTemplate(doctor={self.doctorId}, weekday={self.weekday}, {self.startTime}-{self.endTime}/{self.slotMinutes}m)>"
+
+class DoctorLeave(Base):
+    """Whole days (inclusive) on which a doctor takes no appointments"""
+    __tablename__ = "doctor_leave"
+    __table_args__ = (
+        Index("idx_doctor_leave_doctor_dates", "doctorId", "startDate"),
+    )
+
+    leaveId = Column(Integer, primary_key=True, autoincrement=True)
+    doctorId = Column(Integer, ForeignKey("doctors.doctorId", ondelete="CASCADE"), nullable=False)
+    startDate = Column(Date, nullable=False)
+    endDate = Column(Date, nullable=False)
+    reason = Column(String)
+
+    def __repr__(self):
+        return f"<DoctorLeave(doctor={self.doctorId}, {self.startDate}..{self.endDate})>"
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, DateTime, Date, Integer
+from sqlalchemy.sql import func
+import logging
+from app.db.base import Base
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+class SlotCapacity(Base):
+    """Number of active (non-cancelled) appointments per date, doctor and department"""
+    __tablename__ = "slot_capacity"
+
+    date = Column(Date, primary_key=True)
+    doctorName = Column(String, primary_key=True)
+    department = Column(String, primary_key=True)
+    bookedCount = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<SlotCapacity(date={self.date}, doctor={self.doctorName}, department={self.department}, booked={self.bookedCount})>"
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, String, DateTime, Date, Time, Index, UniqueConstraint
+from sqlalchemy.sql import func
+import logging
+from app.db.base import Base
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+class SlotHold(Base):
+    """A short-lived reservation of one doctor/date/time slot, confirmed by booking with its holdId"""
+    __tablename__ = "slot_holds"
+    __table_args__ = (
+        # At most one hold per slot; expired holds are replaced in place
+        UniqueConstraint("doctorName", "date", "time", name="uq_slot_holds_slot"),
+        Index("idx_slot_holds_expires", "expiresAt"),
+    )
+
+    holdId = Column(String, primary_key=True)
+    doctorName = Column(String, nullable=False)
+    department = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    time = Column(Time, nullable=False)
+    # Only this patient may confirm the hold, when set
+    patientId = Column(String)
+    expiresAt = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<SlotHold(id={self.holdId}, doctor={self.doctorName}, date={self.date}, time={self.time}, expires={self.expiresAt})>"
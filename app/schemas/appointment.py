@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from datetime import datetime, date, time
-from typing import Optional
+from typing import List, Optional
 
 class AppointmentBase(BaseModel):
     patientId: str
@@ -12,7 +12,18 @@ class AppointmentBase(BaseModel):
     userPhoneNumber: str
 
 class AppointmentCreateRequest(AppointmentBase):
-    pass
+    # Hold on this slot from POST /appointments/holds, confirmed by the booking
+    holdId: Optional[str] = None
+
+class AppointmentImportRecord(AppointmentCreateRequest):
+    """A bulk import row; rows of an export keep their appointmentId and isCancelled"""
+    appointmentId: Optional[str] = Field(None, regex=r'^\d{6}$')
+    isCancelled: bool = False
+
+    @validator("appointmentId", "isCancelled", pre=True)
+    def _blank_is_missing(cls, value, field):
+        # Empty CSV cells
+        return field.default if value == "" else value
 
 class AppointmentUpdateRequest(AppointmentBase):
     pass
@@ -38,6 +49,29 @@ class Appointment(AppointmentBase):
     class Config:
         orm_mode = True
 
+class ArchivedAppointment(Appointment):
+    """An appointment moved to the archive: past, cancelled, or replaced by the patient's next booking"""
+    archivedAt: datetime
+    archiveReason: str
+
+class AppointmentFilters(BaseModel):
+    """Optional filters for listing appointments"""
+    dateFrom: Optional[date] = None
+    dateTo: Optional[date] = None
+    department: Optional[str] = None
+    doctorName: Optional[str] = None
+    patientId: Optional[str] = None
+    isCancelled: Optional[bool] = None
+
+class BulkImportRowError(BaseModel):
+    row: int
+    errors: List[str]
+
+class BulkImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: List[BulkImportRowError]
+
 # New schemas based on OpenAPI spec
 class AppointmentAvailabilityResponse(BaseModel):
     slotAvailable: bool
@@ -45,6 +79,49 @@ class AppointmentAvailabilityResponse(BaseModel):
     nextAvailableSlot: Optional[datetime] = None
     doctorName: str
 
+class AvailabilitySlot(BaseModel):
+    time: time
+    # Doctors free at this time (scheduled), or 1/0 on the fixed daily grid
+    free: int
+
+class AvailabilityDay(BaseModel):
+    date: date
+    booked: int
+    free: int
+    slots: List[AvailabilitySlot]
+
+class AvailabilityRangeResponse(BaseModel):
+    dateFrom: date
+    dateTo: date
+    doctorName: Optional[str] = None
+    department: Optional[str] = None
+    # True when free slots come from doctor schedules, False for the fixed daily capacity
+    scheduled: bool
+    days: List[AvailabilityDay]
+
+class FreeSlot(BaseModel):
+    date: date
+    time: time
+    doctorName: str
+    department: str
+
+    class Config:
+        orm_mode = True
+
+class SlotHoldRequest(BaseModel):
+    doctorName: str
+    department: str
+    date: date
+    time: time
+    patientId: Optional[str] = None
+
+class SlotHold(SlotHoldRequest):
+    holdId: str
+    expiresAt: datetime
+
+    class Config:
+        orm_mode = True
+
 class BookingDetailsResponse(BaseModel):
     appointmentDate: date
     appointmentNumber: str
@@ -52,18 +129,39 @@ class BookingDetailsResponse(BaseModel):
     userPhoneNumber: str
     userName: str
 
+class UpcomingAppointment(BaseModel):
+    appointmentNumber: str
+    userName: str
+    appointmentDate: date
+    appointmentTime: time
+
 class AppointmentUserDetailsResponse(BaseModel):
     appointmentAvailable: bool
+    # The next upcoming appointment
     appointmentNumber: Optional[str] = None
     userName: Optional[str] = None
     appointmentDate: Optional[date] = None
     appointmentTime: Optional[time] = None
+    # The next `limit` upcoming appointments, soonest first
+    upcomingAppointments: List[UpcomingAppointment] = []
 
 class OtpRequest(BaseModel):
     userPhoneNumber: str
 
 class OtpResponse(BaseModel):
-    sentOtp: str = Field(..., regex=r'^\d{6}$')
+    # Only returned when OTP_IN_RESPONSE is enabled (demo mode)
+    sentOtp: Optional[str] = Field(None, regex=r'^\d{6}$')
+    notificationId: Optional[int] = None
+
+class OtpVerifyRequest(BaseModel):
+    userPhoneNumber: str
+    otp: str = Field(..., regex=r'^\d{6}$')
+
+class OtpVerifyResponse(BaseModel):
+    verified: bool
+    sessionToken: str
+    tokenType: str = "bearer"
+    expiresIn: int
 
 class RescheduleDetailsResponse(BaseModel):
     rescheduleAvailable: bool
@@ -92,4 +190,21 @@ class SmsRescheduleRequest(BaseModel):
     userName: str
 
 class SmsResponse(BaseModel):
-    smsSent: bool 
+    smsSent: bool  # accepted for delivery; poll GET /notifications/{notificationId} for the outcome
+    notificationId: Optional[int] = None
+    status: Optional[str] = None
+
+class NotificationStatusResponse(BaseModel):
+    notificationId: int
+    kind: str
+    recipient: str
+    status: str
+    attempts: int
+    lastError: Optional[str] = None
+    providerMessageId: Optional[str] = None
+    created_at: Optional[datetime] = None
+    sentAt: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+from typing import Optional, Tuple
+import logging
+import os
+
+from app.core import http_cache
+from app.schemas.appointment import Appointment, AppointmentFilters
+from app.services import cache
+from app.services.appointment_repository import AppointmentRepository
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Bump the version when the cached Appointment shape changes
+APPOINTMENT_KEY_PREFIX = "appointment:v1:"
+
+# Days of upcoming appointments cached when a worker starts (0 = today only, negative disables)
+CACHE_WARM_DAYS = int(os.getenv("CACHE_WARM_DAYS", "1"))
+CACHE_WARM_LIMIT = int(os.getenv("CACHE_WARM_LIMIT", "1000"))
+
+API_PREFIX = os.getenv("API_PREFIX", "/v1")
+
+def appointment_key(appointmentId: str) -> str:
+    return f"{APPOINTMENT_KEY_PREFIX}{appointmentId}"
+
+def appointment_urls(appointmentId: str) -> Tuple[str, str]:
+    """Paths (with query) whose cached HTTP responses show the appointment"""
+    return (
+        f"{API_PREFIX}/appointments/{appointmentId}",
+        f"{API_PREFIX}/appointments/booking-details?appointmentNumber={appointmentId}",
+    )
+
+async def get_appointment(repository: AppointmentRepository, appointmentId: str) -> Optional[Appointment]:
+    """Return an appointment by ID, reading through the cache unless the repository opts out"""
+    key = appointment_key(appointmentId)
+    cached = await cache.get_json(key) if repository.reads_cache else None
+    if cached is not None:
+        logger.debug("Cache hit for appointment %s", appointmentId)
+        return Appointment.parse_obj(cached)
+
+    logger.debug("Cache miss for appointment %s", appointmentId)
+    db_appointment = await repository.get_appointment(appointmentId)
+    if db_appointment is None:
+        return None
+    appointment = Appointment.from_orm(db_appointment)
+    if repository.fills_cache:
+        await cache.set_json(key, appointment.dict())
+    return appointment
+
+async def remember_appointment(appointment: Appointment):
+    """Cache a freshly created appointment, which is usually read back right away"""
+    await cache.set_json(appointment_key(appointment.appointmentId), appointment.dict())
+
+async def invalidate_appointments(*appointmentIds: str):
+    """Drop cached appointments after they were written, here and in the HTTP cache in front of the API"""
+    appointmentIds = [appointmentId for appointmentId in appointmentIds if appointmentId]
+    await cache.invalidate(*(appointment_key(appointmentId) for appointmentId in appointmentIds))
+    http_cache.purge(*(url for appointmentId in appointmentIds for url in appointment_urls(appointmentId)))
+
+async def invalidate_all_appointments():
+    """Drop every cached appointment, e.g. after a bulk import
+
+    The HTTP cache in front of the API is not purged: open source nginx cannot drop entries by
+    prefix, so its micro-cached lookups stay stale for up to its 5 second TTL.
+    """
+    await cache.invalidate_prefix(APPOINTMENT_KEY_PREFIX)
+
+async def warm_appointments(repository: AppointmentRepository, days: int = CACHE_WARM_DAYS, limit: int = CACHE_WARM_LIMIT) -> int:
+    """Cache active appointments from today through `days` ahead, the ones callers look up next"""
+    if days < 0 or limit <= 0:
+        return 0
+    filters = AppointmentFilters(dateFrom=date.today(), dateTo=date.today() + timedelta(days=days), isCancelled=False)
+    db_appointments = await repository.list_appointments(filters, limit)
+    for db_appointment in db_appointments:
+        await remember_appointment(Appointment.from_orm(db_appointment))
+    logger.info("Warmed the cache with %s appointment(s)", len(db_appointments))
+    return len(db_appointments)
@@ -0,0 +1,517 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, namedtuple
+from datetime import date, datetime, time, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import logging
+import os
+import random
+import uuid
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.phone import normalize_phone
+from app.crud import appointments as crud
+from app.db.base import DbSession, get_session, run_db
+from app.db import bulk, replicas
+from app.db.replicas import get_read_session
+from app.schemas.appointment import (
+    Appointment, AppointmentCreateRequest, AppointmentFilters, ArchivedAppointment, FreeSlot, SlotHold,
+    SlotHoldRequest
+)
+from app.services import archive, reservations, schedule, slot_capacity
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# sql (PostgreSQL or SQLite, whichever DATABASE_URL points at; default) or memory
+# (an indexed store in the worker process, for tests and read-mostly edge replicas)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sql").lower()
+# Appointments loaded into the memory backend at startup: an export (JSON, NDJSON or CSV)
+MEMORY_STORE_SNAPSHOT = os.getenv("MEMORY_STORE_SNAPSHOT", "")
+
+class AppointmentRepository:
+    """Appointment storage behind the lookup, listing, availability and booking routes
+
+    Methods return objects with the Appointment attributes (ORM rows or schemas).
+    Free-slot search (doctor schedules) and notifications stay on the SQL database.
+    """
+
+    # Whether appointment_cache may answer get_appointment() for this repository, and may
+    # store what it returns
+    reads_cache = True
+    fills_cache = True
+
+    async def list_appointments(
+        self, filters: AppointmentFilters, limit: int, after: Optional[crud.KeysetCursor] = None
+    ) -> List[Appointment]:
+        """Return up to `limit` appointments ordered by (date, time, appointmentId), after the cursor"""
+        raise NotImplementedError
+
+    async def list_appointment_rows(
+        self, filters: AppointmentFilters, limit: int, after: Optional[crud.KeysetCursor] = None
+    ) -> List[Tuple]:
+        """list_appointments() as crud.APPOINTMENT_FIELDS tuples (also readable by field name)"""
+        raise NotImplementedError
+
+    def iter_appointment_batches(
+        self, filters: AppointmentFilters, after: Optional[crud.KeysetCursor] = None
+    ) -> AsyncIterator[List[Tuple]]:
+        """Yield every matching appointment in batches of list_appointment_rows() tuples"""
+        raise NotImplementedError
+
+    async def get_appointment(self, appointmentId: str) -> Optional[Appointment]:
+        raise NotImplementedError
+
+    async def list_upcoming_appointments_by_phone(
+        self, phone_normalized: str, after: Tuple[date, time], limit: int
+    ) -> List[Tuple]:
+        """crud.UPCOMING_FIELDS tuples of a normalized phone number's active appointments
+        at or after `after`, soonest first"""
+        raise NotImplementedError
+
+    async def create_appointment(self, appointment: AppointmentCreateRequest) -> Tuple[Appointment, List[str]]:
+        """Replace the patient's appointment; return the new one and the replaced IDs
+
+        Raises reservations.SlotUnavailableError if the slot is taken.
+        """
+        raise NotImplementedError
+
+    async def patch_appointment(self, appointmentId: str, update_data: Dict) -> Optional[Appointment]:
+        """Apply the provided fields; return None if the appointment does not exist"""
+        raise NotImplementedError
+
+    async def hold_slot(self, hold_request: SlotHoldRequest) -> SlotHold:
+        """Hold a free slot for reservations.SLOT_HOLD_SECONDS
+
+        Raises reservations.SlotUnavailableError if the slot is booked or held.
+        """
+        raise NotImplementedError
+
+    async def release_hold(self, holdId: str) -> bool:
+        """Delete a hold; return False if it does not exist"""
+        raise NotImplementedError
+
+    async def import_appointments(self, records: List[Any]) -> Dict[str, Any]:
+        """Load the valid records, replacing their patients' appointments; report per-row errors
+        (see app.db.bulk.import_appointments)"""
+        raise NotImplementedError
+
+    async def list_archived_appointments(
+        self, phone_normalized: Optional[str], patientId: Optional[str], limit: int
+    ) -> List[ArchivedAppointment]:
+        """Archived appointments of a normalized phone number and/or patient, latest date first"""
+        raise NotImplementedError
+
+    async def find_free_slots(
+        self, start: date, days: int, doctorName: Optional[str], department: Optional[str], limit: int
+    ) -> Optional[List[FreeSlot]]:
+        """Scheduled free slots, or None when no doctor matching the filters has a schedule"""
+        raise NotImplementedError
+
+    async def get_booked_count(self, appointmentDate: date, doctorName: Optional[str], department: Optional[str]) -> int:
+        raise NotImplementedError
+
+    async def count_booked_by_slot(
+        self, start: date, end: date, doctorName: Optional[str], department: Optional[str]
+    ) -> Dict[Tuple[date, time], int]:
+        """Active appointments per (date, time) from `start` to `end`"""
+        raise NotImplementedError
+
+    async def find_next_available_date(
+        self, after: date, doctorName: Optional[str], department: Optional[str]
+    ) -> Optional[Tuple[date, int]]:
+        """Return the first date after `after` with free capacity and its booked count"""
+        raise NotImplementedError
+
+class SqlAppointmentRepository(AppointmentRepository):
+    """The crud and slot services on a request's database session (sync or async)"""
+
+    def __init__(self, db: DbSession):
+        self.db = db
+        source = db.info.get(replicas.READ_SOURCE)
+        # A caller pinned to the primary must see its own write, which the cache may predate;
+        # rows read from a replica may predate a write whose invalidation already ran
+        self.reads_cache = source != replicas.READ_FROM_PINNED_PRIMARY
+        self.fills_cache = source != replicas.READ_FROM_REPLICA
+
+    async def list_appointments(self, filters, limit, after=None):
+        return await run_db(self.db, crud.list_appointments, filters, limit, after)
+
+    async def list_appointment_rows(self, filters, limit, after=None):
+        return await run_db(self.db, crud.list_appointment_rows, filters, limit, after)
+
+    async def iter_appointment_batches(self, filters, after=None):
+        if isinstance(self.db, AsyncSession):
+            async for batch in crud.aiter_appointment_batches(self.db, filters, after):
+                yield batch
+        else:
+            # Each batch is a blocking fetch from the server-side cursor
+            batches = crud.iter_appointment_batches(self.db, filters, after)
+            while True:
+                batch = await run_db(self.db, lambda db: next(batches, None))
+                if batch is None:
+                    return
+                yield batch
+
+    async def get_appointment(self, appointmentId):
+        return await run_db(self.db, crud.get_appointment, appointmentId)
+
+    async def list_upcoming_appointments_by_phone(self, phone_normalized, after, limit):
+        return await run_db(self.db, crud.list_upcoming_appointments_by_phone, phone_normalized, after, limit)
+
+    async def create_appointment(self, appointment):
+        return await run_db(self.db, crud.create_appointment, appointment)
+
+    async def patch_appointment(self, appointmentId, update_data):
+        return await run_db(self.db, crud.patch_appointment, appointmentId, update_data)
+
+    async def hold_slot(self, hold_request):
+        return await run_db(
+            self.db, reservations.hold_slot, hold_request.doctorName, hold_request.department,
+            hold_request.date, hold_request.time, hold_request.patientId
+        )
+
+    async def release_hold(self, holdId):
+        return await run_db(self.db, reservations.release_hold, holdId)
+
+    async def import_appointments(self, records):
+        return await run_db(self.db, bulk.import_appointments, records)
+
+    async def list_archived_appointments(self, phone_normalized, patientId, limit):
+        return await run_db(self.db, archive.list_archived_appointments, phone_normalized, patientId, limit)
+
+    async def find_free_slots(self, start, days, doctorName, department, limit):
+        return await run_db(self.db, schedule.find_free_slots, start, days, doctorName, department, limit)
+
+    async def get_booked_count(self, appointmentDate, doctorName, department):
+        return await run_db(self.db, slot_capacity.get_booked_count, appointmentDate, doctorName, department)
+
+    async def count_booked_by_slot(self, start, end, doctorName, department):
+        return await run_db(self.db, crud.count_booked_by_slot, start, end, doctorName, department)
+
+    async def find_next_available_date(self, after, doctorName, department):
+        return await run_db(self.db, slot_capacity.find_next_available_date, after, doctorName, department)
+
+# Row shape of MemoryAppointmentRepository.list_appointment_rows, like a SQLAlchemy Row
+AppointmentRow = namedtuple("AppointmentRow", crud.APPOINTMENT_FIELDS)
+UpcomingRow = namedtuple("UpcomingRow", crud.UPCOMING_FIELDS)
+
+class MemoryAppointmentRepository(AppointmentRepository):
+    """Appointments and slot holds indexed in memory by ID, patient, phone, slot and date; no schedules
+
+    Every method runs without awaiting, so each one is atomic on the event loop.
+    Data lives in one worker process and is lost when it exits.
+    """
+
+    def __init__(self):
+        self.by_id: Dict[str, Appointment] = {}
+        self.by_patient: Dict[str, str] = {}
+        # Appointment IDs per normalized phone number
+        self.by_phone: Dict[Optional[str], Set[str]] = {}
+        # Active appointment in each (doctorName, date, time) slot
+        self.by_slot: Dict[Tuple, str] = {}
+        # Active appointments per (date, doctorName, department), like the slot_capacity table
+        self.booked: Counter = Counter()
+        # (date, time, appointmentId) of every appointment, sorted, for keyset pagination
+        self.order: List[crud.KeysetCursor] = []
+        # Appointments replaced by the patient's next booking, oldest first
+        self.archived: List[ArchivedAppointment] = []
+        # Slot holds by ID, and the hold on each (doctorName, date, time) slot
+        self.holds: Dict[str, SlotHold] = {}
+        self.held_slots: Dict[Tuple, str] = {}
+
+    def _add(self, appointment: Appointment):
+        self.by_id[appointment.appointmentId] = appointment
+        self.by_patient[appointment.patientId] = appointment.appointmentId
+        self.by_phone.setdefault(normalize_phone(appointment.userPhoneNumber), set()).add(appointment.appointmentId)
+        if not appointment.isCancelled:
+            self.by_slot[(appointment.doctorName, appointment.date, appointment.time)] = appointment.appointmentId
+            self.booked[slot_capacity.slot_key(appointment)] += 1
+        insort(self.order, crud.keyset_cursor(appointment))
+
+    def _remove(self, appointment: Appointment):
+        del self.by_id[appointment.appointmentId]
+        if self.by_patient.get(appointment.patientId) == appointment.appointmentId:
+            del self.by_patient[appointment.patientId]
+        self.by_phone[normalize_phone(appointment.userPhoneNumber)].discard(appointment.appointmentId)
+        if not appointment.isCancelled:
+            del self.by_slot[(appointment.doctorName, appointment.date, appointment.time)]
+            self.booked[slot_capacity.slot_key(appointment)] -= 1
+        del self.order[bisect_left(self.order, crud.keyset_cursor(appointment))]
+
+    def _check_slot(self, appointment: Appointment, replacing: Optional[str] = None):
+        if appointment.isCancelled:
+            return
+        taken_by = self.by_slot.get((appointment.doctorName, appointment.date, appointment.time))
+        if taken_by is not None and taken_by != replacing:
+            raise reservations.SlotUnavailableError("Slot is already booked")
+
+    def _live_hold(self, slot: Tuple) -> Optional[SlotHold]:
+        """The unexpired hold on a slot; an expired one is dropped"""
+        hold = self.holds.get(self.held_slots.get(slot))
+        if hold is not None and hold.expiresAt <= reservations.utcnow():
+            self._drop_hold(hold)
+            return None
+        return hold
+
+    def _drop_hold(self, hold: SlotHold):
+        del self.holds[hold.holdId]
+        del self.held_slots[(hold.doctorName, hold.date, hold.time)]
+
+    def _check_hold(self, slot: Tuple, holdId: Optional[str] = None, patientId: Optional[str] = None) -> Optional[SlotHold]:
+        """Return the hold a booking confirms, like reservations.reserve_slot; raise if the slot is held otherwise"""
+        hold = self._live_hold(slot)
+        if holdId is not None:
+            if hold is None or hold.holdId != holdId or hold.patientId not in (None, patientId):
+                raise reservations.SlotUnavailableError("Hold has expired or does not match this booking")
+            return hold
+        if hold is not None:
+            raise reservations.SlotUnavailableError("Slot is held for another booking")
+        return None
+
+    def _archive_replaced(self, previous: Appointment):
+        self._remove(previous)
+        self.archived.append(ArchivedAppointment(
+            archivedAt=datetime.utcnow(), archiveReason="replaced", **previous.dict()
+        ))
+
+    def _new_id(self) -> str:
+        while True:
+            appointmentId = f"{random.randrange(1_000_000):06d}"
+            if appointmentId not in self.by_id:
+                return appointmentId
+
+    def load(self, appointments: List[Appointment]) -> int:
+        """Add appointments (e.g. from a snapshot), skipping ones that clash with those already loaded"""
+        loaded = 0
+        for appointment in appointments:
+            if appointment.appointmentId in self.by_id or appointment.patientId in self.by_patient:
+                logger.warning("Skipping duplicate appointment %s", appointment.appointmentId)
+                continue
+            try:
+                self._check_slot(appointment)
+            except reservations.SlotUnavailableError:
+                logger.warning("Skipping appointment %s in a booked slot", appointment.appointmentId)
+                continue
+            self._add(appointment)
+            loaded += 1
+        return loaded
+
+    def _matches(self, appointment: Appointment, filters: AppointmentFilters) -> bool:
+        return all((
+            filters.department is None or appointment.department == filters.department,
+            filters.doctorName is None or appointment.doctorName == filters.doctorName,
+            filters.patientId is None or appointment.patientId == filters.patientId,
+            filters.isCancelled is None or bool(appointment.isCancelled) == filters.isCancelled,
+        ))
+
+    def _iter_matching(self, filters: AppointmentFilters, after: Optional[crud.KeysetCursor]):
+        start = bisect_right(self.order, after) if after is not None else 0
+        if filters.dateFrom is not None:
+            start = max(start, bisect_right(self.order, (filters.dateFrom,)))
+        for position in range(start, len(self.order)):
+            appointment_date, _, appointmentId = self.order[position]
+            if filters.dateTo is not None and appointment_date > filters.dateTo:
+                return
+            appointment = self.by_id[appointmentId]
+            if self._matches(appointment, filters):
+                yield appointment
+
+    async def list_appointments(self, filters, limit, after=None):
+        matching = []
+        for appointment in self._iter_matching(filters, after):
+            matching.append(appointment)
+            if len(matching) == limit:
+                break
+        return matching
+
+    async def list_appointment_rows(self, filters, limit, after=None):
+        return [
+            AppointmentRow(*(getattr(appointment, field) for field in crud.APPOINTMENT_FIELDS))
+            for appointment in await self.list_appointments(filters, limit, after)
+        ]
+
+    async def iter_appointment_batches(self, filters, after=None):
+        # Copy the page before yielding, so writes between batches cannot break the iteration
+        while True:
+            batch = await self.list_appointment_rows(filters, crud.STREAM_BATCH_SIZE, after)
+            if not batch:
+                return
+            yield batch
+            after = crud.keyset_cursor(batch[-1])
+
+    async def get_appointment(self, appointmentId):
+        return self.by_id.get(appointmentId)
+
+    async def list_upcoming_appointments_by_phone(self, phone_normalized, after, limit):
+        upcoming = sorted(
+            crud.keyset_cursor(appointment)
+            for appointment in (self.by_id[appointmentId] for appointmentId in self.by_phone.get(phone_normalized, ()))
+            if not appointment.isCancelled and (appointment.date, appointment.time) >= after
+        )
+        return [
+            UpcomingRow(*(getattr(self.by_id[appointmentId], field) for field in crud.UPCOMING_FIELDS))
+            for _, _, appointmentId in upcoming[:limit]
+        ]
+
+    async def create_appointment(self, appointment):
+        previous = self.by_id.get(self.by_patient.get(appointment.patientId))
+        created = Appointment(
+            appointmentId=self._new_id(), isCancelled=False, **appointment.dict(exclude={"holdId"})
+        )
+        self._check_slot(created, replacing=previous.appointmentId if previous else None)
+        hold = self._check_hold(
+            (created.doctorName, created.date, created.time), appointment.holdId, appointment.patientId
+        )
+        if hold is not None:
+            self._drop_hold(hold)
+        if previous is not None:
+            self._archive_replaced(previous)
+        self._add(created)
+        return created, [previous.appointmentId] if previous else []
+
+    async def patch_appointment(self, appointmentId, update_data):
+        current = self.by_id.get(appointmentId)
+        if current is None:
+            return None
+        changes = {key: value for key, value in update_data.items() if value is not None}
+        patched = current.copy(update=changes)
+        self._check_slot(patched, replacing=appointmentId)
+        if not patched.isCancelled and (current.isCancelled or {"date", "time", "doctorName"} & set(changes)):
+            self._check_hold((patched.doctorName, patched.date, patched.time))
+        if patched.patientId != current.patientId and patched.patientId in self.by_patient:
+            raise ValueError(f"Patient {patched.patientId} already has an appointment")
+        self._remove(current)
+        self._add(patched)
+        return patched
+
+    async def hold_slot(self, hold_request):
+        slot = (hold_request.doctorName, hold_request.date, hold_request.time)
+        if slot in self.by_slot:
+            raise reservations.SlotUnavailableError("Slot is already booked")
+        if self._live_hold(slot) is not None:
+            raise reservations.SlotUnavailableError("Slot is held for another booking")
+        now = reservations.utcnow()
+        # Drop expired holds, so the store does not grow with abandoned ones
+        for expired in [hold for hold in self.holds.values() if hold.expiresAt <= now]:
+            self._drop_hold(expired)
+        hold = SlotHold(
+            holdId=str(uuid.uuid4()), expiresAt=now + timedelta(seconds=reservations.SLOT_HOLD_SECONDS),
+            **hold_request.dict()
+        )
+        self.holds[hold.holdId] = hold
+        self.held_slots[slot] = hold.holdId
+        return hold
+
+    async def release_hold(self, holdId):
+        hold = self.holds.get(holdId)
+        if hold is None:
+            return False
+        self._drop_hold(hold)
+        return True
+
+    def _slot_taken_for_import(self, appointment, patients) -> bool:
+        """Whether an imported row's slot is held, or booked by a patient the import does not move"""
+        slot = (appointment.doctorName, appointment.date, appointment.time)
+        owner = self.by_slot.get(slot)
+        return self._live_hold(slot) is not None or (owner is not None and self.by_id[owner].patientId not in patients)
+
+    async def import_appointments(self, records):
+        valid, errors = bulk.validate_records(records)
+        # Slots of patients the import moves are free for the other imported rows, unless the
+        # patient's own row is rejected; that can reject further rows, so repeat until none are
+        while True:
+            patients = {appointment.patientId for _, appointment in valid}
+            taken = {
+                row for row, appointment in valid
+                if not appointment.isCancelled and self._slot_taken_for_import(appointment, patients)
+            }
+            if not taken:
+                break
+            errors.extend({"row": row, "errors": ["time: slot is already booked or held"]} for row in taken)
+            valid = [(row, appointment) for row, appointment in valid if row not in taken]
+        accepted = [appointment for _, appointment in valid]
+        for appointment in accepted:
+            previous = self.by_id.get(self.by_patient.get(appointment.patientId))
+            if previous is not None:
+                self._archive_replaced(previous)
+        requested = {appointment.appointmentId for appointment in accepted}
+        for appointment in accepted:
+            appointmentId = appointment.appointmentId
+            # Keep the row's ID unless another patient's appointment, current or archived, has it
+            if appointmentId is None or appointmentId in self.by_id or any(
+                archived.appointmentId == appointmentId and archived.patientId != appointment.patientId
+                for archived in self.archived
+            ):
+                appointmentId = self._new_id()
+                while appointmentId in requested:
+                    appointmentId = self._new_id()
+            self._add(Appointment(appointmentId=appointmentId, **appointment.dict(exclude={"holdId", "appointmentId"})))
+        errors.sort(key=lambda error: error["row"])
+        logger.info("Imported %s appointment(s), rejected %s", len(accepted), len(errors))
+        return {"imported": len(accepted), "failed": len(errors), "errors": errors}
+
+    async def list_archived_appointments(self, phone_normalized, patientId, limit):
+        matching = [
+            appointment for appointment in reversed(self.archived)
+            if (phone_normalized is None or normalize_phone(appointment.userPhoneNumber) == phone_normalized)
+            and patientId in (None, appointment.patientId)
+        ]
+        return sorted(matching, key=lambda appointment: appointment.date, reverse=True)[:limit]
+
+    async def find_free_slots(self, start, days, doctorName, department, limit):
+        return None
+
+    def _booked_on(self, appointmentDate: date, doctorName: Optional[str], department: Optional[str]) -> int:
+        return sum(
+            count for (slot_date, slot_doctor, slot_department), count in self.booked.items()
+            if slot_date == appointmentDate
+            and (doctorName is None or slot_doctor == doctorName)
+            and (department is None or slot_department == department)
+        )
+
+    async def get_booked_count(self, appointmentDate, doctorName, department):
+        return self._booked_on(appointmentDate, doctorName, department)
+
+    async def count_booked_by_slot(self, start, end, doctorName, department):
+        booked: Counter = Counter()
+        for (slot_doctor, slot_date, slot_time), appointmentId in self.by_slot.items():
+            if not start <= slot_date <= end or doctorName not in (None, slot_doctor):
+                continue
+            if department is None or self.by_id[appointmentId].department == department:
+                booked[(slot_date, slot_time)] += 1
+        return dict(booked)
+
+    async def find_next_available_date(self, after, doctorName, department):
+        for offset in range(1, slot_capacity.AVAILABILITY_LOOKAHEAD_DAYS + 1):
+            candidate = after + timedelta(days=offset)
+            count = self._booked_on(candidate, doctorName, department)
+            if count < slot_capacity.MAX_APPOINTMENTS_PER_DAY:
+                return candidate, count
+        return None
+
+def load_snapshot(repository: MemoryAppointmentRepository, path: str) -> int:
+    """Load an appointment export (JSON array, NDJSON or CSV, by file extension) into the memory store"""
+    file_format = os.path.splitext(path)[1].lstrip(".").lower()
+    with open(path) as f:
+        appointments = [Appointment.parse_obj(record) for record in bulk.read_file_records(f, file_format)]
+    loaded = repository.load(appointments)
+    logger.info("Loaded %s appointment(s) from %s", loaded, path)
+    return loaded
+
+memory_repository = MemoryAppointmentRepository() if STORAGE_BACKEND == "memory" else None
+
+def get_sql_repository(db: DbSession = Depends(get_session)) -> AppointmentRepository:
+    return SqlAppointmentRepository(db)
+
+def get_sql_read_repository(db: DbSession = Depends(get_read_session)) -> AppointmentRepository:
+    return SqlAppointmentRepository(db)
+
+def get_memory_repository() -> AppointmentRepository:
+    return memory_repository
+
+# Dependencies used by the route handlers; the memory backend never opens a database session.
+# Read-only routes may be served by a replica (see app/db/replicas.py).
+get_repository = get_memory_repository if STORAGE_BACKEND == "memory" else get_sql_repository
+get_read_repository = get_memory_repository if STORAGE_BACKEND == "memory" else get_sql_read_repository
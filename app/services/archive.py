@@ -0,0 +1,205 @@
+"""Archival of past and cancelled appointments.
+
+The hot appointments table only keeps what the booking routes need: upcoming and recent
+appointments. archive_appointments() moves older rows, in batches, into appointments_archive,
+which on PostgreSQL is partitioned by month of "date" so history stays queryable without
+growing the hot table's indexes. Replaced appointments (a patient's earlier booking) are
+archived by the booking itself.
+
+Run it from cron (`python -m app.db.manage_db archive`), as a loop of its own
+
+    python -m app.services.archive
+
+or inside each API process with ARCHIVE_WORKER=true. Concurrent runs skip each other's rows.
+"""
+from sqlalchemy import case, delete, func, insert, or_, select, text
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+import asyncio
+import logging
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from app.db.base import SessionLocal, seconds_from_now
+from app.models.appointment import Appointment as AppointmentModel
+from app.models.appointment_archive import COPIED_COLUMNS, DEFAULT_PARTITION, PARTITION_PREFIX, ArchivedAppointment
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Appointments are archived this many days after their date
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+# Cancelled appointments are archived this many days after their last update
+ARCHIVE_CANCELLED_AFTER_DAYS = int(os.getenv("ARCHIVE_CANCELLED_AFTER_DAYS", "7"))
+# Rows moved per transaction
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Run the archiver inside the API process, every ARCHIVE_INTERVAL_SECONDS
+ARCHIVE_WORKER = os.getenv("ARCHIVE_WORKER", "False").lower() == "true"
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# Serializes partition creation between concurrent archivers (pg_advisory_xact_lock key)
+_PARTITION_LOCK_KEY = 0x61726368697665
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}y{month.year}m{month.month:02d}"
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def _next_month(month: date) -> date:
+    return (month + timedelta(days=32)).replace(day=1)
+
+def ensure_partitions(db: Session, days: Iterable[date]) -> List[str]:
+    """Create the monthly archive partitions covering `days`; return the names created
+
+    Rows that already went to the default partition (replaced appointments) are moved into
+    the new partition, since PostgreSQL refuses to attach a range the default partition holds.
+    No-op on other databases.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return []
+    months = sorted({_month_start(day) for day in days})
+    missing = [month for month in months if db.execute(select(func.to_regclass(partition_name(month)))).scalar() is None]
+    if not missing:
+        return []
+    db.execute(select(func.pg_advisory_xact_lock(_PARTITION_LOCK_KEY)))
+    created = []
+    for month in missing:
+        name = partition_name(month)
+        if db.execute(select(func.to_regclass(name))).scalar() is not None:
+            continue  # Created by a concurrent archiver meanwhile
+        bounds = {"start": month, "end": _next_month(month)}
+        db.execute(text(f"CREATE TABLE {name} (LIKE appointments_archive INCLUDING DEFAULTS)"))
+        db.execute(text(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "date" >= :start AND "date" < :end RETURNING *) '
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ), bounds)
+        db.execute(text(
+            f"ALTER TABLE appointments_archive ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+        ))
+        created.append(name)
+    logger.info("Created archive partition(s) %s", ", ".join(created))
+    return created
+
+def _default_partition_days(db: Session) -> List[date]:
+    if db.get_bind().dialect.name != "postgresql":
+        return []
+    return list(db.execute(text(
+        f"SELECT DISTINCT CAST(date_trunc('month', \"date\") AS DATE) FROM {DEFAULT_PARTITION}"
+    )).scalars())
+
+def archive_batch(db: Session, past_before: date, limit: int = ARCHIVE_BATCH_SIZE) -> Dict[str, int]:
+    """Move up to `limit` appointments dated before `past_before`, or cancelled long enough ago,
+    into the archive in the caller's transaction; return the counts per reason"""
+    due = or_(
+        AppointmentModel.date < past_before,
+        (AppointmentModel.isCancelled == True)
+        & (AppointmentModel.updated_at < seconds_from_now(-ARCHIVE_CANCELLED_AFTER_DAYS * 86400)),
+    )
+    candidates = db.execute(
+        select(AppointmentModel.appointmentId, AppointmentModel.date, AppointmentModel.isCancelled)
+        .where(due).order_by(AppointmentModel.date).limit(limit).with_for_update(skip_locked=True)
+    ).all()
+    if not candidates:
+        return {}
+    ensure_partitions(db, [candidate.date for candidate in candidates])
+
+    ids = [candidate.appointmentId for candidate in candidates]
+    reason = case((AppointmentModel.isCancelled == True, "cancelled"), else_="past")
+    db.execute(insert(ArchivedAppointment).from_select(
+        COPIED_COLUMNS + ["archivedAt", "archiveReason"],
+        select(*(getattr(AppointmentModel, column) for column in COPIED_COLUMNS), func.now(), reason)
+        .where(AppointmentModel.appointmentId.in_(ids)),
+    ))
+    db.execute(delete(AppointmentModel).where(AppointmentModel.appointmentId.in_(ids)))
+    cancelled = sum(1 for candidate in candidates if candidate.isCancelled)
+    return {"cancelled": cancelled, "past": len(candidates) - cancelled}
+
+def archive_appointments(
+    db: Session, today: Optional[date] = None, batch_size: int = ARCHIVE_BATCH_SIZE, max_batches: Optional[int] = None
+) -> Dict[str, int]:
+    """Archive every due appointment, committing after each batch; return the counts per reason"""
+    past_before = (today or date.today()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    # Give replaced appointments waiting in the default partition their monthly partitions
+    ensure_partitions(db, _default_partition_days(db))
+    db.commit()
+    totals = {"cancelled": 0, "past": 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        try:
+            moved = archive_batch(db, past_before, batch_size)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if not moved:
+            break
+        batches += 1
+        for reason, count in moved.items():
+            totals[reason] += count
+        logger.debug("Archived batch %s: %s", batches, moved)
+    logger.info("Archived %s past and %s cancelled appointment(s)", totals["past"], totals["cancelled"])
+    return totals
+
+def list_archived_appointments(
+    db: Session, phone_normalized: Optional[str] = None, patientId: Optional[str] = None, limit: int = 50
+) -> List[ArchivedAppointment]:
+    """Archived appointments of a (normalized) phone number and/or patient, latest date first"""
+    stmt = select(ArchivedAppointment)
+    if phone_normalized is not None:
+        stmt = stmt.where(ArchivedAppointment.phone_normalized == phone_normalized)
+    if patientId is not None:
+        stmt = stmt.where(ArchivedAppointment.patientId == patientId)
+    stmt = stmt.order_by(ArchivedAppointment.date.desc(), ArchivedAppointment.archivedAt.desc()).limit(limit)
+    return list(db.execute(stmt).scalars())
+
+class ArchiveWorker:
+    """Archive due appointments every `interval` seconds on the running event loop"""
+
+    def __init__(self, session_factory=SessionLocal, interval: float = ARCHIVE_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def _archive(self) -> Dict[str, int]:
+        with self.session_factory() as db:
+            return archive_appointments(db)
+
+    async def _loop(self):
+        while True:
+            try:
+                await run_in_threadpool(self._archive)
+            except Exception as e:
+                logger.error("Archive run failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+        logger.info("Archive worker started (every %ss)", self.interval)
+
+    async def stop(self):
+        """Stop between runs; a batch in progress finishes in its thread"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            logger.info("Archive worker stopped")
+
+worker = ArchiveWorker()
+
+async def _run_forever():
+    worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(_run_forever())
+    except KeyboardInterrupt:
+        pass
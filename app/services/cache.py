@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Only needed for CACHE_BACKEND=redis
+    aioredis = None
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Worker processes of this server; gunicorn.conf.py exports the number it starts
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+# memory (per process), redis (shared by all workers) or none; redis is the default with several
+# workers, since a memory cache only drops entries in the worker that handled the write
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis" if WEB_CONCURRENCY > 1 else "memory").lower()
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "15"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+class CacheBackend:
+    """Async key/value cache with per-entry TTL"""
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def clear(self, prefix: str):
+        """Delete every key starting with `prefix`"""
+        raise NotImplementedError
+
+class NullCache(CacheBackend):
+    """Cache that stores nothing, for CACHE_BACKEND=none"""
+
+    async def get(self, key: str) -> Optional[str]:
+        return None
+
+    async def set(self, key: str, value: str, ttl: float):
+        pass
+
+    async def delete(self, *keys: str):
+        pass
+
+    async def clear(self, prefix: str):
+        pass
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with TTL; entries are only visible to the current worker"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    async def clear(self, prefix: str):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+class RedisCache(CacheBackend):
+    """Cache shared by all workers and replicas through Redis"""
+
+    def __init__(self, url: str = REDIS_URL):
+        if aioredis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = aioredis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._client.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._client.delete(*keys)
+
+    async def clear(self, prefix: str):
+        keys = [key async for key in self._client.scan_iter(match=f"{prefix}*")]
+        if keys:
+            await self._client.delete(*keys)
+
+def create_cache(backend: str = CACHE_BACKEND, workers: int = WEB_CONCURRENCY) -> CacheBackend:
+    """Create the cache backend selected by CACHE_BACKEND"""
+    logger.info("Using %s cache backend", backend)
+    if backend == "redis":
+        return RedisCache()
+    if backend == "none":
+        return NullCache()
+    if workers > 1:
+        raise RuntimeError(
+            f"CACHE_BACKEND=memory would serve stale appointments with {workers} workers; "
+            "use CACHE_BACKEND=redis or none, or WEB_CONCURRENCY=1"
+        )
+    return MemoryCache()
+
+cache = create_cache()
+
+async def get_json(key: str) -> Any:
+    """Return the decoded JSON value cached under `key`, or None; cache failures count as misses"""
+    try:
+        value = await cache.get(key)
+    except Exception as e:
+        logger.warning("Cache read failed for %s: %s", key, e)
+        return None
+    return None if value is None else json.loads(value)
+
+async def set_json(key: str, value: Any, ttl: float = CACHE_TTL_SECONDS):
+    """Cache a JSON-serializable value; cache failures are logged and ignored"""
+    try:
+        await cache.set(key, json.dumps(value, default=str), ttl)
+    except Exception as e:
+        logger.warning("Cache write failed for %s: %s", key, e)
+
+async def invalidate(*keys: str):
+    """Drop cached keys; failures are logged and the entries expire with their TTL"""
+    try:
+        await cache.delete(*keys)
+    except Exception as e:
+        logger.warning("Cache invalidation failed for %s: %s", keys, e)
+
+async def invalidate_prefix(prefix: str):
+    """Drop every cached key starting with `prefix`"""
+    try:
+        await cache.clear(prefix)
+    except Exception as e:
+        logger.warning("Cache invalidation failed for prefix %s: %s", prefix, e)
@@ -0,0 +1,91 @@
+from sqlalchemy import func, select, text, union
+from sqlalchemy.orm import Session
+from collections import deque
+from typing import List
+import hashlib
+import logging
+import os
+
+from app.models.appointment import APPOINTMENT_ID_COUNTER, Appointment as AppointmentModel, appointment_id_seq
+from app.models.appointment_archive import ArchivedAppointment
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Appointment IDs are 6 digits, so the sequence can hand out at most 10^6 values
+ID_SPACE = 1_000_000
+_HALF = 1_000
+_ROUNDS = 4
+
+# Number of IDs a worker reserves per sequence round trip
+BLOCK_SIZE = int(os.getenv("APPOINTMENT_ID_BLOCK_SIZE", "100"))
+
+# Key of the permutation; IDs already in use are skipped, so changing it is safe
+_KEY = os.getenv("APPOINTMENT_ID_KEY", "apollo-appointments").encode()
+
+def _round(value: int, round_number: int) -> int:
+    digest = hashlib.blake2b(f"{round_number}:{value}".encode(), key=_KEY, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % _HALF
+
+def permute(value: int) -> int:
+    """Map a sequence value in [0, 10^6) to a unique, non-sequential value in the same range"""
+    # Balanced Feistel network over two base-1000 halves: a bijection on [0, 10^6)
+    left, right = divmod(value, _HALF)
+    for round_number in range(_ROUNDS):
+        left, right = right, (left + _round(right, round_number)) % _HALF
+    return left * _HALF + right
+
+def format_id(value: int) -> str:
+    return f"{value:06d}"
+
+class AppointmentIdAllocator:
+    """Hand out fresh 6-digit appointment IDs from blocks reserved on a Postgres sequence, or one at a
+    time from a counter table on SQLite"""
+
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self._reserved = deque()
+
+    def allocate(self, db: Session) -> str:
+        """Return an appointment ID that is not used by any existing appointment"""
+        while True:
+            try:
+                return self._reserved.popleft()
+            except IndexError:
+                # No lock is held while reserving: concurrent callers each reserve a block
+                self._reserved.extend(self._reserve_block(db))
+
+    def _reserve_block(self, db: Session) -> List[str]:
+        if db.get_bind().dialect.name == "postgresql":
+            values = db.execute(
+                select(appointment_id_seq.next_value()).select_from(func.generate_series(1, self.block_size))
+            ).scalars().all()
+        else:
+            values = [self._next_counter_value(db)]
+        candidates = [format_id(permute(value)) for value in values]
+        # Appointments created before the allocator existed have random IDs, and some of them may
+        # have been archived since; an archived ID is not handed out again either
+        taken = set(db.execute(union(
+            select(AppointmentModel.appointmentId).where(AppointmentModel.appointmentId.in_(candidates)),
+            select(ArchivedAppointment.appointmentId).where(ArchivedAppointment.appointmentId.in_(candidates)),
+        )).scalars())
+        if taken:
+            logger.debug("Skipping %s reserved appointment ID(s) that are already in use", len(taken))
+        logger.debug("Reserved %s appointment IDs", len(candidates) - len(taken))
+        return [candidate for candidate in candidates if candidate not in taken]
+
+    @staticmethod
+    def _next_counter_value(db: Session) -> int:
+        """Next value of the SQLite counter that stands in for appointment_id_seq
+
+        One value at a time: the increment belongs to the caller's transaction, so a rollback hands
+        the value out again, which is only safe if nothing else from the block was kept.
+        """
+        value = db.execute(text(
+            f'UPDATE {APPOINTMENT_ID_COUNTER} SET "nextValue" = "nextValue" + 1 RETURNING "nextValue" - 1'
+        )).scalar_one()
+        if value >= ID_SPACE:
+            raise RuntimeError("All appointment IDs have been handed out")
+        return value
+
+allocator = AppointmentIdAllocator()
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from typing import Callable, Optional
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Only needed for IDEMPOTENCY_BACKEND=redis
+    aioredis = None
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Worker processes of this server; gunicorn.conf.py exports the number it starts
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+# memory (per process) or redis (shared by all workers and replicas); redis is the default with
+# several workers, since a retry may reach another worker than the first request
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "redis" if WEB_CONCURRENCY > 1 else "memory").lower()
+# How long a response is replayed for its key
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# How long a key stays claimed by a request that has not finished (e.g. its worker died)
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+class IdempotencyStore:
+    """Responses keyed by idempotency key, with per-entry TTL; values are opaque JSON strings"""
+
+    async def claim(self, key: str, value: str, ttl: float) -> Optional[str]:
+        """Store `value` if the key is free and return None; otherwise return the value already stored"""
+        raise NotImplementedError
+
+    async def save(self, key: str, value: str, ttl: float):
+        """Replace the value of a claimed key"""
+        raise NotImplementedError
+
+    async def release(self, key: str):
+        """Free a claimed key, so a retry is processed again"""
+        raise NotImplementedError
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """In-process LRU store with TTL; keys are only seen by the current worker"""
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_MAX_ENTRIES, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (value, self._clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def claim(self, key: str, value: str, ttl: float) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self._clock():
+                return entry[0]
+            self._set(key, value, ttl)
+            return None
+
+    async def save(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    async def release(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+# SET NX and GET in one round trip, atomically
+_CLAIM_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then return false end
+return redis.call('GET', KEYS[1])
+"""
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """Store shared by all workers and replicas; Redis expires the keys"""
+
+    def __init__(self, url: str = REDIS_URL):
+        if aioredis is None:
+            raise RuntimeError("IDEMPOTENCY_BACKEND=redis requires the 'redis' package")
+        self._client = aioredis.from_url(url, decode_responses=True)
+        self._claim = self._client.register_script(_CLAIM_SCRIPT)
+
+    async def claim(self, key: str, value: str, ttl: float) -> Optional[str]:
+        return await self._claim(keys=[f"idempotency:{key}"], args=[value, int(ttl * 1000)])
+
+    async def save(self, key: str, value: str, ttl: float):
+        await self._client.set(f"idempotency:{key}", value, px=int(ttl * 1000))
+
+    async def release(self, key: str):
+        await self._client.delete(f"idempotency:{key}")
+
+def create_idempotency_store(backend: str = IDEMPOTENCY_BACKEND, workers: int = WEB_CONCURRENCY) -> IdempotencyStore:
+    """Create the store selected by IDEMPOTENCY_BACKEND"""
+    logger.info("Using %s idempotency store", backend)
+    if backend == "redis":
+        return RedisIdempotencyStore()
+    if workers > 1:
+        raise RuntimeError(
+            f"IDEMPOTENCY_BACKEND=memory would run retries again on another of the {workers} workers; "
+            "use IDEMPOTENCY_BACKEND=redis or WEB_CONCURRENCY=1"
+        )
+    return MemoryIdempotencyStore()
+
+store = create_idempotency_store()
@@ -0,0 +1,187 @@
+"""Deliver queued notifications through the SMS gateways.
+
+Runs inside each API process when NOTIFICATION_WORKER=true (the default), or on its own:
+
+    python -m app.services.notification_worker
+"""
+from typing import Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+from prometheus_client import Counter
+from starlette.concurrency import run_in_threadpool
+
+from app.db.base import SessionLocal
+from app.services import notifications
+from app.services.sms_gateway import SendResult, SmsGateway, SmsMessage, active_gateways
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Start the worker with the API process
+NOTIFICATION_WORKER = os.getenv("NOTIFICATION_WORKER", "True").lower() == "true"
+# Concurrent send loops per provider
+NOTIFICATION_CONCURRENCY = int(os.getenv("NOTIFICATION_CONCURRENCY", "2"))
+# Seconds between polls when the queue is empty; enqueues in this process wake the worker at once
+NOTIFICATION_POLL_SECONDS = float(os.getenv("NOTIFICATION_POLL_SECONDS", "1"))
+# Seconds between purges of notifications past NOTIFICATION_RETENTION_DAYS
+NOTIFICATION_PURGE_SECONDS = float(os.getenv("NOTIFICATION_PURGE_SECONDS", "3600"))
+
+NOTIFICATIONS_DELIVERED = Counter(
+    "notifications_delivered_total",
+    "Send attempts by provider and outcome (sent, retry, failed)",
+    ["provider", "result"],
+)
+
+class TokenBucket:
+    """Allow `rate` sends per second on average, with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, tokens: float) -> float:
+        """Take `tokens` and return how long to wait before using them"""
+        self._refill()
+        self._tokens -= tokens
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self, tokens: float):
+        wait = self.delay(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+class NotificationWorker:
+    """Claim due notifications in batches per provider, send them, and record the outcome"""
+
+    def __init__(
+        self,
+        gateways: Optional[Dict[str, SmsGateway]] = None,
+        session_factory=SessionLocal,
+        concurrency: int = NOTIFICATION_CONCURRENCY,
+        poll_interval: float = NOTIFICATION_POLL_SECONDS,
+        purge_interval: float = NOTIFICATION_PURGE_SECONDS,
+    ):
+        self.gateways = gateways if gateways is not None else active_gateways()
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._buckets = {name: TokenBucket(gateway.rate_limit) for name, gateway in self.gateways.items()}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def _with_session(self, fn, *args):
+        with self.session_factory() as db:
+            return fn(db, *args)
+
+    async def deliver_batch(self, provider: str) -> int:
+        """Send one batch for a provider; return the number of notifications handled"""
+        gateway = self.gateways[provider]
+        messages: List[SmsMessage] = await run_in_threadpool(
+            self._with_session, notifications.claim_batch, provider, gateway.max_batch_size
+        )
+        if not messages:
+            return 0
+        await self._buckets[provider].acquire(len(messages))
+        try:
+            results = await gateway.send_batch(messages)
+        except Exception as e:
+            logger.warning("%s gateway failed to send %s message(s): %s", provider, len(messages), e)
+            results = [SendResult(message.notificationId, ok=False, error=str(e)) for message in messages]
+        outcome = await run_in_threadpool(self._with_session, notifications.record_results, messages, results)
+        for result, count in outcome.items():
+            if count:
+                NOTIFICATIONS_DELIVERED.labels(provider, result).inc(count)
+        logger.debug("Delivered batch of %s via %s: %s", len(messages), provider, outcome)
+        return len(messages)
+
+    async def run_once(self) -> int:
+        """Deliver one batch per provider; for tests and tooling"""
+        handled = 0
+        for provider in self.gateways:
+            handled += await self.deliver_batch(provider)
+        return handled
+
+    async def _loop(self, provider: str):
+        while not self._stopping:
+            try:
+                handled = await self.deliver_batch(provider)
+            except Exception as e:
+                logger.error("Notification worker error for %s: %s", provider, e)
+                handled = 0
+            if handled:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _purge_loop(self):
+        while not self._stopping:
+            try:
+                await run_in_threadpool(self._with_session, notifications.purge_finished)
+            except Exception as e:
+                logger.error("Failed to purge old notifications: %s", e)
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.purge_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def wake(self):
+        """Poll now instead of at the next interval (after an enqueue in this process)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        """Start the send loops on the running event loop"""
+        self._stopping = False
+        # Created here so the event belongs to the serving loop
+        self._wakeup = asyncio.Event()
+        self._stopped = asyncio.Event()
+        for provider in self.gateways:
+            for _ in range(self.concurrency):
+                self._tasks.append(asyncio.create_task(self._loop(provider)))
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+        logger.info("Notification worker started for %s (%s loop(s) each)", ', '.join(self.gateways), self.concurrency)
+
+    async def stop(self):
+        """Let in-flight batches finish, then stop"""
+        self._stopping = True
+        self.wake()
+        if self._stopped is not None:
+            self._stopped.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        self._stopped = None
+        logger.info("Notification worker stopped")
+
+worker = NotificationWorker()
+
+async def _run_forever():
+    worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(_run_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,213 @@
+from sqlalchemy import Float, and_, bindparam, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+from datetime import timedelta
+from typing import Dict, List, Optional
+import hashlib
+import logging
+import os
+import random
+import time
+
+from app.db.base import dialect_insert, seconds_from_now
+from app.models.notification import (
+    Notification, NOTIFICATION_FAILED, NOTIFICATION_QUEUED, NOTIFICATION_SENDING, NOTIFICATION_SENT,
+)
+from app.services import sms_gateway
+from app.services.sms_gateway import SendResult, SmsMessage
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Sends per notification before it is marked failed
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "5"))
+# Retry delay doubles from the base up to the cap, with jitter
+NOTIFICATION_BACKOFF_SECONDS = float(os.getenv("NOTIFICATION_BACKOFF_SECONDS", "2"))
+NOTIFICATION_BACKOFF_MAX_SECONDS = float(os.getenv("NOTIFICATION_BACKOFF_MAX_SECONDS", "300"))
+# How long a claimed batch stays with one worker before others may take it over
+NOTIFICATION_LEASE_SECONDS = float(os.getenv("NOTIFICATION_LEASE_SECONDS", "60"))
+# Identical messages to the same number within this window are queued once
+NOTIFICATION_DEDUPE_WINDOW_SECONDS = int(os.getenv("NOTIFICATION_DEDUPE_WINDOW_SECONDS", "600"))
+# Sent and failed notifications are deleted after this many days
+NOTIFICATION_RETENTION_DAYS = float(os.getenv("NOTIFICATION_RETENTION_DAYS", "30"))
+
+def booking_message(sms_request) -> str:
+    return (
+        f"Dear {sms_request.userName}, your appointment with {sms_request.doctorName} is confirmed for "
+        f"{sms_request.appointmentDate} at {sms_request.appointmentTime.strftime('%H:%M')}. "
+        f"Address: {sms_request.userAddress}"
+    )
+
+def cancellation_message(sms_request) -> str:
+    return (
+        f"Dear {sms_request.userName}, your appointment on {sms_request.appointmentDate} at "
+        f"{sms_request.appointmentTime.strftime('%H:%M')} has been cancelled."
+    )
+
+def reschedule_message(sms_request) -> str:
+    return (
+        f"Dear {sms_request.userName}, your appointment has been rescheduled to "
+        f"{sms_request.appointmentDate} at {sms_request.appointmentTime.strftime('%H:%M')}."
+    )
+
+def otp_message(otp: str) -> str:
+    return f"{otp} is your Apollo Hospitals verification code. Do not share it with anyone."
+
+def dedupe_key(kind: str, recipient: str, message: str, now: Optional[float] = None) -> str:
+    """Identical messages to the same number in the same dedupe window share a key; a later
+    repeat of the message is a new notification"""
+    window = int((time.time() if now is None else now) // NOTIFICATION_DEDUPE_WINDOW_SECONDS)
+    return hashlib.sha256(f"{kind}|{recipient}|{message}|{window}".encode()).hexdigest()
+
+def enqueue(
+    db: Session,
+    kind: str,
+    recipient: str,
+    message: str,
+    provider: Optional[str] = None,
+) -> Notification:
+    """Queue an SMS and return it; a duplicate within the dedupe window returns the earlier notification"""
+    key = dedupe_key(kind, recipient, message)
+    insert = dialect_insert(db)
+    try:
+        stmt = insert(Notification).values(
+            provider=provider or sms_gateway.SMS_PROVIDER,
+            kind=kind,
+            recipient=recipient,
+            message=message,
+            dedupeKey=key,
+            status=NOTIFICATION_QUEUED,
+            attempts=0,
+            nextAttemptAt=func.now(),
+        ).on_conflict_do_nothing(index_elements=[Notification.dedupeKey]).returning(Notification)
+        notification = db.execute(stmt).scalar_one_or_none()
+        if notification is None:
+            notification = db.execute(select(Notification).where(Notification.dedupeKey == key)).scalar_one()
+            logger.debug("Notification %s already queued for %s", notification.notificationId, recipient)
+        # Keep the loaded values readable after commit
+        db.expunge(notification)
+        db.commit()
+        return notification
+    except Exception:
+        db.rollback()
+        raise
+
+def get_notification(db: Session, notificationId: int) -> Optional[Notification]:
+    """Return a notification by ID, or None"""
+    return db.get(Notification, notificationId)
+
+def purge_finished(db: Session, retention_days: float = NOTIFICATION_RETENTION_DAYS) -> int:
+    """Delete sent and failed notifications older than the retention period; return how many"""
+    stmt = delete(Notification).where(
+        Notification.status.in_([NOTIFICATION_SENT, NOTIFICATION_FAILED]),
+        Notification.updated_at < seconds_from_now(-retention_days * 86400),
+    ).execution_options(synchronize_session=False)
+    try:
+        purged = db.execute(stmt).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if purged:
+        logger.info("Purged %s finished notification(s)", purged)
+    return purged
+
+def claim_batch(db: Session, provider: str, limit: int, lease_seconds: float = NOTIFICATION_LEASE_SECONDS) -> List[SmsMessage]:
+    """Mark up to `limit` due notifications as sending and return them; concurrent workers get disjoint batches"""
+    due = select(Notification.notificationId).where(
+        Notification.provider == provider,
+        or_(
+            and_(Notification.status == NOTIFICATION_QUEUED, Notification.nextAttemptAt <= func.now()),
+            # Claimed by a worker that never reported back
+            and_(Notification.status == NOTIFICATION_SENDING, Notification.lockedUntil < func.now()),
+        ),
+    ).order_by(Notification.nextAttemptAt).limit(limit).with_for_update(skip_locked=True)
+    stmt = update(Notification).where(
+        Notification.notificationId.in_(due.scalar_subquery())
+    ).values(
+        status=NOTIFICATION_SENDING,
+        attempts=Notification.attempts + 1,
+        lockedUntil=seconds_from_now(lease_seconds),
+        updated_at=func.now(),
+    ).returning(
+        Notification.notificationId, Notification.recipient, Notification.message, Notification.attempts
+    ).execution_options(synchronize_session=False)
+    try:
+        rows = db.execute(stmt).all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [SmsMessage(row.notificationId, row.recipient, row.message, row.attempts) for row in rows]
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Exponential backoff with jitter for the retry after `attempts` sends"""
+    delay = min(NOTIFICATION_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), NOTIFICATION_BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+_table = Notification.__table__
+
+# Both statements match the attempt they report on, so a worker whose lease expired
+# cannot overwrite the outcome of the worker that took the message over
+_MARK_SENT = update(_table).where(
+    _table.c.notificationId == bindparam("b_id"), _table.c.attempts == bindparam("b_attempts")
+).values(
+    status=NOTIFICATION_SENT,
+    providerMessageId=bindparam("b_provider_id"),
+    lastError=None,
+    lockedUntil=None,
+    sentAt=func.now(),
+    updated_at=func.now(),
+)
+
+# Retry if attempts remain; the attempt counter was incremented when the batch was claimed
+_MARK_FAILED = update(_table).where(
+    _table.c.notificationId == bindparam("b_id"), _table.c.attempts == bindparam("b_attempts")
+).values(
+    status=bindparam("b_status"),
+    lastError=bindparam("b_error"),
+    lockedUntil=None,
+    nextAttemptAt=seconds_from_now(bindparam("b_delay_seconds", type_=Float)),
+    updated_at=func.now(),
+)
+
+def record_results(
+    db: Session,
+    messages: List[SmsMessage],
+    results: List[SendResult],
+    max_attempts: int = NOTIFICATION_MAX_ATTEMPTS,
+) -> Dict[str, int]:
+    """Store the outcome of a send; failed messages are requeued with backoff until they run out of attempts"""
+    attempts = {message.notificationId: message.attempts for message in messages}
+    sent, failed = [], []
+    outcome = {"sent": 0, "retry": 0, "failed": 0}
+    for result in results:
+        if result.ok:
+            sent.append({
+                "b_id": result.notificationId,
+                "b_attempts": attempts.get(result.notificationId),
+                "b_provider_id": result.providerMessageId,
+            })
+            outcome["sent"] += 1
+            continue
+        count = attempts.get(result.notificationId)
+        final = not result.retryable or count >= max_attempts
+        failed.append({
+            "b_id": result.notificationId,
+            "b_attempts": count,
+            "b_status": NOTIFICATION_FAILED if final else NOTIFICATION_QUEUED,
+            "b_error": result.error,
+            "b_delay_seconds": 0.0 if final else backoff_delay(count).total_seconds(),
+        })
+        outcome["failed" if final else "retry"] += 1
+        if final:
+            logger.warning("Notification %s failed after %s attempt(s): %s", result.notificationId, count, result.error)
+    try:
+        if sent:
+            db.execute(_MARK_SENT, sent)
+        if failed:
+            db.execute(_MARK_FAILED, failed)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return outcome
@@ -0,0 +1,207 @@
+from typing import Callable, Dict, Optional, Tuple
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Only needed for OTP_BACKEND=redis
+    aioredis = None
+
+from app.core import security
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Worker processes of this server; gunicorn.conf.py exports the number it starts
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+# memory (per process) or redis (shared by all workers); redis is the default with several workers,
+# since verify-otp may reach another worker than send-otp
+OTP_BACKEND = os.getenv("OTP_BACKEND", "redis" if WEB_CONCURRENCY > 1 else "memory").lower()
+OTP_TTL_SECONDS = float(os.getenv("OTP_TTL_SECONDS", "300"))
+# Wrong codes allowed per OTP before it is discarded
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+# OTPs sent per phone number per window
+OTP_SEND_LIMIT = int(os.getenv("OTP_SEND_LIMIT", "3"))
+OTP_SEND_WINDOW_SECONDS = float(os.getenv("OTP_SEND_WINDOW_SECONDS", "600"))
+# How often the memory store drops expired entries
+OTP_SWEEP_SECONDS = float(os.getenv("OTP_SWEEP_SECONDS", "60"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+class OtpRateLimited(Exception):
+    """Too many OTPs were requested for a phone number"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class OtpStore:
+    """Pending OTP digests and send counters, keyed by phone number, with per-entry TTL"""
+
+    async def save(self, phone: str, digest: str, ttl: float):
+        """Store the digest of a new OTP, replacing any earlier one"""
+        raise NotImplementedError
+
+    async def attempt(self, phone: str, max_attempts: int) -> Optional[str]:
+        """Count a verification attempt and return the stored digest; None if there is none or attempts ran out"""
+        raise NotImplementedError
+
+    async def consume(self, phone: str, digest: str) -> bool:
+        """Delete the OTP if it still has this digest; only one caller gets True"""
+        raise NotImplementedError
+
+    async def hit(self, key: str, window: float) -> Tuple[int, float]:
+        """Count an event in a fixed window; return the count so far and seconds until the window resets"""
+        raise NotImplementedError
+
+class MemoryOtpStore(OtpStore):
+    """In-process store; expired entries are swept every OTP_SWEEP_SECONDS"""
+
+    def __init__(self, sweep_interval: float = OTP_SWEEP_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        # phone -> [digest, attempts, expires_at]
+        self._codes: Dict[str, list] = {}
+        # key -> [count, resets_at]
+        self._counters: Dict[str, list] = {}
+        self._next_sweep = clock() + sweep_interval
+        self._lock = threading.Lock()
+
+    def _sweep(self, now: float):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        for entries in (self._codes, self._counters):
+            for key in [key for key, entry in entries.items() if entry[-1] <= now]:
+                del entries[key]
+
+    def __len__(self):
+        return len(self._codes) + len(self._counters)
+
+    async def save(self, phone: str, digest: str, ttl: float):
+        with self._lock:
+            now = self._clock()
+            self._sweep(now)
+            self._codes[phone] = [digest, 0, now + ttl]
+
+    async def attempt(self, phone: str, max_attempts: int) -> Optional[str]:
+        with self._lock:
+            now = self._clock()
+            self._sweep(now)
+            entry = self._codes.get(phone)
+            if entry is None or entry[2] <= now:
+                self._codes.pop(phone, None)
+                return None
+            entry[1] += 1
+            if entry[1] > max_attempts:
+                del self._codes[phone]
+                return None
+            return entry[0]
+
+    async def consume(self, phone: str, digest: str) -> bool:
+        with self._lock:
+            entry = self._codes.get(phone)
+            if entry is None or entry[0] != digest:
+                return False
+            del self._codes[phone]
+            return True
+
+    async def hit(self, key: str, window: float) -> Tuple[int, float]:
+        with self._lock:
+            now = self._clock()
+            self._sweep(now)
+            entry = self._counters.get(key)
+            if entry is None or entry[1] <= now:
+                entry = self._counters[key] = [0, now + window]
+            entry[0] += 1
+            return entry[0], entry[1] - now
+
+# Each script runs atomically, so concurrent requests on any worker see consistent counts
+_ATTEMPT_SCRIPT = """
+local digest = redis.call('HGET', KEYS[1], 'digest')
+if not digest then return false end
+if redis.call('HINCRBY', KEYS[1], 'attempts', 1) > tonumber(ARGV[1]) then
+    redis.call('DEL', KEYS[1])
+    return false
+end
+return digest
+"""
+_CONSUME_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'digest') == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+_HIT_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then redis.call('PEXPIRE', KEYS[1], ARGV[1]) end
+return {count, redis.call('PTTL', KEYS[1])}
+"""
+
+class RedisOtpStore(OtpStore):
+    """Store shared by all workers and replicas; Redis expires the keys"""
+
+    def __init__(self, url: str = REDIS_URL):
+        if aioredis is None:
+            raise RuntimeError("OTP_BACKEND=redis requires the 'redis' package")
+        self._client = aioredis.from_url(url, decode_responses=True)
+        self._attempt = self._client.register_script(_ATTEMPT_SCRIPT)
+        self._consume = self._client.register_script(_CONSUME_SCRIPT)
+        self._hit = self._client.register_script(_HIT_SCRIPT)
+
+    async def save(self, phone: str, digest: str, ttl: float):
+        key = f"otp:{phone}"
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={"digest": digest, "attempts": 0})
+            pipe.pexpire(key, int(ttl * 1000))
+            await pipe.execute()
+
+    async def attempt(self, phone: str, max_attempts: int) -> Optional[str]:
+        return await self._attempt(keys=[f"otp:{phone}"], args=[max_attempts])
+
+    async def consume(self, phone: str, digest: str) -> bool:
+        return bool(await self._consume(keys=[f"otp:{phone}"], args=[digest]))
+
+    async def hit(self, key: str, window: float) -> Tuple[int, float]:
+        count, ttl_ms = await self._hit(keys=[f"otp-rate:{key}"], args=[int(window * 1000)])
+        return int(count), max(int(ttl_ms), 0) / 1000
+
+def create_otp_store(backend: str = OTP_BACKEND, workers: int = WEB_CONCURRENCY) -> OtpStore:
+    """Create the OTP store selected by OTP_BACKEND"""
+    logger.info("Using %s OTP store", backend)
+    if backend == "redis":
+        return RedisOtpStore()
+    if workers > 1:
+        raise RuntimeError(
+            f"OTP_BACKEND=memory would reject OTPs verified by another of the {workers} workers; "
+            "use OTP_BACKEND=redis or WEB_CONCURRENCY=1"
+        )
+    return MemoryOtpStore()
+
+store = create_otp_store()
+
+def otp_digest(phone: str, otp: str) -> str:
+    """Keyed hash of an OTP, so the store never holds usable codes"""
+    return hmac.new(security.SESSION_TOKEN_SECRET.encode(), f"{phone}|{otp}".encode(), hashlib.sha256).hexdigest()
+
+async def issue_otp(phone: str) -> str:
+    """Generate and store a 6-digit OTP for `phone`; raise OtpRateLimited past OTP_SEND_LIMIT per window"""
+    count, retry_after = await store.hit(f"send:{phone}", OTP_SEND_WINDOW_SECONDS)
+    if count > OTP_SEND_LIMIT:
+        raise OtpRateLimited(retry_after)
+    otp = f"{secrets.randbelow(10 ** 6):06d}"
+    await store.save(phone, otp_digest(phone, otp), OTP_TTL_SECONDS)
+    return otp
+
+async def verify_otp(phone: str, otp: str) -> bool:
+    """Check an OTP in constant time; a correct code is used up, as is one that had too many wrong guesses"""
+    stored = await store.attempt(phone, OTP_MAX_ATTEMPTS)
+    if stored is None:
+        return False
+    digest = otp_digest(phone, otp)
+    if not hmac.compare_digest(stored, digest):
+        return False
+    return await store.consume(phone, digest)
@@ -0,0 +1,170 @@
+"""Slot reservations: one active appointment per doctor/date/time, with optional holds.
+
+The partial unique index uq_appointments_active_slot is the guarantee. On PostgreSQL a
+booking or hold first takes a transaction-level advisory lock on its slot with
+pg_try_advisory_xact_lock, so concurrent requests for a hot slot fail immediately
+instead of queueing behind the winner's uncommitted row. A hold keeps a slot for
+SLOT_HOLD_SECONDS while the patient finishes booking; bookings that present the
+holdId confirm it, all others are turned away until it expires.
+"""
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+import hashlib
+import logging
+import os
+import uuid
+
+from app.models.appointment import Appointment as AppointmentModel
+from app.models.slot_hold import SlotHold
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# How long a hold keeps a slot for its patient
+SLOT_HOLD_SECONDS = int(os.getenv("SLOT_HOLD_SECONDS", "300"))
+
+# Expired holds deleted per new hold, so the table does not grow without a cron job
+PURGE_BATCH_SIZE = 100
+
+ACTIVE_SLOT_INDEX = "uq_appointments_active_slot"
+
+class SlotUnavailableError(Exception):
+    """The slot is booked, held, or being booked by a concurrent request"""
+
+def slot_lock_key(doctorName: str, slot_date: date, slot_time: time) -> int:
+    """64-bit advisory lock key of a slot"""
+    digest = hashlib.blake2b(f"{doctorName}|{slot_date}|{slot_time}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def lock_slot(db: Session, doctorName: str, slot_date: date, slot_time: time):
+    """Take the slot's advisory lock until the transaction ends; raise if another transaction has it"""
+    if db.get_bind().dialect.name != "postgresql":
+        # Elsewhere the unique index alone decides, after the competing transaction commits
+        return
+    key = slot_lock_key(doctorName, slot_date, slot_time)
+    if not db.execute(select(func.pg_try_advisory_xact_lock(key))).scalar():
+        raise SlotUnavailableError("Slot is being booked by another request")
+
+def is_slot_conflict(error: IntegrityError) -> bool:
+    """Whether an IntegrityError comes from uq_appointments_active_slot"""
+    diag = getattr(error.orig, "diag", None)
+    if diag is not None and getattr(diag, "constraint_name", None):
+        return diag.constraint_name == ACTIVE_SLOT_INDEX
+    # Drivers without diagnostics (SQLite) name the columns instead
+    message = str(error.orig)
+    return ACTIVE_SLOT_INDEX in message or "appointments.doctorName, appointments.date, appointments.time" in message
+
+def utcnow() -> datetime:
+    """Clock for hold expiry; expiresAt is stored as naive UTC"""
+    return datetime.utcnow()
+
+def _slot_filter(model, doctorName: str, slot_date: date, slot_time: time):
+    return (model.doctorName == doctorName, model.date == slot_date, model.time == slot_time)
+
+def reserve_slot(
+    db: Session,
+    doctorName: str,
+    slot_date: date,
+    slot_time: time,
+    holdId: Optional[str] = None,
+    patientId: Optional[str] = None,
+):
+    """Lock a slot for booking in the current transaction and confirm (delete) its hold
+
+    Without a holdId, a live hold by anyone makes the slot unavailable. The caller
+    then writes the appointment; the unique index rejects a slot that is already booked.
+    """
+    lock_slot(db, doctorName, slot_date, slot_time)
+    now = utcnow()
+    if holdId is not None:
+        claimed = db.execute(
+            delete(SlotHold).where(
+                SlotHold.holdId == holdId,
+                *_slot_filter(SlotHold, doctorName, slot_date, slot_time),
+                SlotHold.expiresAt > now,
+                (SlotHold.patientId == None) | (SlotHold.patientId == patientId),
+            ).returning(SlotHold.holdId)
+        ).first()
+        if claimed is None:
+            raise SlotUnavailableError("Hold has expired or does not match this booking")
+        logger.debug("Confirmed hold %s for %s on %s at %s", holdId, doctorName, slot_date, slot_time)
+        return
+    held = db.execute(
+        select(SlotHold.holdId).where(
+            *_slot_filter(SlotHold, doctorName, slot_date, slot_time),
+            SlotHold.expiresAt > now,
+        )
+    ).first()
+    if held is not None:
+        raise SlotUnavailableError("Slot is held for another booking")
+
+def purge_expired_holds(db: Session, limit: int = PURGE_BATCH_SIZE) -> int:
+    """Delete up to `limit` expired holds, skipping rows another transaction is deleting"""
+    expired = select(SlotHold.holdId).where(SlotHold.expiresAt <= utcnow()).limit(limit).with_for_update(skip_locked=True)
+    return db.execute(delete(SlotHold).where(SlotHold.holdId.in_(expired))).rowcount
+
+def hold_slot(
+    db: Session,
+    doctorName: str,
+    department: str,
+    slot_date: date,
+    slot_time: time,
+    patientId: Optional[str] = None,
+    ttl_seconds: Optional[int] = None,
+) -> SlotHold:
+    """Hold a free slot for SLOT_HOLD_SECONDS; raise SlotUnavailableError if it is booked or held"""
+    ttl_seconds = SLOT_HOLD_SECONDS if ttl_seconds is None else ttl_seconds
+    try:
+        lock_slot(db, doctorName, slot_date, slot_time)
+        now = utcnow()
+        booked = db.execute(
+            select(AppointmentModel.appointmentId).where(
+                *_slot_filter(AppointmentModel, doctorName, slot_date, slot_time),
+                AppointmentModel.isCancelled == False,
+            )
+        ).first()
+        if booked is not None:
+            raise SlotUnavailableError("Slot is already booked")
+        # An expired hold on this slot gives way; a live one makes the insert fail below
+        db.execute(delete(SlotHold).where(
+            *_slot_filter(SlotHold, doctorName, slot_date, slot_time),
+            SlotHold.expiresAt <= now,
+        ))
+        hold = SlotHold(
+            holdId=str(uuid.uuid4()),
+            doctorName=doctorName,
+            department=department,
+            date=slot_date,
+            time=slot_time,
+            patientId=patientId,
+            expiresAt=now + timedelta(seconds=ttl_seconds),
+        )
+        db.add(hold)
+        db.flush()
+        # Keep the returned values readable after commit without a refresh
+        db.expunge(hold)
+        purged = purge_expired_holds(db)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise SlotUnavailableError("Slot is held for another booking") from e
+    except Exception:
+        db.rollback()
+        raise
+    if purged:
+        logger.debug("Purged %s expired slot hold(s)", purged)
+    logger.debug("Held %s on %s at %s until %s (%s)", doctorName, slot_date, slot_time, hold.expiresAt, hold.holdId)
+    return hold
+
+def release_hold(db: Session, holdId: str) -> bool:
+    """Delete a hold; return False if it does not exist"""
+    try:
+        deleted = db.execute(delete(SlotHold).where(SlotHold.holdId == holdId)).rowcount
+        db.commit()
+        return bool(deleted)
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,320 @@
+"""Free appointment slots computed from doctors' weekly schedules.
+
+Each doctor's calendar over the requested days is a Python int used as a bitmap: bit
+`day * CELLS_PER_DAY + minute // SLOT_GRID_MINUTES` stands for one grid cell. Slot
+starts, booked cells and leave are ORed into bitmaps, and the free slots of every
+doctor come out of a few bitwise operations over the whole range, after one query
+for the booked and held slots. Bit order is time order, so merging doctors and taking
+the first N free slots needs no sorting of the full range.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import heapq
+import itertools
+import logging
+
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+
+from app.models.appointment import Appointment as AppointmentModel
+from app.models.schedule import Department, Doctor, DoctorLeave, ScheduleTemplate
+from app.models.slot_hold import SlotHold
+from app.services import reservations
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Slot starts, lengths and breaks must be multiples of this
+SLOT_GRID_MINUTES = 5
+CELLS_PER_DAY = 24 * 60 // SLOT_GRID_MINUTES
+
+@dataclass
+class FreeSlot:
+    date: date
+    time: time
+    doctorName: str
+    department: str
+
+@dataclass
+class DoctorSchedule:
+    doctorId: int
+    doctorName: str
+    department: str
+    templates: List[Any] = field(default_factory=list)
+    leaves: List[Tuple[date, date]] = field(default_factory=list)
+
+def _minutes(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+def day_pattern(template) -> Tuple[int, int]:
+    """Return (slot length in cells, bitmap of slot starts within one day) for a template"""
+    length = max(template.slotMinutes // SLOT_GRID_MINUTES, 1)
+    start, end = _minutes(template.startTime), _minutes(template.endTime)
+    break_start = _minutes(template.breakStart) if template.breakStart and template.breakEnd else None
+    break_end = _minutes(template.breakEnd) if break_start is not None else None
+    pattern = 0
+    for slot_start in range(start, end - template.slotMinutes + 1, template.slotMinutes):
+        if break_start is not None and slot_start < break_end and slot_start + template.slotMinutes > break_start:
+            continue
+        pattern |= 1 << (slot_start // SLOT_GRID_MINUTES)
+    return length, pattern
+
+def _spread(occupied: int, length: int) -> int:
+    """Mark every slot start whose `length` cells overlap an occupied cell"""
+    spread, covered = occupied, 1
+    while covered < length:
+        step = min(covered, length - covered)
+        spread |= spread >> step
+        covered += step
+    return spread
+
+def _days_mask(first: int, last: int) -> int:
+    """Bitmap of all cells of days first..last (offsets, inclusive)"""
+    return ((1 << ((last - first + 1) * CELLS_PER_DAY)) - 1) << (first * CELLS_PER_DAY)
+
+def free_slot_bitmap(
+    schedule: DoctorSchedule,
+    start: date,
+    days: int,
+    booked: List[Tuple[date, time]],
+    not_before: Optional[datetime] = None,
+) -> int:
+    """Bitmap of free slot starts of one doctor over `days` days from `start`"""
+    # Set bits in a byte buffer and convert once; ORing big ints per booking is quadratic
+    buffer = bytearray(days * CELLS_PER_DAY // 8 + 1)
+    first_day = start.toordinal()
+    for booked_date, booked_time in booked:
+        offset = booked_date.toordinal() - first_day
+        if 0 <= offset < days and booked_time is not None:
+            cell = offset * CELLS_PER_DAY + (booked_time.hour * 60 + booked_time.minute) // SLOT_GRID_MINUTES
+            buffer[cell >> 3] |= 1 << (cell & 7)
+    occupied = int.from_bytes(buffer, "little")
+
+    # Slot starts per slot length, over the whole range
+    starts: Dict[int, int] = {}
+    for template in schedule.templates:
+        length, pattern = day_pattern(template)
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            if day.weekday() != template.weekday:
+                continue
+            if (template.validFrom and day < template.validFrom) or (template.validTo and day > template.validTo):
+                continue
+            starts[length] = starts.get(length, 0) | (pattern << (offset * CELLS_PER_DAY))
+
+    free = 0
+    for length, mask in starts.items():
+        free |= mask & ~_spread(occupied, length)
+
+    for leave_start, leave_end in schedule.leaves:
+        first, last = max((leave_start - start).days, 0), min((leave_end - start).days, days - 1)
+        if first <= last:
+            free &= ~_days_mask(first, last)
+
+    if not_before is not None:
+        offset = (not_before.date() - start).days
+        if offset >= days:
+            return 0
+        if offset >= 0:
+            # Round up, so a slot that has already started is not offered
+            cell = offset * CELLS_PER_DAY - (-_minutes(not_before.time()) // SLOT_GRID_MINUTES)
+            free &= ~((1 << cell) - 1)
+    return free
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Yield the positions of set bits, lowest first"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+def _tagged_bits(mask: int, tag: int) -> Iterator[Tuple[int, int]]:
+    for bit in iter_bits(mask):
+        yield bit, tag
+
+def load_schedules(
+    db: Session,
+    start: date,
+    end: date,
+    doctorName: Optional[str] = None,
+    department: Optional[str] = None,
+) -> List[DoctorSchedule]:
+    """Load the active doctors matching the filters with their templates and leave overlapping start..end"""
+    stmt = select(Doctor.doctorId, Doctor.name, Department.name).join(
+        Department, Department.departmentId == Doctor.departmentId
+    ).where(Doctor.isActive == True)
+    if doctorName is not None:
+        stmt = stmt.where(Doctor.name == doctorName)
+    if department is not None:
+        stmt = stmt.where(Department.name == department)
+    schedules = {
+        doctor_id: DoctorSchedule(doctor_id, name, department_name)
+        for doctor_id, name, department_name in db.execute(stmt.order_by(Doctor.name)).all()
+    }
+    if not schedules:
+        return []
+    for template in db.execute(
+        select(ScheduleTemplate).where(ScheduleTemplate.doctorId.in_(list(schedules)))
+    ).scalars():
+        schedules[template.doctorId].templates.append(template)
+    for doctor_id, leave_start, leave_end in db.execute(
+        select(DoctorLeave.doctorId, DoctorLeave.startDate, DoctorLeave.endDate).where(
+            DoctorLeave.doctorId.in_(list(schedules)),
+            DoctorLeave.startDate <= end,
+            DoctorLeave.endDate >= start,
+        )
+    ).all():
+        schedules[doctor_id].leaves.append((leave_start, leave_end))
+    return list(schedules.values())
+
+def load_booked(db: Session, doctor_names: List[str], start: date, end: date) -> Dict[str, List[Tuple[date, time]]]:
+    """Booked or held (date, time) per doctor between start and end, in one query"""
+    booked: Dict[str, List[Tuple[date, time]]] = {name: [] for name in doctor_names}
+    rows = db.execute(union_all(
+        select(AppointmentModel.doctorName, AppointmentModel.date, AppointmentModel.time).where(
+            AppointmentModel.date >= start,
+            AppointmentModel.date <= end,
+            AppointmentModel.doctorName.in_(doctor_names),
+            AppointmentModel.isCancelled == False,
+        ),
+        select(SlotHold.doctorName, SlotHold.date, SlotHold.time).where(
+            SlotHold.date >= start,
+            SlotHold.date <= end,
+            SlotHold.doctorName.in_(doctor_names),
+            SlotHold.expiresAt > reservations.utcnow(),
+        ),
+    )).all()
+    for doctor_name, booked_date, booked_time in rows:
+        booked[doctor_name].append((booked_date, booked_time))
+    return booked
+
+def find_free_slots(
+    db: Session,
+    start: date,
+    days: int,
+    doctorName: Optional[str] = None,
+    department: Optional[str] = None,
+    limit: Optional[int] = 20,
+    not_before: Optional[datetime] = None,
+) -> Optional[List[FreeSlot]]:
+    """Return the first `limit` (None: all) free slots across matching doctors, in time order
+
+    Returns None when no scheduled doctor matches the filters, so callers can fall back
+    to the per-day counters in app.services.slot_capacity.
+    """
+    end = start + timedelta(days=days - 1)
+    schedules = load_schedules(db, start, end, doctorName, department)
+    if not schedules:
+        return None
+    booked = load_booked(db, [schedule.doctorName for schedule in schedules], start, end)
+    if not_before is None:
+        not_before = datetime.now()
+
+    streams = []
+    for index, schedule in enumerate(schedules):
+        bitmap = free_slot_bitmap(schedule, start, days, booked[schedule.doctorName], not_before)
+        streams.append(_tagged_bits(bitmap, index))
+    slots = []
+    for bit, index in itertools.islice(heapq.merge(*streams), limit):
+        offset, cell = divmod(bit, CELLS_PER_DAY)
+        minutes = cell * SLOT_GRID_MINUTES
+        slots.append(FreeSlot(
+            date=start + timedelta(days=offset),
+            time=time(minutes // 60, minutes % 60),
+            doctorName=schedules[index].doctorName,
+            department=schedules[index].department,
+        ))
+    logger.debug("Found %s free slot(s) across %s doctor(s) from %s to %s", len(slots), len(schedules), start, end)
+    return slots
+
+def _parse_time(value: Optional[str]) -> Optional[time]:
+    if value is None:
+        return None
+    parsed = time.fromisoformat(value)
+    if parsed.minute % SLOT_GRID_MINUTES or parsed.second:
+        raise ValueError(f"{value} is not on the {SLOT_GRID_MINUTES}-minute slot grid")
+    return parsed
+
+def load_schedule_config(db: Session, config: Dict[str, Any]) -> Dict[str, int]:
+    """Create or update departments and doctors from a config dict, replacing their templates and leave
+
+    See app/db/schedules.example.json for the format.
+    """
+    counts = {"departments": 0, "doctors": 0, "templates": 0, "leave": 0}
+    try:
+        for department_config in config.get("departments", []):
+            department = db.execute(
+                select(Department).where(Department.name == department_config["name"])
+            ).scalar_one_or_none()
+            if department is None:
+                department = Department(name=department_config["name"])
+                db.add(department)
+                db.flush()
+            counts["departments"] += 1
+
+            for doctor_config in department_config.get("doctors", []):
+                doctor = db.execute(select(Doctor).where(Doctor.name == doctor_config["name"])).scalar_one_or_none()
+                if doctor is None:
+                    doctor = Doctor(name=doctor_config["name"])
+                    db.add(doctor)
+                doctor.departmentId = department.departmentId
+                doctor.isActive = doctor_config.get("isActive", True)
+                db.flush()
+                counts["doctors"] += 1
+
+                db.query(ScheduleTemplate).filter(ScheduleTemplate.doctorId == doctor.doctorId).delete()
+                db.query(DoctorLeave).filter(DoctorLeave.doctorId == doctor.doctorId).delete()
+                for template_config in doctor_config.get("templates", []):
+                    slot_minutes = int(template_config.get("slotMinutes", 15))
+                    if slot_minutes <= 0 or slot_minutes % SLOT_GRID_MINUTES:
+                        raise ValueError(f"slotMinutes must be a positive multiple of {SLOT_GRID_MINUTES}")
+                    for weekday in template_config["weekdays"]:
+                        db.add(ScheduleTemplate(
+                            doctorId=doctor.doctorId,
+                            weekday=int(weekday),
+                            startTime=_parse_time(template_config["start"]),
+                            endTime=_parse_time(template_config["end"]),
+                            slotMinutes=slot_minutes,
+                            breakStart=_parse_time(template_config.get("breakStart")),
+                            breakEnd=_parse_time(template_config.get("breakEnd")),
+                            validFrom=date.fromisoformat(template_config["validFrom"]) if template_config.get("validFrom") else None,
+                            validTo=date.fromisoformat(template_config["validTo"]) if template_config.get("validTo") else None,
+                        ))
+                        counts["templates"] += 1
+                for leave_config in doctor_config.get("leave", []):
+                    db.add(DoctorLeave(
+                        doctorId=doctor.doctorId,
+                        startDate=date.fromisoformat(leave_config["from"]),
+                        endDate=date.fromisoformat(leave_config.get("to", leave_config["from"])),
+                        reason=leave_config.get("reason"),
+                    ))
+                    counts["leave"] += 1
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info("Loaded schedules: %s", counts)
+    return counts
+
+def calendar_from_free_slots(
+    start: date, end: date, slots: List[FreeSlot], booked: Dict[Tuple[date, time], int]
+) -> List[Dict[str, Any]]:
+    """Per-day free slots of scheduled doctors, with the number of doctors free at each time"""
+    free: Dict[date, Dict[time, int]] = defaultdict(lambda: defaultdict(int))
+    for slot in slots:
+        free[slot.date][slot.time] += 1
+    booked_per_day: Dict[date, int] = defaultdict(int)
+    for (booked_date, _), count in booked.items():
+        booked_per_day[booked_date] += count
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        days.append({
+            "date": day,
+            "booked": booked_per_day[day],
+            "free": sum(free[day].values()),
+            "slots": [{"time": slot_time, "free": count} for slot_time, count in sorted(free[day].items())],
+        })
+    return days
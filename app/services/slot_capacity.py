@@ -0,0 +1,121 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import date, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from app.db.base import dialect_insert
+from app.models.slot_capacity import SlotCapacity
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Assuming a maximum of 10 appointments per day for simplicity
+MAX_APPOINTMENTS_PER_DAY = 10
+
+# How many days ahead the "next available slot" search looks, in a single query
+AVAILABILITY_LOOKAHEAD_DAYS = 30
+
+# (date, doctorName, department) key of a slot_capacity row
+SlotKey = Tuple[date, str, str]
+
+def slot_key(appointment) -> Optional[SlotKey]:
+    """Return the slot key an appointment counts against, or None if it does not count"""
+    if appointment is None or appointment.isCancelled:
+        return None
+    return (appointment.date, appointment.doctorName, appointment.department)
+
+def adjust_slot_counts(db: Session, deltas: Dict[SlotKey, int]):
+    """Apply booked count deltas in the current transaction, creating counter rows as needed"""
+    deltas = {key: delta for key, delta in deltas.items() if key is not None and delta}
+    if not deltas:
+        return
+    insert = dialect_insert(db)
+    rows = [
+        {"date": key[0], "doctorName": key[1], "department": key[2], "bookedCount": delta}
+        for key, delta in sorted(deltas.items())
+    ]
+    logger.debug("Adjusting slot capacity for %s slot(s)", len(rows))
+    stmt = insert(SlotCapacity).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SlotCapacity.date, SlotCapacity.doctorName, SlotCapacity.department],
+        set_={
+            "bookedCount": SlotCapacity.bookedCount + stmt.excluded.bookedCount,
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+
+def track_change(db: Session, before: Optional[SlotKey], after: Optional[SlotKey]):
+    """Move one booking from the `before` slot to the `after` slot (either may be None)"""
+    if before == after:
+        return
+    deltas: Dict[SlotKey, int] = {}
+    if before is not None:
+        deltas[before] = deltas.get(before, 0) - 1
+    if after is not None:
+        deltas[after] = deltas.get(after, 0) + 1
+    adjust_slot_counts(db, deltas)
+
+def _filtered(query, doctorName: Optional[str], department: Optional[str]):
+    if doctorName is not None:
+        query = query.filter(SlotCapacity.doctorName == doctorName)
+    if department is not None:
+        query = query.filter(SlotCapacity.department == department)
+    return query
+
+def get_booked_count(
+    db: Session,
+    appointmentDate: date,
+    doctorName: Optional[str] = None,
+    department: Optional[str] = None,
+) -> int:
+    """Return the number of active appointments on a date, optionally for one doctor/department"""
+    query = db.query(func.coalesce(func.sum(SlotCapacity.bookedCount), 0)).filter(
+        SlotCapacity.date == appointmentDate
+    )
+    return int(_filtered(query, doctorName, department).scalar())
+
+def find_next_available_date(
+    db: Session,
+    after: date,
+    doctorName: Optional[str] = None,
+    department: Optional[str] = None,
+    days: int = AVAILABILITY_LOOKAHEAD_DAYS,
+) -> Optional[Tuple[date, int]]:
+    """Return the first date after `after` with free capacity and its booked count, using one query"""
+    end = after + timedelta(days=days)
+    query = db.query(SlotCapacity.date, func.sum(SlotCapacity.bookedCount)).filter(
+        SlotCapacity.date > after,
+        SlotCapacity.date <= end,
+    )
+    booked = dict(_filtered(query, doctorName, department).group_by(SlotCapacity.date).all())
+    logger.debug("Loaded booked counts for %s day(s) between %s and %s", len(booked), after, end)
+    for offset in range(1, days + 1):
+        candidate = after + timedelta(days=offset)
+        count = int(booked.get(candidate, 0))
+        if count < MAX_APPOINTMENTS_PER_DAY:
+            return candidate, count
+    return None
+
+def daily_grid() -> List[time]:
+    """Appointment times of a day without a schedule: hourly from 9:00, one per daily slot"""
+    return [time(9 + hour, 0) for hour in range(MAX_APPOINTMENTS_PER_DAY)]
+
+def calendar_from_bookings(start: date, end: date, booked: Dict[Tuple[date, time], int]) -> List[Dict[str, Any]]:
+    """Per-day capacity on the fixed grid, from active appointments counted per (date, time)"""
+    grid = daily_grid()
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        booked_count = sum(count for (booked_date, _), count in booked.items() if booked_date == day)
+        free = max(MAX_APPOINTMENTS_PER_DAY - booked_count, 0)
+        free_times = {slot_time for slot_time in grid if (day, slot_time) not in booked}
+        free_times = set(sorted(free_times)[:free])
+        days.append({
+            "date": day,
+            "booked": booked_count,
+            "free": free,
+            "slots": [{"time": slot_time, "free": int(slot_time in free_times)} for slot_time in grid],
+        })
+    return days
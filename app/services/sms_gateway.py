@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import asyncio
+import itertools
+import logging
+import os
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Provider new notifications are queued for
+SMS_PROVIDER = os.getenv("SMS_PROVIDER", "log").lower()
+
+@dataclass
+class SmsMessage:
+    notificationId: int
+    recipient: str
+    message: str
+    # Sends so far, including this one
+    attempts: int = 1
+
+@dataclass
+class SendResult:
+    notificationId: int
+    ok: bool
+    providerMessageId: Optional[str] = None
+    error: Optional[str] = None
+    # False for errors that will not go away on retry, such as an invalid number
+    retryable: bool = True
+
+class SmsGateway:
+    """An SMS provider; send_batch delivers up to max_batch_size messages in one call"""
+    name = "base"
+    max_batch_size = 1
+    # Messages per second the provider accepts from us
+    rate_limit = 10.0
+
+    async def send_batch(self, messages: List[SmsMessage]) -> List[SendResult]:
+        raise NotImplementedError
+
+class LogSmsGateway(SmsGateway):
+    """Writes messages to the log instead of sending them; the default until a real provider is configured"""
+    name = "log"
+    max_batch_size = 100
+    rate_limit = float(os.getenv("SMS_LOG_RATE_LIMIT", "1000"))
+
+    async def send_batch(self, messages: List[SmsMessage]) -> List[SendResult]:
+        results = []
+        for message in messages:
+            logger.info("SMS to %s: %s", message.recipient, message.message)
+            results.append(SendResult(message.notificationId, ok=True, providerMessageId=f"log-{message.notificationId}"))
+        return results
+
+class FakeSmsGateway(SmsGateway):
+    """In-memory gateway for tests and local runs
+
+    `fail` decides per message whether a send fails, e.g. to simulate a flaky provider.
+    """
+    name = "fake"
+
+    def __init__(
+        self,
+        max_batch_size: int = 50,
+        rate_limit: float = 1000.0,
+        latency: float = 0.0,
+        fail: Optional[Callable[[SmsMessage], Optional[SendResult]]] = None,
+    ):
+        self.max_batch_size = max_batch_size
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.fail = fail
+        self.sent: List[SmsMessage] = []
+        self.batches: List[List[SmsMessage]] = []
+        self._ids = itertools.count(1)
+
+    async def send_batch(self, messages: List[SmsMessage]) -> List[SendResult]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.batches.append(list(messages))
+        results = []
+        for message in messages:
+            failure = self.fail(message) if self.fail else None
+            if failure is not None:
+                results.append(failure)
+                continue
+            self.sent.append(message)
+            results.append(SendResult(message.notificationId, ok=True, providerMessageId=f"fake-{next(self._ids)}"))
+        return results
+
+# Providers the worker delivers for, by name; register real providers here
+GATEWAYS: Dict[str, SmsGateway] = {
+    LogSmsGateway.name: LogSmsGateway(),
+    FakeSmsGateway.name: FakeSmsGateway(),
+}
+
+def register_gateway(gateway: SmsGateway):
+    GATEWAYS[gateway.name] = gateway
+
+def active_gateways() -> Dict[str, SmsGateway]:
+    """Gateways the worker delivers for: the configured SMS_PROVIDER"""
+    if SMS_PROVIDER not in GATEWAYS:
+        raise RuntimeError(f"Unknown SMS_PROVIDER {SMS_PROVIDER!r}; expected one of {', '.join(GATEWAYS)}")
+    return {SMS_PROVIDER: GATEWAYS[SMS_PROVIDER]}
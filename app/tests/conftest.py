@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from app.api import appointments
+from app.db import base as db_base
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    """Tables are created by the app's lifespan hook, which TestClient only runs inside `with`"""
+    if os.getenv("DATABASE_URL"):
+        db_base.create_schema()
+
+@pytest.fixture
+def database():
+    """Skip tests that need SQL (notifications, archive runs, ...) when no database is configured"""
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL is not set")
+
+@pytest.fixture
+def engine(database):
+    """The app's sync engine, created on first use"""
+    return db_base.get_engine()
+
+@pytest.fixture
+def otp_in_response(monkeypatch):
+    """Echo OTPs in send-otp responses, so tests can log in without reading the SMS"""
+    monkeypatch.setattr(appointments, "OTP_IN_RESPONSE", True)
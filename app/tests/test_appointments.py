@@ -1,9 +1,16 @@
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta, date, time
+import csv
+import io
 import json
+import uuid
 
+from app.core.security import create_session_token
+from app.db import bulk
+from app.db.base import SessionLocal
 from app.main import app
+from app.services import appointment_repository
 
 client = TestClient(app)
 
@@ -19,7 +26,8 @@ def appointment_data():
         "date": tomorrow.isoformat(),
         "time": test_time.isoformat(),
         "department": "Cardiology",
-        "doctorName": "Dr. Test Doctor"
+        "doctorName": "Dr. Test Doctor",
+        "userPhoneNumber": "9876543210"
     }
 
 def test_create_appointment(appointment_data):
@@ -92,8 +100,8 @@ def test_deletes_old_appointments_for_same_patient(appointment_data):
     first_appointment = test_create_appointment(appointment_data)
     first_id = first_appointment["appointmentId"]
     
-    # Get all appointments to verify it exists
-    response = client.get("/v1/appointments/")
+    # Get the patient's appointments to verify it exists
+    response = client.get("/v1/appointments/", params={"patientId": appointment_data["patientId"]})
     appointments_before = response.json()
     assert any(a["appointmentId"] == first_id for a in appointments_before)
     
@@ -105,8 +113,8 @@ def test_deletes_old_appointments_for_same_patient(appointment_data):
     second_appointment = client.post("/v1/appointments/", json=second_appointment_data).json()
     second_id = second_appointment["appointmentId"]
     
-    # Get all appointments again
-    response = client.get("/v1/appointments/")
+    # Get the patient's appointments again
+    response = client.get("/v1/appointments/", params={"patientId": appointment_data["patientId"]})
     appointments_after = response.json()
     
     # Verify first appointment is gone and only second exists
@@ -115,4 +123,168 @@ def test_deletes_old_appointments_for_same_patient(appointment_data):
     
     # Verify count of appointments for this patient is 1
     patient_appointments = [a for a in appointments_after if a["patientId"] == appointment_data["patientId"]]
-    assert len(patient_appointments) == 1 
\ No newline at end of file
+    assert len(patient_appointments) == 1 
+def test_availability_tracks_bookings_and_cancellations(appointment_data):
+    # Use a date far enough ahead that no other test books on it
+    booking_date = date.today() + timedelta(days=400)
+    booking_data = appointment_data.copy()
+    booking_data["patientId"] = "PAT-AVAIL-1"
+    booking_data["date"] = booking_date.isoformat()
+    booking_data["userPhoneNumber"] = "9876543210"
+    params = {"appointmentDate": booking_date.isoformat(), "doctorName": booking_data["doctorName"]}
+
+    before = client.get("/v1/appointments/availability", params=params).json()
+    created = client.post("/v1/appointments/", json=booking_data).json()
+    after_booking = client.get("/v1/appointments/availability", params=params).json()
+    assert after_booking["appointmentTime"] > before["appointmentTime"]
+
+    # Cancelling frees the slot again
+    response = client.patch(f"/v1/appointments/{created['appointmentId']}", json={"isCancelled": True})
+    assert response.status_code == 200
+    after_cancel = client.get("/v1/appointments/availability", params=params).json()
+    assert after_cancel["appointmentTime"] == before["appointmentTime"]
+
+def test_availability_range_counts_bookings_per_day_and_revalidates(appointment_data):
+    first_day = date.today() + timedelta(days=410)
+    # A doctor of its own, so earlier runs against the same database leave no bookings behind
+    doctor = f"Dr. Range {uuid.uuid4().hex[:8]}"
+    booking_data = appointment_data.copy()
+    booking_data.update({
+        "patientId": f"PAT-RANGE-{doctor[-8:]}", "date": (first_day + timedelta(days=1)).isoformat(), "time": "09:00:00",
+        "doctorName": doctor,
+    })
+    params = {"from": first_day.isoformat(), "to": (first_day + timedelta(days=2)).isoformat(), "doctor": doctor}
+
+    before = client.get("/v1/appointments/availability/range", params=params)
+    assert before.status_code == 200
+    assert before.headers["Cache-Control"] == "no-cache"
+    assert client.get("/v1/appointments/availability/range", params=params,
+                      headers={"If-None-Match": before.headers["ETag"]}).status_code == 304
+
+    client.post("/v1/appointments/", json=booking_data)
+    after = client.get("/v1/appointments/availability/range", params=params,
+                       headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    days = after.json()["days"]
+    assert [day["booked"] for day in days] == [0, 1, 0]
+    assert days[1]["free"] == days[0]["free"] - 1
+    assert {"time": "09:00:00", "free": 0} in days[1]["slots"]
+
+    too_long = {**params, "to": (first_day + timedelta(days=100)).isoformat()}
+    assert client.get("/v1/appointments/availability/range", params=too_long).status_code == 400
+
+def test_list_appointments_keyset_pagination_and_ndjson(appointment_data):
+    # Book three patients on a date no other test uses
+    listing_date = date.today() + timedelta(days=401)
+    created_ids = []
+    for index in range(3):
+        booking_data = appointment_data.copy()
+        booking_data["patientId"] = f"PAT-PAGE-{index}"
+        booking_data["date"] = listing_date.isoformat()
+        booking_data["time"] = time(9 + index, 0, 0).isoformat()
+        booking_data["userPhoneNumber"] = "9876543210"
+        created_ids.append(client.post("/v1/appointments/", json=booking_data).json()["appointmentId"])
+
+    params = {"dateFrom": listing_date.isoformat(), "dateTo": listing_date.isoformat(), "limit": 2}
+    first_page = client.get("/v1/appointments/", params=params)
+    assert [a["appointmentId"] for a in first_page.json()] == created_ids[:2]
+    next_cursor = first_page.headers["X-Next-Cursor"]
+
+    second_page = client.get("/v1/appointments/", params={**params, "cursor": next_cursor})
+    assert [a["appointmentId"] for a in second_page.json()] == created_ids[2:]
+    assert "X-Next-Cursor" not in second_page.headers
+
+    streamed = client.get("/v1/appointments/", params={**params, "format": "ndjson"})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["appointmentId"] for line in streamed.text.splitlines()] == created_ids
+
+def test_bulk_import_reports_row_errors_without_aborting(appointment_data):
+    import_date = date.today() + timedelta(days=402)
+    rows = []
+    for index in range(2):
+        row = appointment_data.copy()
+        row["patientId"] = f"PAT-BULK-{index}"
+        row["date"] = import_date.isoformat()
+        row["time"] = time(10 + index, 0, 0).isoformat()
+        row["userPhoneNumber"] = "9876543210"
+        rows.append(row)
+    rows.append({"patientId": "PAT-BULK-BAD"})
+
+    response = client.post("/v1/appointments/bulk", json=rows)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported"] == 2
+    assert result["failed"] == 1
+    assert result["errors"][0]["row"] == 3
+
+    listed = client.get("/v1/appointments/", params={"dateFrom": import_date.isoformat(), "dateTo": import_date.isoformat()})
+    assert {a["patientId"] for a in listed.json()} == {"PAT-BULK-0", "PAT-BULK-1"}
+
+@pytest.mark.skipif(appointment_repository.STORAGE_BACKEND == "memory", reason="exports read the SQL database")
+def test_bulk_export_round_trips_ids_and_cancellations(appointment_data):
+    doctor = f"Dr. Round Trip {uuid.uuid4().hex[:8]}"
+    trip_date = date.today() + timedelta(days=403)
+    created = [
+        client.post("/v1/appointments/", json={
+            **appointment_data, "patientId": f"PAT-TRIP-{doctor[-8:]}-{index}", "doctorName": doctor,
+            "date": trip_date.isoformat(), "time": time(9 + index, 0).isoformat(),
+        }).json()
+        for index in range(2)
+    ]
+    client.patch(f"/v1/appointments/{created[1]['appointmentId']}", json={"isCancelled": True})
+
+    exported = io.StringIO()
+    with SessionLocal() as db:
+        bulk.export_appointments(db, exported)
+    exported.seek(0)
+    rows = [row for row in csv.DictReader(exported) if row["doctorName"] == doctor]
+    result = client.post("/v1/appointments/bulk", json=rows).json()
+    assert (result["imported"], result["failed"]) == (2, 0)
+
+    listed = client.get("/v1/appointments/", params={"doctorName": doctor}).json()
+    assert {(a["appointmentId"], a["isCancelled"]) for a in listed} == {
+        (created[0]["appointmentId"], False), (created[1]["appointmentId"], True),
+    }
+    # The cancelled appointment does not count against the day's capacity
+    calendar = client.get("/v1/appointments/availability/range", params={
+        "from": trip_date.isoformat(), "to": trip_date.isoformat(), "doctor": doctor,
+    }).json()
+    assert calendar["days"][0]["booked"] == 1
+
+def test_bulk_import_keeps_the_slot_of_a_patient_whose_move_is_rejected(appointment_data):
+    doctor = f"Dr. Bulk Move {uuid.uuid4().hex[:8]}"
+    booking = {**appointment_data, "doctorName": doctor, "date": (date.today() + timedelta(days=430)).isoformat()}
+    mover = {**booking, "patientId": f"PAT-MOVER-{doctor[-8:]}", "time": "09:00:00"}
+    stayer = {**booking, "patientId": f"PAT-STAYER-{doctor[-8:]}", "time": "10:00:00"}
+    assert client.post("/v1/appointments/", json=mover).status_code == 201
+    assert client.post("/v1/appointments/", json=stayer).status_code == 201
+
+    # The mover's row is rejected (the stayer keeps 10:00), so the mover keeps 09:00 as well
+    result = client.post("/v1/appointments/bulk", json=[
+        {**mover, "time": "10:00:00"},
+        {**booking, "patientId": f"PAT-NEWCOMER-{doctor[-8:]}", "time": "09:00:00"},
+    ]).json()
+    assert (result["imported"], result["failed"]) == (0, 2)
+    assert [error["row"] for error in result["errors"]] == [1, 2]
+    listed = client.get("/v1/appointments/", params={"doctorName": doctor}).json()
+    assert sorted((a["patientId"], a["time"]) for a in listed) == [
+        (mover["patientId"], "09:00:00"), (stayer["patientId"], "10:00:00"),
+    ]
+
+def test_cached_lookups_see_cancellation(appointment_data):
+    booking_data = appointment_data.copy()
+    booking_data["patientId"] = "PAT-CACHE-1"
+    booking_data["time"] = time(11, 30, 0).isoformat()
+    booking_data["userPhoneNumber"] = "9876543210"
+    created = client.post("/v1/appointments/", json=booking_data).json()
+    appointment_id = created["appointmentId"]
+    session = {"Authorization": f"Bearer {create_session_token('9876543210')}"}
+
+    details = client.get(f"/v1/appointments/{appointment_id}/cancellation", headers=session)
+    assert details.json()["appointmentCancelled"] is False
+
+    client.patch(f"/v1/appointments/{appointment_id}", json={"isCancelled": True})
+    details = client.get(f"/v1/appointments/{appointment_id}/cancellation", headers=session)
+    assert details.json()["appointmentCancelled"] is True
+    reschedule = client.get(f"/v1/appointments/{appointment_id}/reschedule", headers=session)
+    assert reschedule.status_code == 404
@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.db.base import SessionLocal
+from app.main import app
+from app.models.appointment import Appointment as AppointmentModel
+from app.models.appointment_archive import ArchivedAppointment
+from app.services import archive
+from app.services.appointment_repository import MemoryAppointmentRepository
+from app.services.id_allocator import allocator
+from app.tests.test_repository import booking
+
+# Archive runs are anchored here, so only the old rows made by these tests are due
+TODAY = date(2001, 3, 1)
+
+def _appointment(appointmentId: str, day: date, **fields) -> AppointmentModel:
+    values = {
+        "appointmentId": appointmentId, "patientId": f"ARCH-{appointmentId}", "name": "Archive Patient",
+        "date": day, "time": time(9, 0), "department": "Cardiology", "doctorName": f"Dr. Archive {appointmentId}",
+        "userPhoneNumber": "9000000777", "isCancelled": False,
+    }
+    values.update(fields)
+    return AppointmentModel(**values)
+
+def test_past_and_cancelled_appointments_move_to_the_archive(database):
+    upcoming = date.today() + timedelta(days=5)
+    with SessionLocal() as db:
+        # Fresh IDs, so earlier runs against the same database do not get in the way
+        past, cancelled, kept = [allocator.allocate(db) for _ in range(3)]
+        db.add_all([
+            _appointment(past, date(2001, 1, 10)),
+            _appointment(cancelled, upcoming, isCancelled=True, updated_at=datetime(2001, 1, 1)),
+            _appointment(kept, upcoming),
+        ])
+        db.commit()
+
+        totals = archive.archive_appointments(db, today=TODAY, batch_size=1)
+        assert totals["past"] >= 1 and totals["cancelled"] >= 1
+
+        remaining = set(db.execute(select(AppointmentModel.appointmentId).where(
+            AppointmentModel.appointmentId.in_([past, cancelled, kept])
+        )).scalars())
+        assert remaining == {kept}
+        reasons = dict(db.execute(select(ArchivedAppointment.appointmentId, ArchivedAppointment.archiveReason).where(
+            ArchivedAppointment.appointmentId.in_([past, cancelled])
+        )).all())
+        assert reasons == {past: "past", cancelled: "cancelled"}
+        if db.get_bind().dialect.name == "postgresql":
+            assert db.execute(select(func.to_regclass(archive.partition_name(date(2001, 1, 1))))).scalar()
+
+def test_booking_archives_the_replaced_appointment(database):
+    client = TestClient(app)
+    suffix = uuid.uuid4().hex[:8]
+    request = {
+        "patientId": f"ARCH-REBOOK-{suffix}", "name": "Rebooking Patient", "date": "2031-03-04", "time": "10:15:00",
+        "department": "Cardiology", "doctorName": f"Dr. Archive Rebook {suffix}", "userPhoneNumber": "9000000778",
+    }
+    first = client.post("/v1/appointments/", json=request).json()
+    second = client.post("/v1/appointments/", json={**request, "time": "11:15:00"}).json()
+
+    # Partitioning the month later moves the row out of the default partition
+    with SessionLocal() as db:
+        archive.archive_appointments(db, today=TODAY)
+
+    history = client.get("/v1/appointments/history", params={"patientId": request["patientId"]}).json()
+    assert [(entry["appointmentId"], entry["archiveReason"]) for entry in history] == [(first["appointmentId"], "replaced")]
+    assert history[0]["time"] == "10:15:00"
+    assert client.get(f"/v1/appointments/{second['appointmentId']}").status_code == 200
+    assert client.get("/v1/appointments/history").status_code == 400
+
+def test_memory_repository_keeps_replaced_appointments():
+    repository = MemoryAppointmentRepository()
+    first, _ = asyncio.run(repository.create_appointment(booking("MEM-ARCH", 9)))
+    asyncio.run(repository.create_appointment(booking("MEM-ARCH", 10)))
+    history = asyncio.run(repository.list_archived_appointments(None, "MEM-ARCH", 10))
+    assert [(entry.appointmentId, entry.archiveReason) for entry in history] == [(first.appointmentId, "replaced")]
+
+def test_bulk_import_archives_the_replaced_appointment():
+    client = TestClient(app)
+    suffix = uuid.uuid4().hex[:8]
+    request = {
+        "patientId": f"ARCH-BULK-{suffix}", "name": "Imported Patient", "date": "2031-04-01", "time": "10:00:00",
+        "department": "Cardiology", "doctorName": f"Dr. Archive Bulk {suffix}", "userPhoneNumber": "9000000779",
+    }
+    first = client.post("/v1/appointments/", json=request).json()
+    imported = client.post("/v1/appointments/bulk", json=[{**request, "date": "2031-04-02"}]).json()
+    assert imported["imported"] == 1
+
+    history = client.get("/v1/appointments/history", params={"patientId": request["patientId"]}).json()
+    assert [(entry["appointmentId"], entry["archiveReason"]) for entry in history] == [(first["appointmentId"], "replaced")]
+    calendar = client.get("/v1/appointments/availability/range", params={
+        "from": "2031-04-01", "to": "2031-04-02", "doctor": request["doctorName"],
+    }).json()
+    assert [day["booked"] for day in calendar["days"]] == [0, 1]
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.security import create_session_token
+from app.main import app
+from app.services import otp_store
+from app.services.otp_store import MemoryOtpStore
+
+client = TestClient(app)
+
+# send-otp queues the SMS in the notifications table
+pytestmark = pytest.mark.usefixtures("otp_in_response", "database")
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(otp_store, "store", MemoryOtpStore())
+
+def _book(phone):
+    booking = {
+        "patientId": f"PAT-AUTH-{phone}",
+        "name": "Auth Patient",
+        "date": (date.today() + timedelta(days=2)).isoformat(),
+        "time": f"11:{phone[-2:]}:00",
+        "department": "Cardiology",
+        "doctorName": "Dr. Test Doctor",
+        "userPhoneNumber": phone,
+    }
+    return client.post("/v1/appointments/", json=booking).json()["appointmentId"]
+
+def _login(phone):
+    otp = client.post("/v1/auth/send-otp", json={"userPhoneNumber": phone}).json()["sentOtp"]
+    return client.post("/v1/auth/verify-otp", json={"userPhoneNumber": phone, "otp": otp})
+
+def test_verified_session_opens_own_appointment_only():
+    appointment_id = _book("9200000001")
+    verified = _login("9200000001")
+    assert verified.status_code == 200
+    session = {"Authorization": f"Bearer {verified.json()['sessionToken']}"}
+
+    assert client.get(f"/v1/appointments/{appointment_id}/reschedule", headers=session).json() == {"rescheduleAvailable": True}
+    assert client.get(f"/v1/appointments/{appointment_id}/cancellation", headers=session).status_code == 200
+    assert client.get(f"/v1/appointments/{appointment_id}/reschedule").status_code == 401
+
+    other = {"Authorization": f"Bearer {create_session_token('9200000002')}"}
+    assert client.get(f"/v1/appointments/{appointment_id}/reschedule", headers=other).status_code == 404
+
+def test_rejects_forged_and_expired_tokens():
+    appointment_id = _book("9200000003")
+    forged = create_session_token("9200000003", secret="not-the-server-secret")
+    expired = create_session_token("9200000003", ttl_seconds=-1)
+    for token in (forged, expired, "garbage"):
+        response = client.get(f"/v1/appointments/{appointment_id}/cancellation", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 401
+
+def test_otp_is_single_use():
+    otp = client.post("/v1/auth/send-otp", json={"userPhoneNumber": "9200000004"}).json()["sentOtp"]
+    body = {"userPhoneNumber": "9200000004", "otp": otp}
+    assert client.post("/v1/auth/verify-otp", json=body).status_code == 200
+    assert client.post("/v1/auth/verify-otp", json=body).status_code == 401
+
+def test_otp_is_discarded_after_too_many_wrong_guesses(monkeypatch):
+    monkeypatch.setattr(otp_store, "OTP_MAX_ATTEMPTS", 2)
+    otp = client.post("/v1/auth/send-otp", json={"userPhoneNumber": "9200000005"}).json()["sentOtp"]
+    wrong = f"{(int(otp) + 1) % 10 ** 6:06d}"
+    for _ in range(2):
+        assert client.post("/v1/auth/verify-otp", json={"userPhoneNumber": "9200000005", "otp": wrong}).status_code == 401
+    assert client.post("/v1/auth/verify-otp", json={"userPhoneNumber": "9200000005", "otp": otp}).status_code == 401
+
+def test_send_otp_is_rate_limited_per_phone(monkeypatch):
+    monkeypatch.setattr(otp_store, "OTP_SEND_LIMIT", 2)
+    for _ in range(2):
+        assert client.post("/v1/auth/send-otp", json={"userPhoneNumber": "9200000006"}).status_code == 200
+    limited = client.post("/v1/auth/send-otp", json={"userPhoneNumber": "9200000006"})
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) > 0
+    assert client.post("/v1/auth/send-otp", json={"userPhoneNumber": "9200000007"}).status_code == 200
+
+def test_memory_store_expires_and_sweeps_entries():
+    now = [0.0]
+    store = MemoryOtpStore(sweep_interval=10, clock=lambda: now[0])
+    asyncio.run(store.save("9200000008", "digest", ttl=5))
+    asyncio.run(store.hit("send:9200000008", window=5))
+    assert asyncio.run(store.attempt("9200000008", max_attempts=5)) == "digest"
+
+    now[0] = 6
+    assert asyncio.run(store.attempt("9200000008", max_attempts=5)) is None
+    assert len(store) == 1
+
+    now[0] = 11
+    asyncio.run(store.hit("send:9200000009", window=5))
+    assert len(store) == 1
+
+def test_memory_store_refuses_several_workers():
+    assert isinstance(otp_store.create_otp_store("memory", workers=1), MemoryOtpStore)
+    with pytest.raises(RuntimeError, match="OTP_BACKEND=redis"):
+        otp_store.create_otp_store("memory", workers=2)
@@ -0,0 +1,42 @@
+from benchmarks import serialization
+from benchmarks.compare import find_regressions
+from benchmarks.loadtest import percentile, summarize
+
+def test_summarize_reports_percentiles_and_errors_per_scenario():
+    records = [("by_id", 200, ms / 1000) for ms in range(1, 101)] + [("by_id", 503, 0.5), ("create", 0, 1.0)]
+    results = summarize(records, elapsed=2.0)
+
+    by_id = results["endpoints"]["by_id"]
+    assert by_id["requests"] == 101
+    assert by_id["errors"] == 1
+    assert by_id["statusCodes"] == {"200": 100, "503": 1}
+    assert by_id["latencyMs"]["p50"] == 51.0
+    assert by_id["latencyMs"]["max"] == 500.0
+    assert results["endpoints"]["create"]["errors"] == 1
+    assert results["total"]["requests"] == 102
+    assert results["total"]["throughput"] == 51.0
+
+def test_percentile_uses_nearest_rank():
+    values = [float(n) for n in range(1, 11)]
+    assert percentile(values, 50) == 5.0
+    assert percentile(values, 95) == 10.0
+    assert percentile([], 99) == 0.0
+
+def test_compare_flags_latency_regressions_only_beyond_threshold():
+    def run(p95, requests=100):
+        return {"endpoints": {"by_id": {
+            "requests": requests, "errors": 0, "throughput": 100.0,
+            "latencyMs": {"p95": p95, "p99": p95},
+        }}}
+
+    assert find_regressions(run(10.0), run(10.5), threshold=0.1) == []
+    assert len(find_regressions(run(10.0), run(12.0), threshold=0.1)) == 2
+    # Too few requests to judge
+    assert find_regressions(run(10.0, requests=10), run(50.0, requests=10), threshold=0.1) == []
+
+def test_serialization_fast_path_matches_the_response_model():
+    rows = serialization.synthetic_rows(50)
+    # measure() asserts both paths produce the same document
+    results = serialization.measure(rows, serialization.to_models(rows), repeat=1)
+    assert results["rows"] == 50
+    assert set(results["cpuMicrosPerRow"]) == {"validated", "fast"}
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from app.services.cache import MemoryCache, NullCache, create_cache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_memory_cache_expires_entries():
+    clock = FakeClock()
+    cache = MemoryCache(max_entries=10, clock=clock)
+    asyncio.run(cache.set("appointment:v1:123456", "cached", ttl=5))
+    assert asyncio.run(cache.get("appointment:v1:123456")) == "cached"
+    clock.now = 5
+    assert asyncio.run(cache.get("appointment:v1:123456")) is None
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2, clock=FakeClock())
+    asyncio.run(cache.set("a", "1", ttl=60))
+    asyncio.run(cache.set("b", "2", ttl=60))
+    asyncio.run(cache.get("a"))
+    asyncio.run(cache.set("c", "3", ttl=60))
+    assert asyncio.run(cache.get("b")) is None
+    assert asyncio.run(cache.get("a")) == "1"
+
+def test_memory_cache_clear_by_prefix():
+    cache = MemoryCache(max_entries=10, clock=FakeClock())
+    asyncio.run(cache.set("appointment:v1:1", "1", ttl=60))
+    asyncio.run(cache.set("other:1", "2", ttl=60))
+    asyncio.run(cache.clear("appointment:"))
+    assert asyncio.run(cache.get("appointment:v1:1")) is None
+    assert asyncio.run(cache.get("other:1")) == "2"
+
+def test_memory_cache_refuses_several_workers():
+    assert isinstance(create_cache("memory", workers=1), MemoryCache)
+    assert isinstance(create_cache("none", workers=4), NullCache)
+    with pytest.raises(RuntimeError, match="CACHE_BACKEND=redis"):
+        create_cache("memory", workers=4)
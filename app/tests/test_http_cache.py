@@ -0,0 +1,65 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.core import http_cache
+from app.main import app
+from app.services import appointment_cache
+from app.services.appointment_repository import MemoryAppointmentRepository, get_read_repository
+from app.tests.test_repository import booking
+
+client = TestClient(app)
+
+def test_openapi_document_is_revalidated_with_its_etag():
+    first = client.get("/v1/openapi.json")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == f"public, max-age={http_cache.OPENAPI_CACHE_SECONDS}"
+    assert first.headers["ETag"].startswith('"')
+
+    again = client.get("/v1/openapi.json", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert client.get("/v1/openapi.json", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+def test_appointment_etag_changes_when_the_appointment_does():
+    repository = MemoryAppointmentRepository()
+    app.dependency_overrides[get_read_repository] = lambda: repository
+    try:
+        created, _ = asyncio.run(repository.create_appointment(booking("ETAG-1", 10)))
+        path = f"/v1/appointments/{created.appointmentId}"
+        first = client.get(path)
+        assert first.headers["Cache-Control"] == "no-cache"
+        assert client.get(path, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+        asyncio.run(repository.patch_appointment(created.appointmentId, {"name": "Renamed Patient"}))
+        asyncio.run(appointment_cache.invalidate_appointments(created.appointmentId))
+        changed = client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+        assert changed.status_code == 200
+        assert changed.json()["name"] == "Renamed Patient"
+        assert changed.headers["ETag"] != first.headers["ETag"]
+
+        # Errors and routes without a rule get no ETag
+        assert "ETag" not in client.get("/v1/appointments/999999").headers
+        assert "ETag" not in client.get("/v1/appointments/free-slots").headers
+    finally:
+        app.dependency_overrides.pop(get_read_repository)
+
+def test_writes_refresh_the_proxy_cache(monkeypatch):
+    refreshed = []
+
+    async def refresh(paths):
+        refreshed.extend(paths)
+
+    monkeypatch.setattr(http_cache, "_refresh", refresh)
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_PURGE_URL", "http://nginx:8080")
+
+    async def write():
+        await appointment_cache.invalidate_appointments("123456", "")
+        await http_cache.close()
+
+    asyncio.run(write())
+    assert refreshed == [
+        "/v1/appointments/123456",
+        "/v1/appointments/booking-details?appointmentNumber=123456",
+    ]
@@ -0,0 +1,50 @@
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from app.db.base import SessionLocal
+from app.models.appointment import APPOINTMENT_ID_COUNTER
+from app.models.appointment_archive import ArchivedAppointment
+from app.services.id_allocator import ID_SPACE, AppointmentIdAllocator, format_id, permute
+
+def test_permutation_is_collision_free_and_six_digits():
+    ids = [format_id(permute(value)) for value in range(0, ID_SPACE, 7)]
+    assert len(set(ids)) == len(ids)
+    assert all(re.fullmatch(r"\d{6}", appointment_id) for appointment_id in ids)
+
+def test_permutation_does_not_expose_the_sequence():
+    consecutive = [permute(value) for value in range(100)]
+    assert consecutive != sorted(consecutive)
+
+def test_allocators_of_separate_workers_hand_out_distinct_ids(database):
+    workers = [AppointmentIdAllocator(block_size=5) for _ in range(2)]
+    with SessionLocal() as db:
+        ids = [worker.allocate(db) for _ in range(8) for worker in workers]
+        db.commit()
+    # A worker started later continues where the others left off
+    with SessionLocal() as db:
+        ids.append(AppointmentIdAllocator(block_size=5).allocate(db))
+        db.commit()
+    assert len(set(ids)) == len(ids)
+
+def _next_value(db) -> int:
+    if db.get_bind().dialect.name == "postgresql":
+        return db.execute(text(
+            "SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM appointment_id_seq"
+        )).scalar_one()
+    return db.execute(text(f'SELECT "nextValue" FROM {APPOINTMENT_ID_COUNTER}')).scalar_one()
+
+def test_allocator_skips_ids_of_archived_appointments(database):
+    with SessionLocal() as db:
+        # Archived legacy appointments whose random IDs are the next two the allocator would hand out
+        start = _next_value(db)
+        archived = [format_id(permute(value)) for value in range(start, start + 2)]
+        db.add_all([
+            ArchivedAppointment(appointmentId=appointment_id, date=date(2001, 1, 10), archiveReason="past")
+            for appointment_id in archived
+        ])
+        db.commit()
+        appointment_id = AppointmentIdAllocator(block_size=2).allocate(db)
+        db.commit()
+    assert appointment_id not in archived
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.core.idempotency import request_fingerprint
+from app.main import app
+from app.services import idempotency_store, otp_store
+from app.services.idempotency_store import MemoryIdempotencyStore
+from app.services.otp_store import MemoryOtpStore
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(idempotency_store, "store", MemoryIdempotencyStore())
+
+@pytest.fixture
+def booking():
+    return {
+        "patientId": f"PAT-IDEM-{uuid.uuid4().hex[:8]}",
+        "name": "Retry Patient",
+        "date": (date.today() + timedelta(days=700)).isoformat(),
+        "time": "09:30:00",
+        "department": "Cardiology",
+        "doctorName": f"Dr. Retry {uuid.uuid4().hex[:8]}",
+        "userPhoneNumber": "9500000001",
+    }
+
+@pytest.fixture
+def statements(engine):
+    executed = []
+    listener = lambda conn, cursor, statement, *args: executed.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    yield executed
+    event.remove(engine, "before_cursor_execute", listener)
+
+def test_retry_replays_stored_response_without_touching_database(booking, statements):
+    headers = {"Idempotency-Key": "ivr-call-1"}
+    first = client.post("/v1/appointments/", json=booking, headers=headers)
+    assert first.status_code == 201
+    assert "idempotent-replayed" not in first.headers
+
+    statements.clear()
+    retry = client.post("/v1/appointments/", json=booking, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json()["appointmentId"] == first.json()["appointmentId"]
+    assert statements == []
+
+    # Without the key the request is processed again and replaces the appointment
+    fresh = client.post("/v1/appointments/", json=booking)
+    assert fresh.json()["appointmentId"] != first.json()["appointmentId"]
+
+def test_key_reused_for_different_request_is_rejected(database, booking):
+    headers = {"Idempotency-Key": "ivr-call-2"}
+    assert client.post("/v1/appointments/", json=booking, headers=headers).status_code == 201
+    changed = client.post("/v1/appointments/", json={**booking, "time": "10:00:00"}, headers=headers)
+    assert changed.status_code == 422
+    # Keys are scoped to the route
+    otp = client.post("/v1/auth/send-otp", json={"userPhoneNumber": booking["userPhoneNumber"]}, headers=headers)
+    assert otp.status_code == 200
+
+def test_retry_while_first_request_runs_gets_409(booking):
+    body = json.dumps(booking).encode()
+    fingerprint = request_fingerprint({"method": "POST", "path": "/v1/appointments/"}, body)
+    asyncio.run(idempotency_store.store.claim(
+        "POST:/v1/appointments/:ivr-call-3", json.dumps({"fingerprint": fingerprint}), 60
+    ))
+    response = client.post(
+        "/v1/appointments/", content=body,
+        headers={"Idempotency-Key": "ivr-call-3", "Content-Type": "application/json"},
+    )
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
+
+def test_client_errors_are_replayed_but_rate_limits_are_not(database, monkeypatch):
+    headers = {"Idempotency-Key": "ivr-call-4"}
+    assert client.post("/v1/appointments/", json={"patientId": "PAT-IDEM-BAD"}, headers=headers).status_code == 422
+    replayed = client.post("/v1/appointments/", json={"patientId": "PAT-IDEM-BAD"}, headers=headers)
+    assert replayed.headers["idempotent-replayed"] == "true"
+
+    monkeypatch.setattr(otp_store, "store", MemoryOtpStore())
+    monkeypatch.setattr(otp_store, "OTP_SEND_LIMIT", 0)
+    otp_request = {"userPhoneNumber": "9500000002"}
+    assert client.post("/v1/auth/send-otp", json=otp_request, headers=headers).status_code == 429
+    monkeypatch.setattr(otp_store, "OTP_SEND_LIMIT", 10)
+    assert client.post("/v1/auth/send-otp", json=otp_request, headers=headers).status_code == 200
+
+def test_memory_store_claims_once_and_expires():
+    now = [0.0]
+    store = MemoryIdempotencyStore(max_entries=2, clock=lambda: now[0])
+    assert asyncio.run(store.claim("a", "first", ttl=5)) is None
+    assert asyncio.run(store.claim("a", "second", ttl=5)) == "first"
+    now[0] = 6
+    assert asyncio.run(store.claim("a", "third", ttl=5)) is None
+
+    asyncio.run(store.save("b", "b", ttl=5))
+    asyncio.run(store.save("c", "c", ttl=5))
+    assert len(store) == 2
+
+def test_memory_store_refuses_several_workers():
+    assert isinstance(idempotency_store.create_idempotency_store("memory", workers=1), MemoryIdempotencyStore)
+    with pytest.raises(RuntimeError, match="IDEMPOTENCY_BACKEND=redis"):
+        idempotency_store.create_idempotency_store("memory", workers=2)
@@ -0,0 +1,50 @@
+import json
+import logging
+
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.core.logs import JsonFormatter, RequestContextMiddleware, request_id_var
+from app.main import app
+
+client = TestClient(app)
+
+def _app(sample_rate):
+    seen = []
+
+    async def ok(request):
+        seen.append(request_id_var.get())
+        return PlainTextResponse("ok")
+
+    async def fail(request):
+        return PlainTextResponse("fail", status_code=503)
+
+    inner = Starlette(routes=[Route("/ok", ok), Route("/fail", fail)])
+    return TestClient(RequestContextMiddleware(inner, sample_rate=sample_rate, slow_ms=10_000)), seen
+
+def test_request_id_is_echoed_or_generated():
+    response = client.get("/v1/appointments/000000", headers={"X-Request-ID": "ivr-42"})
+    assert response.headers["x-request-id"] == "ivr-42"
+    assert len(client.get("/v1/appointments/000000").headers["x-request-id"]) == 32
+
+def test_access_log_is_sampled_but_errors_are_always_logged(caplog):
+    test_client, seen = _app(sample_rate=0)
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        test_client.get("/ok", headers={"X-Request-ID": "req-1"})
+        test_client.get("/fail")
+    assert seen == ["req-1"]
+    records = [record for record in caplog.records if record.name == "app.access"]
+    assert [record.status for record in records] == [503]
+    assert records[0].path == "/fail"
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    record = logging.LogRecord("app.test", logging.INFO, __file__, 1, "Booked %s", ("APT-1",), None)
+    record.request_id = "req-2"
+    record.durationMs = 12.5
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Booked APT-1"
+    assert entry["requestId"] == "req-2"
+    assert entry["durationMs"] == 12.5
+    assert entry["level"] == "INFO"
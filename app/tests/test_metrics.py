@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import appointment_repository
+
+client = TestClient(app)
+
+def _sample(text, name, **labels):
+    """Return the value of a metric line with exactly these labels, or None"""
+    expected = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    for line in text.splitlines():
+        if line.startswith(f"{name}{{"):
+            line_labels, value = line[len(name) + 1:].rsplit("} ", 1)
+            if line_labels == expected:
+                return float(value)
+    return None
+
+def test_metrics_label_requests_by_route_template():
+    client.get("/v1/appointments/availability", params={"appointmentDate": "2031-01-01"})
+    client.get("/v1/appointments/000000")
+
+    text = client.get("/v1/metrics").text
+    assert _sample(text, "http_request_duration_seconds_count",
+                   method="GET", route="/v1/appointments/availability", status="200") >= 1
+    # Path parameters are not part of the label
+    assert _sample(text, "http_request_duration_seconds_count",
+                   method="GET", route="/v1/appointments/{appointmentId}", status="404") >= 1
+
+@pytest.mark.skipif(appointment_repository.STORAGE_BACKEND == "memory", reason="the memory backend issues no queries")
+def test_metrics_count_db_queries_per_route():
+    before = _sample(client.get("/v1/metrics").text, "db_queries_total",
+                     method="GET", route="/v1/appointments/details") or 0
+    client.get("/v1/appointments/details", params={"userPhoneNumber": "9400000001"})
+    after = _sample(client.get("/v1/metrics").text, "db_queries_total",
+                    method="GET", route="/v1/appointments/details")
+    assert after == before + 1
+
+def test_metrics_expose_pool_stats(database):
+    text = client.get("/v1/metrics").text
+    assert _sample(text, "db_pool_size", engine="sync") is not None
+    assert _sample(text, "db_pool_checked_out", engine="sync") == 0
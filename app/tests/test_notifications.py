@@ -0,0 +1,150 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.security import create_session_token
+from app.db.base import SessionLocal
+from app.main import app
+from app.services import notifications, sms_gateway
+from app.services.notification_worker import NotificationWorker, TokenBucket
+from app.services.sms_gateway import FakeSmsGateway, SendResult
+
+client = TestClient(app)
+
+# Notifications are queued in the database whatever the storage backend
+pytestmark = pytest.mark.usefixtures("database")
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Route new notifications to a fresh fake provider, so each test sees only its own messages"""
+    fake = FakeSmsGateway()
+    provider = f"fake-{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(sms_gateway, "SMS_PROVIDER", provider)
+    monkeypatch.setattr(notifications, "NOTIFICATION_BACKOFF_SECONDS", 0)
+    return provider, fake
+
+def _deliver(provider, fake):
+    worker = NotificationWorker(gateways={provider: fake})
+    return asyncio.run(worker.run_once())
+
+def _status(notification_id, phone):
+    session = {"Authorization": f"Bearer {create_session_token(phone)}"}
+    return client.get(f"/v1/notifications/{notification_id}", headers=session).json()
+
+def _booking_sms(phone):
+    return {
+        "appointmentDate": "2031-01-01",
+        "appointmentTime": "10:30:00",
+        "userPhoneNumber": phone,
+        "userName": "Test Patient",
+        "doctorName": "Dr. Test Doctor",
+        "userAddress": "Greams Road, Chennai",
+    }
+
+def test_sms_is_queued_and_delivered_by_the_worker(gateway):
+    provider, fake = gateway
+    response = client.post("/v1/notifications/sms/booking", json=_booking_sms("9100000001"))
+    assert response.status_code == 200
+    body = response.json()
+    assert body["smsSent"] is True
+    assert body["status"] == "queued"
+    assert fake.sent == []
+
+    assert _deliver(provider, fake) == 1
+    status = _status(body["notificationId"], "9100000001")
+    assert status["status"] == "sent"
+    assert status["attempts"] == 1
+    assert status["providerMessageId"].startswith("fake-")
+    assert [message.recipient for message in fake.sent] == ["9100000001"]
+
+def test_duplicate_sms_is_sent_once(gateway):
+    provider, fake = gateway
+    first = client.post("/v1/notifications/sms/booking", json=_booking_sms("9100000002")).json()
+    second = client.post("/v1/notifications/sms/booking", json=_booking_sms("9100000002")).json()
+    assert first["notificationId"] == second["notificationId"]
+
+    _deliver(provider, fake)
+    assert len(fake.sent) == 1
+
+def test_repeated_sms_after_the_dedupe_window_is_sent_again(gateway, monkeypatch):
+    provider, fake = gateway
+    first = client.post("/v1/notifications/sms/booking", json=_booking_sms("9100000004")).json()
+    later = notifications.time.time() + notifications.NOTIFICATION_DEDUPE_WINDOW_SECONDS
+    monkeypatch.setattr(notifications.time, "time", lambda: later)
+    second = client.post("/v1/notifications/sms/booking", json=_booking_sms("9100000004")).json()
+    assert first["notificationId"] != second["notificationId"]
+
+    _deliver(provider, fake)
+    assert len(fake.sent) == 2
+
+def test_status_requires_the_recipient_session(gateway):
+    queued = client.post("/v1/notifications/sms/booking", json=_booking_sms("9100000005")).json()
+    assert client.get(f"/v1/notifications/{queued['notificationId']}").status_code == 401
+    assert _status(queued["notificationId"], "9100000006") == {"detail": "Notification not found"}
+    assert _status(queued["notificationId"], "+91 91000 00005")["status"] == "queued"
+
+def test_finished_notifications_are_purged_after_the_retention_period(gateway):
+    provider, fake = gateway
+    queued = client.post("/v1/notifications/sms/booking", json=_booking_sms("9100000007")).json()
+    _deliver(provider, fake)
+    with SessionLocal() as db:
+        notifications.purge_finished(db)
+        assert notifications.get_notification(db, queued["notificationId"]) is not None
+        notifications.purge_finished(db, retention_days=-1)
+        assert notifications.get_notification(db, queued["notificationId"]) is None
+
+def test_failed_send_is_retried_then_given_up(gateway, otp_in_response):
+    provider, fake = gateway
+    fake.fail = lambda message: SendResult(message.notificationId, ok=False, error="gateway timeout")
+    otp = client.post("/v1/auth/send-otp", json={"userPhoneNumber": "9100000003"}).json()
+
+    _deliver(provider, fake)
+    status = _status(otp["notificationId"], "9100000003")
+    assert status["status"] == "queued"
+    assert status["lastError"] == "gateway timeout"
+
+    # Back online: the retry succeeds
+    fake.fail = None
+    _deliver(provider, fake)
+    status = _status(otp["notificationId"], "9100000003")
+    assert status["status"] == "sent"
+    assert status["attempts"] == 2
+    assert otp["sentOtp"] in fake.sent[0].message
+
+def test_permanent_failure_is_not_retried(gateway):
+    provider, fake = gateway
+    fake.fail = lambda message: SendResult(message.notificationId, ok=False, error="invalid number", retryable=False)
+    queued = client.post("/v1/notifications/sms/cancellation", json={
+        "appointmentDate": "2031-01-01", "appointmentTime": "10:30:00",
+        "userPhoneNumber": "000", "userName": "Test Patient",
+    }).json()
+
+    _deliver(provider, fake)
+    assert _deliver(provider, fake) == 0
+    status = _status(queued["notificationId"], "000")
+    assert status["status"] == "failed"
+    assert status["attempts"] == 1
+
+def test_messages_are_sent_in_batches(gateway):
+    provider, fake = gateway
+    fake.max_batch_size = 3
+    for n in range(5):
+        client.post("/v1/notifications/sms/booking", json=_booking_sms(f"91000001{n:02d}"))
+
+    assert _deliver(provider, fake) == 3
+    assert _deliver(provider, fake) == 2
+    assert [len(batch) for batch in fake.batches] == [3, 2]
+
+def test_unknown_notification_returns_404():
+    assert _status(999999999, "9100000001") == {"detail": "Notification not found"}
+
+def test_token_bucket_spaces_out_sends():
+    now = [0.0]
+    bucket = TokenBucket(rate=10, capacity=10, clock=lambda: now[0])
+    assert bucket.delay(10) == 0
+    # Empty: the next 5 tokens take half a second to refill
+    assert bucket.delay(5) == pytest.approx(0.5)
+    now[0] = 1.5
+    assert bucket.delay(5) == 0
@@ -0,0 +1,38 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.phone import normalize_phone, same_phone
+from app.main import app
+
+client = TestClient(app)
+
+@pytest.mark.parametrize("raw", [
+    "9876543210", "09876543210", "+91 98765 43210", "+91-98765-43210", "0091 9876543210", "+91 (0)98765 43210",
+])
+def test_normalize_phone_gives_e164(raw):
+    assert normalize_phone(raw) == "+919876543210"
+
+def test_normalize_phone_keeps_foreign_numbers_and_rejects_junk():
+    assert normalize_phone("+44 20 7946 0958") == "+442079460958"
+    assert normalize_phone("not a number") is None
+    assert normalize_phone("12345") is None
+    assert same_phone("098765 43210", "+919876543210")
+    assert not same_phone("9876543210", "9876543211")
+
+def test_details_lists_upcoming_appointments_however_the_phone_is_written():
+    request = {
+        "name": "Phone Patient", "department": "Cardiology", "doctorName": "Dr. Phone",
+        "userPhoneNumber": "91234 00001",
+    }
+    later = client.post("/v1/appointments/", json={**request, "patientId": "PHONE-2", "date": "2035-06-02", "time": "09:00:00"})
+    sooner = client.post("/v1/appointments/", json={**request, "patientId": "PHONE-1", "date": "2035-06-01", "time": "09:00:00"})
+    assert later.status_code == sooner.status_code == 201
+
+    details = client.get("/v1/appointments/details", params={"userPhoneNumber": "+91 9123400001"}).json()
+    assert details["appointmentAvailable"]
+    assert details["appointmentNumber"] == sooner.json()["appointmentId"]
+    assert [entry["appointmentNumber"] for entry in details["upcomingAppointments"]] == [sooner.json()["appointmentId"]]
+
+    both = client.get("/v1/appointments/details", params={"userPhoneNumber": "09123400001", "limit": 5}).json()
+    assert [entry["appointmentDate"] for entry in both["upcomingAppointments"]] == ["2035-06-01", "2035-06-02"]
+    assert client.get("/v1/appointments/details", params={"userPhoneNumber": "phone"}).status_code == 400
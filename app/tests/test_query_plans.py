@@ -0,0 +1,197 @@
+"""EXPLAIN every SQL statement each route issues and fail on sequential scans.
+
+Seeds the database behind DATABASE_URL with PLAN_SEED_ROWS appointments, so run it
+against a local Postgres only: QUERY_PLAN_TESTS=1 python -m pytest app/tests/test_query_plans.py
+"""
+import json
+import os
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.core.security import create_session_token
+from app.db import base as db_base
+from app.db.base import SessionLocal
+from app.main import app
+from app.services import cache, schedule
+from app.services.id_allocator import AppointmentIdAllocator
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("QUERY_PLAN_TESTS") != "1",
+    reason="seeds the database; set QUERY_PLAN_TESTS=1 to run against a local Postgres",
+)
+
+PLAN_SEED_ROWS = int(os.getenv("PLAN_SEED_ROWS", "20000"))
+SEED_START = date(2040, 1, 1)
+WATCHED_TABLES = {"appointments", "slot_capacity"}
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def seeded_ids():
+    engine = db_base.get_engine()
+    # IDs must come from the allocator, or they could clash with blocks reserved by the app
+    with SessionLocal() as db:
+        seed_allocator = AppointmentIdAllocator(block_size=PLAN_SEED_ROWS)
+        ids = [seed_allocator.allocate(db) for _ in range(PLAN_SEED_ROWS)]
+        db.commit()
+    with engine.begin() as connection:
+        # Every (doctor, date, time) is seeded at most once, as uq_appointments_active_slot requires
+        connection.execute(text("""
+            INSERT INTO appointments ("appointmentId", "patientId", "name", "date", "time",
+                                      "department", "doctorName", "userPhoneNumber", "phone_normalized", "isCancelled")
+            SELECT id, 'PLAN-' || n, 'Plan Patient ' || n,
+                   CAST(:start AS DATE) + CAST(n % 365 AS INTEGER), TIME '09:00' + make_interval(mins => CAST(n / 365 AS INTEGER) * 5),
+                   'Department ' || (n % 5), 'Dr. Plan ' || (n % 20), '90000' || lpad(CAST(n AS TEXT), 5, '0'),
+                   '+9190000' || lpad(CAST(n AS TEXT), 5, '0'), n % 10 = 0
+            FROM unnest(CAST(:ids AS VARCHAR[])) WITH ORDINALITY AS seeded(id, n)
+        """), {"start": SEED_START, "ids": ids})
+        connection.execute(text("""
+            INSERT INTO slot_capacity ("date", "doctorName", "department", "bookedCount")
+            SELECT "date", "doctorName", "department", COUNT(*)
+            FROM appointments
+            WHERE "patientId" LIKE 'PLAN-%' AND NOT "isCancelled"
+            GROUP BY "date", "doctorName", "department"
+            ON CONFLICT ("date", "doctorName", "department")
+            DO UPDATE SET "bookedCount" = slot_capacity."bookedCount" + EXCLUDED."bookedCount"
+        """))
+        connection.execute(text("ANALYZE slot_capacity"))
+    # VACUUM sets the visibility map, without which index-only scans read the heap anyway
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE appointments"))
+    # Dr. Plan 3 (Department 3) works every day, so free-slot searches read the seeded bookings
+    with SessionLocal() as db:
+        schedule.load_schedule_config(db, {"departments": [{"name": "Department 3", "doctors": [{
+            "name": "Dr. Plan 3",
+            "templates": [{"weekdays": list(range(7)), "start": "09:00", "end": "18:00", "slotMinutes": 15}],
+        }]}]})
+    yield ids
+    with engine.begin() as connection:
+        connection.execute(text("""
+            DELETE FROM doctors WHERE name = 'Dr. Plan 3'
+        """))
+        connection.execute(text("""
+            DELETE FROM departments WHERE name = 'Department 3'
+              AND NOT EXISTS (SELECT 1 FROM doctors d WHERE d."departmentId" = departments."departmentId")
+        """))
+        connection.execute(text("""
+            WITH removed AS (
+                DELETE FROM appointments WHERE "patientId" LIKE 'PLAN-%'
+                RETURNING "date", "doctorName", "department", "isCancelled"
+            )
+            UPDATE slot_capacity s SET "bookedCount" = s."bookedCount" - r.booked
+            FROM (
+                SELECT "date", "doctorName", "department", COUNT(*) AS booked
+                FROM removed WHERE NOT "isCancelled"
+                GROUP BY "date", "doctorName", "department"
+            ) r
+            WHERE s."date" = r."date" AND s."doctorName" = r."doctorName" AND s."department" = r."department"
+        """))
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    # Cached lookups would skip the queries under test
+    monkeypatch.setattr(cache, "cache", cache.NullCache())
+
+@pytest.fixture
+def captured_plans(engine):
+    """Collect (statement, plan) for each statement, explained just before it runs"""
+    plans = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")):
+            return
+        explain_cursor = cursor.connection.cursor()
+        explain_cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plans.append((statement, explain_cursor.fetchone()[0][0]["Plan"]))
+        explain_cursor.close()
+
+    event.listen(engine, "before_cursor_execute", explain)
+    yield plans
+    event.remove(engine, "before_cursor_execute", explain)
+
+def _sequential_scans(plan):
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in WATCHED_TABLES:
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from _sequential_scans(child)
+
+def _booking(patient_id: str):
+    return {
+        "patientId": patient_id,
+        "name": "Plan Patient",
+        "date": (SEED_START + timedelta(days=10)).isoformat(),
+        "time": "10:30:00",
+        "department": "Department 1",
+        "doctorName": "Dr. Plan 1",
+        "userPhoneNumber": "9000000001",
+    }
+
+# Session of the phone number seeded for patient PLAN-42
+PLAN_42_SESSION = {"Authorization": f"Bearer {create_session_token('9000000042')}"}
+
+# Each route is called with the seeded IDs; ids[n - 1] belongs to patient PLAN-n
+ROUTES = {
+    "list": lambda ids: client.get("/v1/appointments/"),
+    "list_filtered": lambda ids: client.get("/v1/appointments/", params={
+        "dateFrom": SEED_START.isoformat(), "dateTo": (SEED_START + timedelta(days=2)).isoformat(),
+        "doctorName": "Dr. Plan 3",
+    }),
+    "list_by_patient": lambda ids: client.get("/v1/appointments/", params={"patientId": "PLAN-42"}),
+    "availability": lambda ids: client.get("/v1/appointments/availability", params={
+        "appointmentDate": (SEED_START + timedelta(days=3)).isoformat(),
+    }),
+    # Dr. Plan 1 has no schedule: the booked count comes from slot_capacity
+    "availability_by_doctor": lambda ids: client.get("/v1/appointments/availability", params={
+        "appointmentDate": (SEED_START + timedelta(days=3)).isoformat(), "doctorName": "Dr. Plan 1",
+    }),
+    "availability_range": lambda ids: client.get("/v1/appointments/availability/range", params={
+        "from": SEED_START.isoformat(), "to": (SEED_START + timedelta(days=30)).isoformat(), "doctor": "Dr. Plan 1",
+    }),
+    "availability_range_scheduled": lambda ids: client.get("/v1/appointments/availability/range", params={
+        "from": SEED_START.isoformat(), "to": (SEED_START + timedelta(days=30)).isoformat(), "department": "Department 3",
+    }),
+    "free_slots": lambda ids: client.get("/v1/appointments/free-slots", params={
+        "department": "Department 3", "dateFrom": SEED_START.isoformat(), "days": 30,
+    }),
+    # Department 3 has a schedule: the first free slot is searched among its doctors' templates
+    "availability_scheduled": lambda ids: client.get("/v1/appointments/availability", params={
+        "appointmentDate": (SEED_START + timedelta(days=3)).isoformat(), "department": "Department 3",
+    }),
+    "booking_details": lambda ids: client.get("/v1/appointments/booking-details", params={"appointmentNumber": ids[41]}),
+    "details_by_phone": lambda ids: client.get("/v1/appointments/details", params={"userPhoneNumber": "9000000042"}),
+    "by_id": lambda ids: client.get(f"/v1/appointments/{ids[41]}"),
+    "reschedule": lambda ids: client.get(f"/v1/appointments/{ids[41]}/reschedule", headers=PLAN_42_SESSION),
+    "cancellation": lambda ids: client.get(f"/v1/appointments/{ids[41]}/cancellation", headers=PLAN_42_SESSION),
+    "create": lambda ids: client.post("/v1/appointments/", json=_booking("PLAN-7")),
+    "patch": lambda ids: client.patch(f"/v1/appointments/{ids[7]}", json={"name": "Renamed"}),
+    "hold": lambda ids: client.post("/v1/appointments/holds", json={
+        "doctorName": "Dr. Plan 1", "department": "Department 1",
+        "date": (SEED_START + timedelta(days=11)).isoformat(), "time": "10:35:00",
+    }),
+    "bulk": lambda ids: client.post("/v1/appointments/bulk", json=[_booking("PLAN-9"), _booking("PLAN-NEW-1")]),
+}
+
+@pytest.mark.parametrize("route", sorted(ROUTES))
+def test_route_queries_use_indexes(route, seeded_ids, captured_plans):
+    response = ROUTES[route](seeded_ids)
+    assert response.status_code < 500, response.text
+    assert captured_plans, f"{route} issued no SQL"
+    for statement, plan in captured_plans:
+        scans = list(_sequential_scans(plan))
+        assert not scans, f"{route} scans {scans} sequentially:\n{statement}\n{json.dumps(plan, indent=2)}"
+
+def _node_types(plan):
+    yield plan.get("Node Type")
+    for child in plan.get("Plans", []):
+        yield from _node_types(child)
+
+def test_details_by_phone_is_an_index_only_scan(seeded_ids, captured_plans):
+    # Any way of writing the number reaches the same index entries
+    response = client.get("/v1/appointments/details", params={"userPhoneNumber": "+91 90000 00043", "limit": 3})
+    assert response.status_code == 200, response.text
+    assert response.json()["appointmentNumber"] == seeded_ids[42]
+    lookups = [plan for statement, plan in captured_plans if "phone_normalized" in statement]
+    assert lookups and "Index Only Scan" in set(_node_types(lookups[0])), json.dumps(lookups, indent=2)
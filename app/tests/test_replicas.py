@@ -0,0 +1,96 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import Response
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.db import replicas
+from app.db.base import SessionLocal
+from app.main import app
+from app.schemas.appointment import Appointment
+from app.services import appointment_cache, appointment_repository, cache
+from app.services.appointment_repository import SqlAppointmentRepository
+from app.services.cache import MemoryCache
+
+def _request(cookie: str = "") -> Request:
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+def _replica(monkeypatch, name: str, lag):
+    replica = replicas.Replica(name, "postgresql://replica.invalid/appointments")
+    monkeypatch.setattr(replica, "measure_lag", lambda: lag)
+    monkeypatch.setattr(replica, "ameasure_lag", lambda: asyncio.sleep(0, lag))
+    return replica
+
+def test_reads_skip_lagging_and_unreachable_replicas(monkeypatch):
+    lagging = _replica(monkeypatch, "lagging", replicas.REPLICA_MAX_LAG_SECONDS + 1)
+    down = _replica(monkeypatch, "down", None)
+    healthy = _replica(monkeypatch, "healthy", 0.2)
+    monkeypatch.setattr(replicas, "replicas", [lagging, down, healthy])
+    assert asyncio.run(replicas.choose_replica()) is healthy
+    assert asyncio.run(replicas.choose_replica()) is healthy
+
+    # Every replica behind: fall back to the primary
+    monkeypatch.setattr(replicas, "replicas", [lagging, down])
+    assert asyncio.run(replicas.choose_replica()) is None
+
+def test_lag_is_measured_at_most_once_per_check_interval(monkeypatch):
+    checks = []
+    replica = replicas.Replica("counted", "postgresql://replica.invalid/appointments")
+    monkeypatch.setattr(replica, "measure_lag", lambda: checks.append(1) or 0.0)
+    monkeypatch.setattr(replica, "ameasure_lag", lambda: asyncio.sleep(0, checks.append(1) or 0.0))
+    monkeypatch.setattr(replicas, "replicas", [replica])
+    for _ in range(5):
+        assert asyncio.run(replicas.choose_replica()) is replica
+    assert len(checks) == 1
+
+def test_writes_pin_the_callers_reads_to_the_primary(monkeypatch):
+    monkeypatch.setattr(replicas, "replicas", [_replica(monkeypatch, "healthy", 0.0)])
+    response = Response()
+    replicas.pin_reads_to_primary(response)
+    cookie = response.headers["set-cookie"].split(";")[0]
+    assert cookie.startswith(f"{replicas.PRIMARY_COOKIE}=")
+    assert replicas.reads_pinned_to_primary(_request(cookie))
+    assert not replicas.reads_pinned_to_primary(_request(f"{replicas.PRIMARY_COOKIE}=1"))
+    assert not replicas.reads_pinned_to_primary(_request())
+
+def test_write_routes_set_the_primary_cookie(monkeypatch):
+    monkeypatch.setattr(replicas, "replicas", [_replica(monkeypatch, "healthy", 0.0)])
+    response = TestClient(app).post("/v1/appointments/", json={
+        "patientId": "PAT-REPLICA-1", "name": "Replica Patient", "date": "2031-02-03", "time": "09:45:00",
+        "department": "Cardiology", "doctorName": "Dr. Replica", "userPhoneNumber": "9000000301",
+    })
+    assert response.status_code == 201
+    assert response.cookies.get(replicas.PRIMARY_COOKIE)
+
+@pytest.mark.skipif(not os.getenv("DATABASE_URL", "").startswith("postgresql"), reason="needs PostgreSQL")
+def test_lag_query_reports_zero_on_a_primary():
+    replica = replicas.Replica("primary-as-replica", os.environ["DATABASE_URL"])
+    try:
+        assert replica.measure_lag() == 0.0
+    finally:
+        asyncio.run(replica.dispose())
+
+@pytest.mark.skipif(appointment_repository.STORAGE_BACKEND == "memory", reason="replicas only serve the SQL backend")
+def test_pinned_reads_bypass_the_cache_and_replica_reads_do_not_fill_it(monkeypatch):
+    monkeypatch.setattr(cache, "cache", MemoryCache(max_entries=10))
+    created = TestClient(app).post("/v1/appointments/", json={
+        "patientId": "PAT-REPLICA-2", "name": "Replica Patient", "date": "2031-02-04", "time": "09:45:00",
+        "department": "Cardiology", "doctorName": "Dr. Replica", "userPhoneNumber": "9000000302",
+    }).json()
+    appointmentId = created["appointmentId"]
+    stale = Appointment(**{**created, "name": "Before The Write"})
+    asyncio.run(appointment_cache.remember_appointment(stale))
+
+    with SessionLocal() as db:
+        db.info[replicas.READ_SOURCE] = replicas.READ_FROM_PINNED_PRIMARY
+        fresh = asyncio.run(appointment_cache.get_appointment(SqlAppointmentRepository(db), appointmentId))
+    assert fresh.name == "Replica Patient"
+
+    asyncio.run(appointment_cache.invalidate_appointments(appointmentId))
+    with SessionLocal() as db:
+        db.info[replicas.READ_SOURCE] = replicas.READ_FROM_REPLICA
+        asyncio.run(appointment_cache.get_appointment(SqlAppointmentRepository(db), appointmentId))
+    assert asyncio.run(cache.get_json(appointment_cache.appointment_key(appointmentId))) is None
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import date, time, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.phone import normalize_phone
+from app.main import app
+from app.schemas.appointment import Appointment, AppointmentCreateRequest, AppointmentFilters, SlotHoldRequest
+from app.services import reservations, slot_capacity
+from app.services.appointment_repository import (
+    MemoryAppointmentRepository, get_read_repository, get_repository, load_snapshot
+)
+
+DAY = date.today() + timedelta(days=1)
+
+def booking(patientId: str, hour: int, **fields) -> AppointmentCreateRequest:
+    values = {
+        "patientId": patientId, "name": "Memory Patient", "date": DAY, "time": time(hour, 0),
+        "department": "Cardiology", "doctorName": "Dr. Memory", "userPhoneNumber": f"98765{hour:05d}",
+    }
+    values.update(fields)
+    return AppointmentCreateRequest(**values)
+
+def test_memory_repository_books_replaces_and_rejects_taken_slots():
+    repository = MemoryAppointmentRepository()
+    first, replaced = asyncio.run(repository.create_appointment(booking("MEM-1", 9)))
+    assert replaced == []
+    with pytest.raises(reservations.SlotUnavailableError):
+        asyncio.run(repository.create_appointment(booking("MEM-2", 9)))
+
+    # Rebooking replaces the patient's appointment and frees its slot
+    second, replaced = asyncio.run(repository.create_appointment(booking("MEM-1", 10)))
+    assert replaced == [first.appointmentId]
+    assert asyncio.run(repository.get_appointment(first.appointmentId)) is None
+    asyncio.run(repository.create_appointment(booking("MEM-2", 9)))
+    assert asyncio.run(repository.get_booked_count(DAY, "Dr. Memory", None)) == 2
+
+    cancelled = asyncio.run(repository.patch_appointment(second.appointmentId, {"isCancelled": True}))
+    assert cancelled.isCancelled
+    assert asyncio.run(repository.list_upcoming_appointments_by_phone(
+        normalize_phone(second.userPhoneNumber), (DAY, time(0)), 5
+    )) == []
+    assert asyncio.run(repository.get_booked_count(DAY, None, "Cardiology")) == 1
+
+def test_memory_repository_holds_slots_and_imports():
+    repository = MemoryAppointmentRepository()
+    hold = asyncio.run(repository.hold_slot(SlotHoldRequest(
+        doctorName="Dr. Memory", department="Cardiology", date=DAY, time=time(9, 0), patientId="MEM-HOLD"
+    )))
+    with pytest.raises(reservations.SlotUnavailableError):
+        asyncio.run(repository.create_appointment(booking("MEM-OTHER", 9)))
+    with pytest.raises(reservations.SlotUnavailableError):
+        asyncio.run(repository.create_appointment(booking("MEM-OTHER", 9, holdId=hold.holdId)))
+    asyncio.run(repository.create_appointment(booking("MEM-HOLD", 9, holdId=hold.holdId)))
+    assert not asyncio.run(repository.release_hold(hold.holdId))
+
+    asyncio.run(repository.hold_slot(SlotHoldRequest(
+        doctorName="Dr. Memory", department="Cardiology", date=DAY, time=time(11, 0)
+    )))
+    result = asyncio.run(repository.import_appointments([
+        booking("MEM-HOLD", 10).dict(exclude={"holdId"}),
+        booking("MEM-BULK", 11).dict(exclude={"holdId"}),
+        {"patientId": "MEM-BAD"},
+    ]))
+    assert (result["imported"], [error["row"] for error in result["errors"]]) == (1, [2, 3])
+    # The imported row replaced the patient's booking, which went to the archive
+    assert [entry.archiveReason for entry in asyncio.run(repository.list_archived_appointments(None, "MEM-HOLD", 5))] == ["replaced"]
+
+    # Exported rows keep their ID and cancellation, and a cancelled row does not need a free slot
+    cancelled = {**booking("MEM-CANCELLED", 11).dict(exclude={"holdId"}), "appointmentId": "123456", "isCancelled": "t"}
+    assert asyncio.run(repository.import_appointments([cancelled]))["imported"] == 1
+    assert asyncio.run(repository.get_appointment("123456")).isCancelled
+
+def test_memory_repository_pages_and_finds_next_available_date():
+    repository = MemoryAppointmentRepository()
+    for hour in range(slot_capacity.MAX_APPOINTMENTS_PER_DAY):
+        asyncio.run(repository.create_appointment(booking(f"MEM-{hour}", 8 + hour)))
+    filters = AppointmentFilters(dateFrom=DAY, dateTo=DAY)
+    page = asyncio.run(repository.list_appointments(filters, 4))
+    rest = asyncio.run(repository.list_appointments(filters, 100, (page[-1].date, page[-1].time, page[-1].appointmentId)))
+    assert [appointment.time.hour for appointment in page + rest] == list(range(8, 8 + slot_capacity.MAX_APPOINTMENTS_PER_DAY))
+    assert asyncio.run(repository.find_next_available_date(DAY - timedelta(days=1), "Dr. Memory", None)) == (
+        DAY + timedelta(days=1), 0
+    )
+
+def test_routes_serve_from_memory_repository(tmp_path):
+    repository = MemoryAppointmentRepository()
+    snapshot = tmp_path / "appointments.ndjson"
+    stored = Appointment(appointmentId="424242", isCancelled=False, **booking("MEM-SNAP", 11).dict(exclude={"holdId"}))
+    snapshot.write_text(stored.json() + "\n")
+    assert load_snapshot(repository, str(snapshot)) == 1
+
+    app.dependency_overrides[get_repository] = lambda: repository
+    app.dependency_overrides[get_read_repository] = lambda: repository
+    try:
+        client = TestClient(app)
+        details = client.get("/v1/appointments/details", params={"userPhoneNumber": stored.userPhoneNumber})
+        assert details.json()["appointmentNumber"] == "424242"
+        created = client.post("/v1/appointments/", content=booking("MEM-NEW", 12).json(exclude={"holdId"}))
+        assert created.status_code == 201
+        availability = client.get(
+            "/v1/appointments/availability", params={"appointmentDate": DAY.isoformat(), "doctorName": "Dr. Memory"}
+        )
+        assert availability.json()["appointmentTime"] == "11:00:00"
+        calendar = client.get(
+            "/v1/appointments/availability/range", params={"from": DAY.isoformat(), "to": DAY.isoformat()}
+        )
+        assert calendar.json()["days"][0]["booked"] == 2
+    finally:
+        # Under STORAGE_BACKEND=memory both are the same dependency
+        app.dependency_overrides.pop(get_repository, None)
+        app.dependency_overrides.pop(get_read_repository, None)
@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import reservations
+
+client = TestClient(app)
+
+CONCURRENT_CLIENTS = 500
+
+@pytest.fixture
+def slot():
+    """A slot no other test books: a unique doctor far in the future"""
+    return {
+        "date": (date.today() + timedelta(days=600)).isoformat(),
+        "time": "10:00:00",
+        "department": "Cardiology",
+        "doctorName": f"Dr. Hot Slot {uuid.uuid4().hex[:8]}",
+    }
+
+def _booking(slot, patient_id, **extra):
+    return {**slot, "patientId": patient_id, "name": "Race Patient", "userPhoneNumber": "9400000001", **extra}
+
+def _active_bookings(slot):
+    # Through the API, so the count comes from whichever storage backend serves the routes
+    listed = client.get("/v1/appointments/", params={"doctorName": slot["doctorName"], "isCancelled": False})
+    return len(listed.json())
+
+def test_exactly_one_of_many_concurrent_bookings_wins(slot):
+    async def hammer():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post("/v1/appointments/", json=_booking(slot, f"PAT-RACE-{slot['doctorName'][-8:]}-{index}"))
+                for index in range(CONCURRENT_CLIENTS)
+            ))
+
+    responses = asyncio.run(hammer())
+    assert Counter(response.status_code for response in responses) == {201: 1, 409: CONCURRENT_CLIENTS - 1}
+    assert _active_bookings(slot) == 1
+
+def test_hold_reserves_slot_until_confirmed(slot):
+    hold = client.post("/v1/appointments/holds", json={**slot, "patientId": "PAT-HOLD-1"})
+    assert hold.status_code == 201
+    hold_id = hold.json()["holdId"]
+
+    assert client.post("/v1/appointments/holds", json=slot).status_code == 409
+    assert client.post("/v1/appointments/", json=_booking(slot, "PAT-HOLD-2")).status_code == 409
+    assert client.post("/v1/appointments/", json=_booking(slot, "PAT-HOLD-2", holdId=hold_id)).status_code == 409
+
+    confirmed = client.post("/v1/appointments/", json=_booking(slot, "PAT-HOLD-1", holdId=hold_id))
+    assert confirmed.status_code == 201
+    assert client.delete(f"/v1/appointments/holds/{hold_id}").status_code == 404
+    assert client.post("/v1/appointments/holds", json=slot).status_code == 409
+
+def test_expired_or_released_hold_frees_slot(slot, monkeypatch):
+    released = client.post("/v1/appointments/holds", json=slot).json()["holdId"]
+    assert client.delete(f"/v1/appointments/holds/{released}").status_code == 204
+
+    monkeypatch.setattr(reservations, "SLOT_HOLD_SECONDS", -1)
+    expired = client.post("/v1/appointments/holds", json=slot).json()["holdId"]
+    assert client.post("/v1/appointments/", json=_booking(slot, "PAT-HOLD-3", holdId=expired)).status_code == 409
+    assert client.post("/v1/appointments/", json=_booking(slot, "PAT-HOLD-3")).status_code == 201
+
+def test_moving_or_importing_into_a_taken_slot_conflicts(slot):
+    taken = client.post("/v1/appointments/", json=_booking(slot, "PAT-TAKEN-1")).json()
+    other = client.post("/v1/appointments/", json=_booking({**slot, "doctorName": f"{slot['doctorName']} B"}, "PAT-TAKEN-2")).json()
+    assert client.patch(f"/v1/appointments/{other['appointmentId']}", json={"doctorName": slot["doctorName"]}).status_code == 409
+
+    result = client.post("/v1/appointments/bulk", json=[_booking(slot, "PAT-TAKEN-3")]).json()
+    assert result["imported"] == 0
+    assert result["errors"][0]["row"] == 1
+
+    # Cancelling frees the slot for the next booking
+    assert client.patch(f"/v1/appointments/{taken['appointmentId']}", json={"isCancelled": True}).status_code == 200
+    assert client.post("/v1/appointments/", json=_booking(slot, "PAT-TAKEN-4")).status_code == 201
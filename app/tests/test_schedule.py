@@ -0,0 +1,96 @@
+import time as timer
+import uuid
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.base import SessionLocal
+from app.main import app
+from app.services import appointment_repository, schedule
+from app.services.schedule import DoctorSchedule
+
+client = TestClient(app)
+
+MONDAY = date(2031, 1, 6)
+
+def _template(weekday=0, start="09:00", end="11:00", slot=30, break_start=None, break_end=None):
+    return SimpleNamespace(
+        weekday=weekday, startTime=time.fromisoformat(start), endTime=time.fromisoformat(end), slotMinutes=slot,
+        breakStart=time.fromisoformat(break_start) if break_start else None,
+        breakEnd=time.fromisoformat(break_end) if break_end else None,
+        validFrom=None, validTo=None,
+    )
+
+def _free(doctor, days=1, booked=(), not_before=None):
+    bitmap = schedule.free_slot_bitmap(doctor, MONDAY, days, list(booked), not_before)
+    return [
+        (MONDAY + timedelta(days=bit // schedule.CELLS_PER_DAY), (bit % schedule.CELLS_PER_DAY) * schedule.SLOT_GRID_MINUTES)
+        for bit in schedule.iter_bits(bitmap)
+    ]
+
+def test_bitmap_skips_breaks_bookings_and_leave():
+    doctor = DoctorSchedule(1, "Dr. Bitmap", "Cardiology", templates=[
+        _template(weekday=0, break_start="10:00", break_end="10:30"),
+        _template(weekday=1, start="14:00", end="15:00", slot=20),
+    ])
+    assert _free(doctor) == [(MONDAY, 540), (MONDAY, 570), (MONDAY, 630)]
+
+    # A booking inside a slot, not at its start, still takes the slot
+    assert _free(doctor, booked=[(MONDAY, time(9, 40))]) == [(MONDAY, 540), (MONDAY, 630)]
+
+    tuesday = MONDAY + timedelta(days=1)
+    assert [minutes for day, minutes in _free(doctor, days=2) if day == tuesday] == [840, 860, 880]
+    doctor.leaves.append((tuesday, tuesday))
+    assert all(day == MONDAY for day, _ in _free(doctor, days=2))
+
+def test_bitmap_hides_slots_that_already_started():
+    doctor = DoctorSchedule(1, "Dr. Bitmap", "Cardiology", templates=[_template()])
+    assert _free(doctor, not_before=datetime.combine(MONDAY, time(9, 1))) == [(MONDAY, 570), (MONDAY, 600), (MONDAY, 630)]
+
+@pytest.fixture
+def department():
+    """A department with two doctors working every day, unique to the test"""
+    name = f"Schedule Dept {uuid.uuid4().hex[:8]}"
+    everyday = list(range(7))
+    config = {"departments": [{"name": name, "doctors": [
+        {"name": f"Dr. Early {name}", "templates": [{"weekdays": everyday, "start": "09:00", "end": "10:00", "slotMinutes": 30}]},
+        {"name": f"Dr. Late {name}", "templates": [{"weekdays": everyday, "start": "09:15", "end": "10:15", "slotMinutes": 30}]},
+    ]}]}
+    with SessionLocal() as db:
+        schedule.load_schedule_config(db, config)
+    return name
+
+@pytest.mark.skipif(appointment_repository.STORAGE_BACKEND == "memory", reason="doctor schedules are only read from SQL")
+def test_free_slots_merge_doctors_in_time_order(department):
+    start = date.today() + timedelta(days=500)
+    booking = {
+        "patientId": f"PAT-SCHED-{uuid.uuid4().hex[:8]}", "name": "Schedule Patient", "date": start.isoformat(),
+        "time": "09:00:00", "department": department, "doctorName": f"Dr. Early {department}",
+        "userPhoneNumber": "9300000001",
+    }
+    assert client.post("/v1/appointments/", json=booking).status_code == 201
+
+    response = client.get("/v1/appointments/free-slots", params={
+        "department": department, "dateFrom": start.isoformat(), "days": 2, "limit": 4,
+    })
+    assert response.status_code == 200
+    assert [(slot["time"], slot["doctorName"].split()[1]) for slot in response.json()] == [
+        ("09:15:00", "Late"), ("09:30:00", "Early"), ("09:45:00", "Late"), ("09:00:00", "Early"),
+    ]
+
+    availability = client.get("/v1/appointments/availability", params={
+        "appointmentDate": start.isoformat(), "department": department,
+    }).json()
+    assert availability == {
+        "slotAvailable": True, "appointmentTime": "09:15:00", "doctorName": f"Dr. Late {department}",
+        "nextAvailableSlot": None,
+    }
+
+@pytest.mark.skipif(appointment_repository.STORAGE_BACKEND == "memory", reason="doctor schedules are only read from SQL")
+def test_next_free_slots_over_thirty_days_is_fast(department):
+    started = timer.perf_counter()
+    response = client.get("/v1/appointments/free-slots", params={"department": department, "days": 30, "limit": 20})
+    assert len(response.json()) == 20
+    assert timer.perf_counter() - started < 0.5
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import server
+from app.db import base
+from app.main import app
+from app.services import appointment_cache, appointment_repository
+
+def test_cgroup_v2_limits(tmp_path):
+    (tmp_path / "cpu.max").write_text("50000 100000\n")
+    (tmp_path / "memory.max").write_text(f"{512 * 1024 * 1024}\n")
+    assert server.cpu_limit(str(tmp_path)) == 0.5
+    assert server.memory_limit(str(tmp_path)) == 512 * 1024 * 1024
+
+def test_cgroup_v1_and_unlimited(tmp_path):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (tmp_path / "memory").mkdir()
+    (tmp_path / "memory" / "memory.limit_in_bytes").write_text("9223372036854771712\n")
+    assert server.cpu_limit(str(tmp_path)) >= 1
+    assert server.memory_limit(str(tmp_path)) is None
+
+def test_worker_count_fits_cpu_and_memory():
+    # The production compose file: 0.5 CPU and 512 MB per replica
+    assert server.worker_count(0.5, 512 * 1024 * 1024, worker_memory_mb=160) == 1
+    assert server.worker_count(4, None) == 4
+    assert server.worker_count(8, 512 * 1024 * 1024, worker_memory_mb=160) == 3
+    assert server.worker_count(2, 64 * 1024 * 1024, worker_memory_mb=160) == 1
+
+@pytest.mark.skipif(appointment_repository.STORAGE_BACKEND == "memory", reason="the memory backend warms nothing")
+def test_lifespan_warms_pool_and_cache(monkeypatch):
+    warmed = []
+
+    async def warm_appointments(db):
+        warmed.append(db)
+        return 0
+
+    monkeypatch.setattr(appointment_cache, "warm_appointments", warm_appointments)
+    base.engine.dispose()
+    with TestClient(app) as client:
+        assert base.engine.pool.checkedin() == min(base.DB_POOL_WARM, base.DB_POOL_SIZE)
+        assert client.get("/v1/health").status_code == 200
+    assert len(warmed) == 1
+    # Shutdown closes the pooled connections
+    assert base.engine.pool.checkedin() == 0
+
+def test_app_imports_and_serves_health_without_a_database():
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    script = (
+        "from fastapi.testclient import TestClient\n"
+        "from app.db import base\n"
+        "from app.main import app\n"
+        "assert TestClient(app).get('/v1/health').status_code == 200\n"
+        "assert base._engine is None\n"
+    )
+    subprocess.run([sys.executable, "-c", script], env=env, check=True, capture_output=True)
@@ -0,0 +1,98 @@
+"""Measure how long a fresh API process takes to import and to answer its first health check.
+
+    python -m benchmarks.coldstart --runs 5 --command "gunicorn app.main:app" --port 8000 --output coldstart.json
+
+Each run starts the server command with PORT set, polls /v1/health until it returns 200 and
+stops the server with SIGTERM. The environment (DATABASE_URL, DB_SSLMODE, ...) is passed through,
+so point it at the same database as a real replica. Import time is measured separately in a
+fresh interpreter and needs no database.
+"""
+from typing import Any, Dict, List
+import argparse
+import json
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.loadtest import API_PREFIX, percentile
+
+logger = logging.getLogger(__name__)
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+def measure_import() -> float:
+    """Seconds to import app.main in a new interpreter"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], check=True, capture_output=True, text=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+def measure_first_healthy(command: str, port: int, timeout: float) -> float:
+    """Seconds from starting `command` until GET /v1/health returns 200"""
+    url = f"http://127.0.0.1:{port}{API_PREFIX}/health"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        shlex.split(command), env={**os.environ, "PORT": str(port)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"{command!r} exited with status {process.returncode}")
+            try:
+                if httpx.get(url, timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.02)
+        raise TimeoutError(f"{url} was not healthy after {timeout}s")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+def summarize_seconds(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "runs": len(ordered),
+        "p50": round(percentile(ordered, 50), 3),
+        "p95": round(percentile(ordered, 95), 3),
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # One line per health poll would bury the results
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description="Measure API import time and time to first healthy response")
+    parser.add_argument("--command", default="uvicorn app.main:app --port $PORT",
+                        help="server command; $PORT is replaced by --port")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for a healthy response")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    command = args.command.replace("$PORT", str(args.port))
+    imports, healthy = [], []
+    for run in range(args.runs):
+        imports.append(measure_import())
+        healthy.append(measure_first_healthy(command, args.port, args.timeout))
+        logger.info("Run %s: import %.3fs, first healthy response %.3fs", run + 1, imports[-1], healthy[-1])
+
+    results: Dict[str, Any] = {
+        "command": command,
+        "importSeconds": summarize_seconds(imports),
+        "firstHealthySeconds": summarize_seconds(healthy),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info("Results written to %s", args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare two benchmarks.loadtest result files and fail on latency or throughput regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.15
+
+Exits with status 1 when any scenario regressed by more than the threshold.
+"""
+from typing import Any, Dict, List
+import argparse
+import json
+import sys
+
+# Scenarios with fewer requests than this in either run are too noisy to compare
+MIN_REQUESTS = 50
+
+# Allowed increase in the share of failed requests (1 percentage point)
+ERROR_RATE_TOLERANCE = 0.01
+
+def find_regressions(
+    baseline: Dict[str, Any],
+    candidate: Dict[str, Any],
+    threshold: float,
+    min_requests: int = MIN_REQUESTS,
+) -> List[str]:
+    """Describe each scenario whose p95/p99 latency or throughput got worse by more than `threshold`, or whose error rate rose"""
+    regressions = []
+    for name, before in baseline["endpoints"].items():
+        after = candidate["endpoints"].get(name)
+        if after is None or min(before["requests"], after["requests"]) < min_requests:
+            continue
+        for metric in ("p95", "p99"):
+            old, new = before["latencyMs"][metric], after["latencyMs"][metric]
+            if old and new > old * (1 + threshold):
+                regressions.append(f"{name}: {metric} {old}ms -> {new}ms (+{(new / old - 1):.0%})")
+        if before["throughput"] and after["throughput"] < before["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput']} -> {after['throughput']} req/s")
+        old_rate = before["errors"] / before["requests"]
+        new_rate = after["errors"] / after["requests"]
+        if new_rate > old_rate + ERROR_RATE_TOLERANCE:
+            regressions.append(f"{name}: error rate {old_rate:.2%} -> {new_rate:.2%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two load test results")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression (0.10 = 10%%)")
+    parser.add_argument("--min-requests", type=int, default=MIN_REQUESTS)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{'scenario':<24}{'p95 before':>12}{'p95 after':>12}{'p99 before':>12}{'p99 after':>12}")
+    for name, before in baseline["endpoints"].items():
+        after = candidate["endpoints"].get(name)
+        if after is not None:
+            print(f"{name:<24}{before['latencyMs']['p95']:>12}{after['latencyMs']['p95']:>12}"
+                  f"{before['latencyMs']['p99']:>12}{after['latencyMs']['p99']:>12}")
+
+    regressions = find_regressions(baseline, candidate, args.threshold, args.min_requests)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Drive the booking API with a weighted mix of requests and record latency per endpoint.
+
+    python -m benchmarks.loadtest --base-url http://localhost:8000 --concurrency 32 \\
+        --duration 60 --mix by_id=40,availability=20,create=5 --output results.json
+
+Every route in docs/openapi.yaml has a scenario (see SCENARIOS); --mix picks the ones to run
+and their relative weights. Results are written as JSON for benchmarks.compare.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import subprocess
+import os
+import time
+import uuid
+
+import httpx
+
+from app.core.security import create_session_token
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/v1"
+
+# Appointments read from the API before the run; scenarios pick targets from them
+SAMPLE_SIZE = 2000
+# Sessions are minted locally with the API's SESSION_TOKEN_SECRET instead of going through OTP login
+SESSION_TOKEN_TTL_SECONDS = 3600
+
+@dataclass
+class Sample:
+    """Existing appointments the scenarios read, reschedule and patch"""
+    appointments: List[Dict[str, Any]] = field(default_factory=list)
+    session_secret: Optional[str] = None
+    sessions: Dict[str, str] = field(default_factory=dict)
+
+    def pick(self, rng: random.Random) -> Dict[str, Any]:
+        return rng.choice(self.appointments)
+
+    def session(self, phone: str) -> Dict[str, str]:
+        """Authorization header for a patient's phone number"""
+        if phone not in self.sessions:
+            self.sessions[phone] = create_session_token(phone, SESSION_TOKEN_TTL_SECONDS, self.session_secret)
+        return {"Authorization": f"Bearer {self.sessions[phone]}"}
+
+@dataclass
+class Call:
+    method: str
+    path: str
+    params: Optional[Dict[str, Any]] = None
+    json: Any = None
+    headers: Optional[Dict[str, str]] = None
+
+def _unused_slot(rng: random.Random, template: Dict[str, Any]) -> Dict[str, Any]:
+    # Seeded slots are taken, and a doctor takes one booking per slot; a random minute
+    # 10-20 years out is almost never picked twice in a run
+    slot_date = date.fromisoformat(template["date"]) + timedelta(days=rng.randrange(3650, 7300))
+    return {
+        "date": slot_date.isoformat(),
+        "time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:00",
+        "department": template["department"],
+        "doctorName": template["doctorName"],
+    }
+
+def _booking(rng: random.Random, template: Dict[str, Any]) -> Dict[str, Any]:
+    # Load-test patients share the seed prefix so `benchmarks.seed --reset` removes them
+    return {
+        "patientId": f"BENCH-LOAD-{uuid.uuid4().hex[:12]}",
+        "name": "Load Test Patient",
+        **_unused_slot(rng, template),
+        "userPhoneNumber": f"8{rng.randrange(10 ** 9):09d}",
+    }
+
+def _sms(appointment: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "appointmentDate": appointment["date"],
+        "appointmentTime": appointment["time"],
+        "userPhoneNumber": appointment["userPhoneNumber"],
+        "userName": appointment["name"],
+    }
+
+def _list_filtered(sample: Sample, rng: random.Random) -> Call:
+    appointment = sample.pick(rng)
+    return Call("GET", "/appointments/", params={
+        "dateFrom": appointment["date"], "dateTo": appointment["date"], "doctorName": appointment["doctorName"],
+    })
+
+def _list_ndjson(sample: Sample, rng: random.Random) -> Call:
+    # One day of one department, so the stream stays bounded at any seed volume
+    appointment = sample.pick(rng)
+    return Call("GET", "/appointments/", params={
+        "format": "ndjson", "dateFrom": appointment["date"], "dateTo": appointment["date"],
+        "department": appointment["department"],
+    })
+
+def _availability_by_doctor(sample: Sample, rng: random.Random) -> Call:
+    appointment = sample.pick(rng)
+    return Call("GET", "/appointments/availability", params={
+        "appointmentDate": appointment["date"], "doctorName": appointment["doctorName"],
+    })
+
+def _availability_range(sample: Sample, rng: random.Random) -> Call:
+    # A month view starting on a booked day, for one department
+    appointment = sample.pick(rng)
+    first_day = date.fromisoformat(appointment["date"])
+    return Call("GET", "/appointments/availability/range", params={
+        "from": first_day.isoformat(), "to": (first_day + timedelta(days=29)).isoformat(),
+        "department": appointment["department"],
+    })
+
+def _sms_booking(sample: Sample, rng: random.Random) -> Call:
+    appointment = sample.pick(rng)
+    return Call("POST", "/notifications/sms/booking", json={
+        **_sms(appointment), "doctorName": appointment["doctorName"], "userAddress": "Greams Road, Chennai",
+    })
+
+def _owner_only(action: str) -> Callable[[Sample, random.Random], Call]:
+    def build(sample: Sample, rng: random.Random) -> Call:
+        appointment = sample.pick(rng)
+        return Call(
+            "GET", f"/appointments/{appointment['appointmentId']}/{action}",
+            headers=sample.session(appointment["userPhoneNumber"]),
+        )
+    return build
+
+def _verify_otp(sample: Sample, rng: random.Random) -> Call:
+    # A guessed code: measures the OTP store lookup and the 401 path without logging anyone in
+    return Call("POST", "/auth/verify-otp", json={
+        "userPhoneNumber": sample.pick(rng)["userPhoneNumber"], "otp": f"{rng.randrange(10 ** 6):06d}",
+    })
+
+# name -> (route label, request builder)
+SCENARIOS: Dict[str, Tuple[str, Callable[[Sample, random.Random], Call]]] = {
+    "list": ("GET /appointments/", lambda s, r: Call("GET", "/appointments/", params={"limit": 100})),
+    "list_filtered": ("GET /appointments/", _list_filtered),
+    "list_ndjson": ("GET /appointments/?format=ndjson", _list_ndjson),
+    "create": ("POST /appointments/", lambda s, r: Call("POST", "/appointments/", json=_booking(r, s.pick(r)))),
+    "bulk": ("POST /appointments/bulk", lambda s, r: Call(
+        "POST", "/appointments/bulk", json=[_booking(r, s.pick(r)) for _ in range(20)]
+    )),
+    "hold": ("POST /appointments/holds", lambda s, r: Call("POST", "/appointments/holds", json=_unused_slot(r, s.pick(r)))),
+    "by_id": ("GET /appointments/{appointmentId}", lambda s, r: Call(
+        "GET", f"/appointments/{s.pick(r)['appointmentId']}"
+    )),
+    "patch": ("PATCH /appointments/{appointmentId}", lambda s, r: Call(
+        "PATCH", f"/appointments/{s.pick(r)['appointmentId']}", json={"name": f"Patched Patient {r.randrange(1000)}"}
+    )),
+    "availability": ("GET /appointments/availability", lambda s, r: Call(
+        "GET", "/appointments/availability", params={"appointmentDate": s.pick(r)["date"]}
+    )),
+    "availability_by_doctor": ("GET /appointments/availability", _availability_by_doctor),
+    "availability_range": ("GET /appointments/availability/range", _availability_range),
+    "free_slots": ("GET /appointments/free-slots", lambda s, r: Call(
+        "GET", "/appointments/free-slots", params={"department": s.pick(r)["department"], "days": 30, "limit": 20}
+    )),
+    "booking_details": ("GET /appointments/booking-details", lambda s, r: Call(
+        "GET", "/appointments/booking-details", params={"appointmentNumber": s.pick(r)["appointmentId"]}
+    )),
+    "details": ("GET /appointments/details", lambda s, r: Call(
+        "GET", "/appointments/details", params={"userPhoneNumber": s.pick(r)["userPhoneNumber"]}
+    )),
+    "reschedule": ("GET /appointments/{appointmentNumber}/reschedule", _owner_only("reschedule")),
+    "cancellation": ("GET /appointments/{appointmentNumber}/cancellation", _owner_only("cancellation")),
+    "send_otp": ("POST /auth/send-otp", lambda s, r: Call(
+        "POST", "/auth/send-otp", json={"userPhoneNumber": s.pick(r)["userPhoneNumber"]}
+    )),
+    "verify_otp": ("POST /auth/verify-otp", _verify_otp),
+    "sms_booking": ("POST /notifications/sms/booking", _sms_booking),
+    "sms_cancellation": ("POST /notifications/sms/cancellation", lambda s, r: Call(
+        "POST", "/notifications/sms/cancellation", json=_sms(s.pick(r))
+    )),
+    "sms_reschedule": ("POST /notifications/sms/reschedule", lambda s, r: Call(
+        "POST", "/notifications/sms/reschedule", json=_sms(s.pick(r))
+    )),
+}
+
+# Read-heavy default: patients mostly look up bookings and availability
+DEFAULT_MIX = {
+    "list": 2, "list_filtered": 5, "list_ndjson": 1,
+    "create": 5, "bulk": 1, "patch": 3, "hold": 2,
+    "by_id": 15, "booking_details": 15, "details": 10,
+    "availability": 10, "availability_by_doctor": 10, "availability_range": 3, "free_slots": 5,
+    "reschedule": 5, "cancellation": 5,
+    "send_otp": 5, "verify_otp": 3, "sms_booking": 3, "sms_cancellation": 2, "sms_reschedule": 2,
+}
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "name=weight,..." into a scenario mix"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(records: List[Tuple[str, int, float]], elapsed: float) -> Dict[str, Any]:
+    """Aggregate (scenario, status, seconds) records into per-scenario and total statistics"""
+    by_scenario: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+    for scenario, status, seconds in records:
+        by_scenario[scenario].append((status, seconds))
+
+    def stats(entries: List[Tuple[int, float]]) -> Dict[str, Any]:
+        latencies = sorted(seconds * 1000 for _, seconds in entries)
+        statuses: Dict[str, int] = defaultdict(int)
+        for status, _ in entries:
+            statuses[str(status)] += 1
+        # Status 0 marks a request that got no response (timeout, connection error)
+        errors = sum(count for status, count in statuses.items() if status == "0" or int(status) >= 500)
+        return {
+            "requests": len(entries),
+            "errors": errors,
+            "statusCodes": dict(sorted(statuses.items())),
+            "throughput": round(len(entries) / elapsed, 2) if elapsed else 0.0,
+            "latencyMs": {
+                "p50": round(percentile(latencies, 50), 2),
+                "p95": round(percentile(latencies, 95), 2),
+                "p99": round(percentile(latencies, 99), 2),
+                "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+            },
+        }
+
+    endpoints = {}
+    for scenario, entries in sorted(by_scenario.items()):
+        endpoints[scenario] = {"route": SCENARIOS[scenario][0], **stats(entries)}
+    return {
+        "total": stats([entry for entries in by_scenario.values() for entry in entries]),
+        "endpoints": endpoints,
+    }
+
+async def load_sample(client: httpx.AsyncClient, size: int) -> Sample:
+    """Page through upcoming active appointments to find request targets"""
+    sample = Sample()
+    params: Dict[str, Any] = {"limit": min(size, 1000), "isCancelled": False, "dateFrom": date.today().isoformat()}
+    while len(sample.appointments) < size:
+        response = await client.get("/appointments/", params=params)
+        response.raise_for_status()
+        sample.appointments.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params["cursor"] = cursor
+    if not sample.appointments:
+        raise SystemExit("No upcoming appointments to test against; seed the database with benchmarks.seed first")
+    logger.info(f"Loaded {len(sample.appointments)} sample appointments")
+    return sample
+
+async def run(
+    client: httpx.AsyncClient,
+    sample: Sample,
+    mix: Dict[str, float],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    rng: random.Random,
+) -> Tuple[List[Tuple[str, int, float]], float]:
+    """Run `concurrency` workers for warmup + duration seconds; return the measured records and elapsed time"""
+    names, weights = list(mix), list(mix.values())
+    records: List[Tuple[str, int, float]] = []
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(names, weights)[0]
+            call = SCENARIOS[scenario][1](sample, rng)
+            request_started = time.perf_counter()
+            try:
+                response = await client.request(
+                    call.method, call.path, params=call.params, json=call.json, headers=call.headers
+                )
+                status = response.status_code
+            except httpx.HTTPError as e:
+                logger.debug(f"{scenario} failed: {str(e)}")
+                status = 0
+            finished = time.perf_counter()
+            if request_started >= measure_from:
+                records.append((scenario, status, finished - request_started))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return records, time.perf_counter() - measure_from
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url.rstrip("/") + API_PREFIX, limits=limits, timeout=args.timeout) as client:
+        sample = await load_sample(client, args.sample_size)
+        sample.session_secret = args.session_secret
+        logger.info(f"Running {args.concurrency} workers for {args.warmup}s warm-up + {args.duration}s")
+        records, elapsed = await run(
+            client, sample, args.mix, args.concurrency, args.duration, args.warmup, random.Random(args.random_seed)
+        )
+    return {
+        "meta": {
+            "label": args.label,
+            "startedAt": datetime.now(timezone.utc).isoformat(),
+            "gitCommit": _git_commit(),
+            "baseUrl": args.base_url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "elapsed": round(elapsed, 2),
+            "mix": args.mix,
+        },
+        **summarize(records, elapsed),
+    }
+
+def format_table(results: Dict[str, Any]) -> str:
+    rows = [f"{'scenario':<24}{'reqs':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for name, stats in [*results["endpoints"].items(), ("TOTAL", results["total"])]:
+        latency = stats["latencyMs"]
+        rows.append(
+            f"{name:<24}{stats['requests']:>8}{stats['errors']:>8}{stats['throughput']:>10}"
+            f"{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}"
+        )
+    return "\n".join(rows)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Load-test the booking API and report latency per endpoint")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="scenario weights as name=weight,...; scenarios: " + ", ".join(SCENARIOS))
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--session-secret", default=os.getenv("SESSION_TOKEN_SECRET"),
+                        help="the API's SESSION_TOKEN_SECRET, to sign sessions for the reschedule/cancellation scenarios")
+    parser.add_argument("--random-seed", type=int, default=None)
+    parser.add_argument("--label", default=None, help="free-form name for this run, e.g. the build")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(format_table(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Seed the database behind DATABASE_URL with synthetic appointments for load tests.
+
+    python -m benchmarks.seed --size medium            # 100k appointments
+    python -m benchmarks.seed --rows 250000 --reset    # replace earlier benchmark rows
+
+Seeded patients are named BENCH-<n>, so --reset only removes benchmark data.
+"""
+from datetime import date, time, timedelta
+from typing import Iterator, List
+import argparse
+import csv
+import io
+import logging
+import math
+import random
+import time as timer
+
+from sqlalchemy import text
+
+from app.db import manage_db
+from app.db.bulk import IMPORT_COLUMNS
+from app.services.id_allocator import ID_SPACE, AppointmentIdAllocator
+
+logger = logging.getLogger(__name__)
+
+# Appointment IDs are 6 digits, so the table can never hold more than ID_SPACE rows;
+# the largest preset leaves room for the bookings made during a load test
+SIZES = {
+    "small": 10_000,
+    "medium": 100_000,
+    "large": 500_000,
+    "xlarge": 900_000,
+}
+
+PATIENT_PREFIX = "BENCH-"
+SEED_COLUMNS = IMPORT_COLUMNS + ["isCancelled"]
+
+DEPARTMENTS = {
+    "Cardiology": ["Dr. Priya Sharma", "Dr. Arjun Menon", "Dr. Kavya Iyer"],
+    "Neurology": ["Dr. Rahul Nair", "Dr. Meera Pillai"],
+    "Orthopedics": ["Dr. Vikram Rao", "Dr. Anjali Reddy", "Dr. Suresh Kumar"],
+    "Pediatrics": ["Dr. Lakshmi Narayan", "Dr. Deepa Krishnan"],
+    "Dermatology": ["Dr. Karthik Subramanian"],
+    "General Medicine": ["Dr. Ramesh Babu", "Dr. Nisha Verma", "Dr. Aditya Joshi", "Dr. Fatima Khan"],
+}
+DOCTORS = [(department, doctor) for department, doctors in DEPARTMENTS.items() for doctor in doctors]
+
+# 15-minute slots from 09:00 to 17:45
+SLOT_TIMES = [time(hour, minute) for hour in range(9, 18) for minute in (0, 15, 30, 45)]
+
+CANCELLED_RATE = 0.1
+
+# A doctor takes one active booking per slot (uq_appointments_active_slot), so a
+# slot is numbered day * SLOTS_PER_DAY + doctor * len(SLOT_TIMES) + time
+SLOTS_PER_DAY = len(DOCTORS) * len(SLOT_TIMES)
+
+# Fraction of slots filled when --days is not given
+DEFAULT_OCCUPANCY = 0.8
+
+def default_days(rows: int) -> int:
+    return max(180, math.ceil(rows / (SLOTS_PER_DAY * DEFAULT_OCCUPANCY)))
+
+def free_slots(db, start: date, days: int, rng: random.Random) -> List[int]:
+    """Shuffled numbers of the slots in start..start+days that no active appointment takes"""
+    doctor_index = {doctor: index for index, (_, doctor) in enumerate(DOCTORS)}
+    time_index = {slot_time: index for index, slot_time in enumerate(SLOT_TIMES)}
+    taken = set()
+    for booked_date, doctor, booked_time in db.execute(text(
+        'SELECT "date", "doctorName", "time" FROM appointments '
+        'WHERE NOT "isCancelled" AND "date" >= :start AND "date" < :end'
+    ), {"start": start, "end": start + timedelta(days=days)}):
+        if doctor in doctor_index and booked_time in time_index:
+            taken.add((booked_date - start).days * SLOTS_PER_DAY + doctor_index[doctor] * len(SLOT_TIMES) + time_index[booked_time])
+    slots = [slot for slot in range(days * SLOTS_PER_DAY) if slot not in taken]
+    rng.shuffle(slots)
+    return slots
+
+def generate_rows(ids: List[str], first: int, slots: List[int], start: date, rng: random.Random) -> Iterator[list]:
+    """Yield one COPY row per ID, each in its own slot; patient numbers continue from `first`"""
+    for offset, (appointment_id, slot) in enumerate(zip(ids, slots)):
+        n = first + offset
+        day, within_day = divmod(slot, SLOTS_PER_DAY)
+        doctor, slot_time = divmod(within_day, len(SLOT_TIMES))
+        department, doctor_name = DOCTORS[doctor]
+        yield [
+            appointment_id,
+            f"{PATIENT_PREFIX}{n:07d}",
+            f"Bench Patient {n}",
+            (start + timedelta(days=day)).isoformat(),
+            SLOT_TIMES[slot_time].isoformat(),
+            department,
+            doctor_name,
+            f"9{n:09d}",
+            "t" if rng.random() < CANCELLED_RATE else "f",
+        ]
+
+def reset(db):
+    logger.info("Removing earlier benchmark appointments")
+    db.execute(text('DELETE FROM appointments WHERE "patientId" LIKE :pattern'), {"pattern": f"{PATIENT_PREFIX}%"})
+    db.commit()
+
+def seed(db, rows: int, start: date, days: int, batch_size: int, rng: random.Random):
+    """COPY `rows` appointments into the appointments table, one transaction per batch"""
+    # Continue numbering after earlier runs so patientId stays unique
+    first = db.execute(text(
+        'SELECT COALESCE(MAX(CAST(SUBSTRING("patientId" FROM :offset) AS INTEGER)), 0) + 1 '
+        'FROM appointments WHERE "patientId" ~ :pattern'
+    ), {"offset": len(PATIENT_PREFIX) + 1, "pattern": f"^{PATIENT_PREFIX}[0-9]+$"}).scalar()
+    slots = free_slots(db, start, days, rng)
+    if len(slots) < rows:
+        raise SystemExit(
+            f"Only {len(slots)} of the {rows} slots needed are free in {days} days from {start}; "
+            f"pass a larger --days ({SLOTS_PER_DAY} slots per day)"
+        )
+    # IDs come from the allocator's sequence so they never clash with IDs the API hands out
+    allocator = AppointmentIdAllocator(block_size=batch_size)
+    columns = ", ".join(f'"{column}"' for column in SEED_COLUMNS)
+    seeded = 0
+    while seeded < rows:
+        count = min(batch_size, rows - seeded)
+        ids = [allocator.allocate(db) for _ in range(count)]
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(generate_rows(ids, first + seeded, slots[seeded:seeded + count], start, rng))
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(f"COPY appointments ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        db.commit()
+        seeded += count
+        logger.info(f"Seeded {seeded}/{rows} appointments")
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic appointments for load tests")
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument("--size", choices=SIZES, help="preset volume: " + ", ".join(f"{name}={rows}" for name, rows in SIZES.items()))
+    size.add_argument("--rows", type=int, help="number of appointments to add")
+    parser.add_argument("--days", type=int, default=None,
+                        help=f"spread appointments over this many days (default: enough for {DEFAULT_OCCUPANCY:.0%} of slots, at least 180)")
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today() - timedelta(days=30),
+                        help="first appointment date (default: 30 days ago)")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="remove earlier benchmark appointments first")
+    args = parser.parse_args()
+
+    rows = SIZES[args.size] if args.size else args.rows
+    db = manage_db.get_db_session()
+    try:
+        if args.reset:
+            reset(db)
+        existing = db.execute(text("SELECT COUNT(*) FROM appointments")).scalar()
+        if existing + rows > ID_SPACE:
+            raise SystemExit(f"{existing} + {rows} appointments would exceed the {ID_SPACE} available appointment IDs")
+        started = timer.perf_counter()
+        days = args.days or default_days(rows)
+        seed(db, rows, args.start, days, args.batch_size, random.Random(args.random_seed))
+        logger.info(f"Seeded {rows} appointments in {timer.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+    manage_db.rebuild_slot_capacity()
+    db = manage_db.get_db_session()
+    try:
+        db.execute(text("ANALYZE appointments"))
+        db.execute(text("ANALYZE slot_capacity"))
+        db.commit()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
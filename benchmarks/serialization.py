@@ -0,0 +1,115 @@
+"""Measure CPU time per row to serialize a GET /appointments/ page, before and after the fast path.
+
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+    python -m benchmarks.serialization --rows 1000 --from-database    # also time the fetch (DATABASE_URL)
+
+"validated" is the previous path: ORM objects validated through the List[Appointment] response
+model by FastAPI, then encoded with the stdlib json module. "fast" is the current path: column
+tuples paired with field names and encoded by app.core.responses.dumps (orjson when installed).
+Synthetic rows are used unless --from-database is given, so no database is needed.
+"""
+from datetime import date, time as time_of_day, timedelta
+from typing import Any, Callable, Dict, List
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.core.responses import FastJSONResponse, dumps, orjson, rows_to_dicts
+from app.crud import appointments as crud
+from app.models.appointment import Appointment as AppointmentModel
+from app.schemas.appointment import Appointment, AppointmentFilters
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_FIELD = create_response_field(name="Response_get_all_appointments", type_=List[Appointment])
+
+def synthetic_rows(count: int) -> List[tuple]:
+    """Column tuples shaped like crud.APPOINTMENT_COLUMNS"""
+    start = date(2030, 1, 1)
+    return [
+        (f"BENCH-{n}", f"Patient {n}", start + timedelta(days=n // 40), time_of_day(8 + n % 40 // 4, n % 4 * 15),
+         "Cardiology", "Dr. Bench", f"9{n:09d}", f"{n:06d}", False)
+        for n in range(count)
+    ]
+
+def to_models(rows: List[tuple]) -> List[AppointmentModel]:
+    return [AppointmentModel(**dict(zip(crud.APPOINTMENT_FIELDS, row))) for row in rows]
+
+def serialize_validated(models: List[AppointmentModel]) -> bytes:
+    """What FastAPI did for the route: validate through the response model, then json.dumps"""
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=models, is_coroutine=True))
+    return json.dumps(jsonable_encoder(content)).encode()
+
+def serialize_fast(rows: List[tuple]) -> bytes:
+    return FastJSONResponse(rows_to_dicts(crud.APPOINTMENT_FIELDS, rows)).body
+
+def cpu_micros_per_row(fn: Callable[[], Any], rows: int, repeat: int) -> float:
+    """Best-of-`repeat` process CPU time of fn(), in microseconds per row"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        best = min(best, time.process_time() - start)
+    return round(best / max(rows, 1) * 1_000_000, 2)
+
+def measure(rows: List[tuple], models: List[AppointmentModel], repeat: int) -> Dict[str, Any]:
+    # Both paths must produce the same document
+    assert json.loads(serialize_validated(models)) == json.loads(serialize_fast(rows))
+    validated = cpu_micros_per_row(lambda: serialize_validated(models), len(rows), repeat)
+    fast = cpu_micros_per_row(lambda: serialize_fast(rows), len(rows), repeat)
+    return {
+        "rows": len(rows),
+        "encoder": "orjson" if orjson is not None else "json",
+        "cpuMicrosPerRow": {"validated": validated, "fast": fast},
+        "speedup": round(validated / fast, 1) if fast else None,
+    }
+
+def measure_fetch(count: int, repeat: int) -> Dict[str, float]:
+    """CPU per row to fetch a page as ORM entities versus column tuples"""
+    from app.db.base import SessionLocal
+
+    filters = AppointmentFilters()
+    with SessionLocal() as db:
+        def entities():
+            db.expunge_all()
+            return crud.list_appointments(db, filters, count)
+        return {
+            "entities": cpu_micros_per_row(entities, count, repeat),
+            "tuples": cpu_micros_per_row(lambda: crud.list_appointment_rows(db, filters, count), count, repeat),
+        }
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Measure CPU per row of the appointment list serialization")
+    parser.add_argument("--rows", type=int, default=1000, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per variant; the fastest is reported")
+    parser.add_argument("--from-database", action="store_true",
+                        help="serialize rows from DATABASE_URL and time the fetch too")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    if args.from_database:
+        from app.db.base import SessionLocal
+
+        with SessionLocal() as db:
+            rows = [tuple(row) for row in crud.list_appointment_rows(db, AppointmentFilters(), args.rows)]
+    else:
+        rows = synthetic_rows(args.rows)
+    results = measure(rows, to_models(rows), args.repeat)
+    if args.from_database:
+        results["fetchCpuMicrosPerRow"] = measure_fetch(len(rows), args.repeat)
+
+    print(dumps(results).decode())
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info("Results written to %s", args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Production server settings; gunicorn reads this file from the working directory.
+
+    gunicorn app.main:app
+
+Workers are sized from the container's cgroup CPU and memory limits (app/core/server.py);
+set WEB_CONCURRENCY to override. The master creates the schema once, then forks uvicorn
+workers that warm their own connection pool in the app's lifespan hook.
+"""
+import os
+
+from app.core.server import cpu_limit, default_workers, memory_limit
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = default_workers()
+# Read by the app (app/services/cache.py) to pick a cache that all workers share
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# SIGTERM: stop accepting connections and give in-flight requests this long to finish
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# A worker silent for this long is killed and replaced
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+# Longer than the idle timeout of nginx/the load balancer, so they close idle connections first
+keepalive = int(os.getenv("KEEPALIVE", "75"))
+
+# Recycle workers now and then to bound memory growth; jitter avoids restarting all at once
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+# No uvicorn access log: the app writes sampled app.access records instead (see app/core/logs.py)
+accesslog = None
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+def on_starting(server):
+    server.log.info(
+        "Starting %s worker(s) for %.2f CPU(s) and %s memory limit",
+        workers, cpu_limit(), memory_limit() or "no",
+    )
+    from app.db import base
+    from app.services.appointment_repository import STORAGE_BACKEND
+    if base.DB_CREATE_SCHEMA and STORAGE_BACKEND != "memory":
+        base.create_schema()
+        # Workers inherit the imported module, so they skip create_all; none share the master's connections
+        base.DB_CREATE_SCHEMA = False
+        base.get_engine().dispose()
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
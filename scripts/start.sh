@@ -21,5 +21,6 @@ if [ "$DEBUG" = "True" ]; then
   exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
 else
   echo "Starting application in production mode..."
-  exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers 4
+  # Worker count follows the container limits; see gunicorn.conf.py
+  exec gunicorn app.main:app
 fi 
\ No newline at end of file